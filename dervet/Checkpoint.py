@@ -0,0 +1,146 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+Checkpoint.py
+
+This Python class keeps the results of every solved optimization window of a case
+on disk, so a case that was stopped can pick up after the last window it solved.
+"""
+import os
+import pickle
+import shutil
+from pathlib import Path
+import pandas as pd
+
+# attributes of DERs and value streams that carry over from one window to the next
+STATE_ATTRIBUTES = ['degrade_data', 'degrade_perc', 'effective_soe_max', 'effective_soe_min',
+                    'years_system_degraded']
+
+
+class WindowCheckpoint:
+    """ One file per solved optimization window. Each file holds the results of
+    every DER and value stream in that window, their degradation state after
+    the window, and the objective values so far
+
+    """
+
+    def __init__(self, directory):
+        """ Initialize the checkpoint
+
+        Args:
+            directory (str, Path): the directory to keep the files of the case in
+
+        """
+        self.directory = Path(directory)
+
+    def path(self, opt_period):
+        return self.directory / f'window_{opt_period}.pkl'
+
+    def save(self, opt_period, sub_index, ders, value_streams, objective_values):
+        """ Saves the results of an optimization window (after they were saved in the
+        DERs and value streams)
+
+        Args:
+            opt_period (int): the optimization window number
+            sub_index (Index): the timesteps of the window
+            ders (list): every DER of the case
+            value_streams (dict): every value stream of the case, by name
+            objective_values (DataFrame, None): objective values of the windows solved so far
+
+        """
+        record = {
+            'index': sub_index,
+            'ders': {der.unique_tech_id(): snapshot(der, sub_index) for der in ders},
+            'value streams': {name: snapshot(value_stream, sub_index)
+                              for name, value_stream in value_streams.items()},
+            'objective values': objective_values,
+        }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # write a temporary file first, so a window is never half saved
+        temporary = self.path(opt_period).with_suffix('.tmp')
+        with open(temporary, 'wb') as file:
+            pickle.dump(record, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, self.path(opt_period))
+
+    def load(self, opt_period):
+        """ Loads the results of an optimization window
+
+        Args:
+            opt_period (int): the optimization window number
+
+        Returns: the saved record, or None if the window was not saved
+
+        """
+        path = self.path(opt_period)
+        if not path.is_file():
+            return None
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+
+    def clear(self):
+        """ Deletes every saved window """
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def snapshot(obj, sub_index):
+    """ The results of a DER or value stream in one window, and its state after it
+
+    Args:
+        obj (DER, ValueStream): the DER or value stream
+        sub_index (Index): the timesteps of the window
+
+    Returns: dictionary of the results (None if it has no variables) and the state
+
+    """
+    results = None
+    if isinstance(getattr(obj, 'variables_df', None), pd.DataFrame):
+        results = obj.variables_df.loc[obj.variables_df.index.intersection(sub_index)]
+    # the snapshot is pickled right away, so the state does not have to be copied
+    state = {name: getattr(obj, name) for name in STATE_ATTRIBUTES if hasattr(obj, name)}
+    return {'results': results, 'state': state}
+
+
+def restore(obj, saved):
+    """ Puts the results and state of a saved window back into a DER or value stream
+
+    Args:
+        obj (DER, ValueStream): the DER or value stream
+        saved (dict): its snapshot of the window
+
+    """
+    results = saved['results']
+    if results is not None and not results.empty:
+        current = obj.variables_df
+        if results.index.isin(current.index).all():
+            current.loc[results.index, results.columns] = results
+        else:
+            obj.variables_df = pd.concat([current, results], sort=True)
+    for name, value in saved['state'].items():
+        setattr(obj, name, value)
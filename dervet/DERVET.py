@@ -33,13 +33,21 @@ runDERVET.py
 This Python script serves as the initial launch point executing the
 Python-based version of DERVET.
 """
+import logging
+import shutil
 import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
 from dervet.MicrogridScenario import MicrogridScenario
 from dervet.DERVETParams import ParamsDER
 from dervet.MicrogridResult import MicrogridResult
 from storagevet.ErrorHandling import *
 
+# if the worker processes checkpoint the cases, and if they resume from those checkpoints
+worker_checkpoint = False
+worker_resume = False
+
 
 class DERVET:
     """ DERVET API. This will eventually allow StorageVET to be imported and
@@ -47,7 +55,8 @@ class DERVET:
 
     """
 
-    def __init__(self, model_parameters_path, verbose=False, **kwargs):
+    def __init__(self, model_parameters_path, verbose=False, workers=1, checkpoint=False,
+                 resume=False, **kwargs):
         """
             Constructor to initialize the parameters and data needed to run
 
@@ -55,10 +64,20 @@ class DERVET:
                 model_parameters_path (str): Filename of the model parameters
                     CSV or XML that describes the optimization case to be
                     analysed
+                workers (int): number of processes to run the cases on
+                checkpoint (bool): save every solved optimization window, so a run that
+                    is stopped can be resumed
+                resume (bool): skip the optimization windows that were solved (and
+                    checkpointed) by an earlier run of the same cases that was stopped
+                    (the cases are checkpointed again)
 
             Notes: kwargs is in place for testing purposes
         """
         self.verbose = verbose
+        self.model_parameters_path = model_parameters_path
+        self.workers = workers
+        self.checkpoint = checkpoint or resume
+        self.resume = resume
 
         # Initialize Params Object from Model Parameters and Simulation Cases
         self.cases = ParamsDER.initialize(model_parameters_path, self.verbose)
@@ -72,19 +91,137 @@ class DERVET:
     def solve(self):
         starts = time.time()
 
-        for key, value in self.cases.items():
-            run = MicrogridScenario(value)
-            run.set_up_poi_and_service_aggregator()
-            run.initialize_cba()
-            run.fill_and_drop_extra_data()
-            run.sizing_module()
-            run.optimize_problem_loop()
-
-            MicrogridResult.add_instance(key, run)
+        if self.workers > 1 and len(self.cases) > 1:
+            self.solve_on_pool()
+        else:
+            for key, value in self.cases.items():
+                checkpoint = checkpoint_directory(key) if self.checkpoint else None
+                MicrogridResult.add_instance(key, run_case(value, checkpoint, self.resume))
+                if self.checkpoint:
+                    clear_checkpoint(key)
 
         MicrogridResult.sensitivity_summary()
+        MicrogridResult.save_solver_profile_summary()
 
         ends = time.time()
         TellUser.info(f"DERVET runtime: {ends - starts}")
 
         return MicrogridResult
+
+    def solve_on_pool(self):
+        """ Runs the cases on a pool of WORKERS processes. The inputs of each case
+        are sent to a worker (the model parameters are only read here), which runs
+        and saves the whole case. Only a summary of each case is sent back, and the
+        summaries are added in case order, so the sensitivity summary is the same as
+        when the cases run one after another
+
+        """
+        TellUser.info(f'Running {len(self.cases)} cases on {self.workers} processes')
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=initialize_worker,
+                                 initargs=(ParamsDER.results_inputs, ParamsDER.case_definitions,
+                                           self.checkpoint, self.resume)) as pool:
+            futures = {key: pool.submit(solve_case_on_worker, key, case)
+                       for key, case in self.cases.items()}
+            for key, future in futures.items():
+                MicrogridResult.add_case_summary(key, future.result())
+                TellUser.info(f'Case {key} finished')
+
+
+def run_case(case, checkpoint=None, resume=False):
+    """ Runs the full analysis of one case
+
+    Args:
+        case (ParamsDER): the inputs of the case
+        checkpoint (Path, None): directory to save every solved optimization window to
+        resume (bool): skip the optimization windows that were already saved there
+
+    Returns: the MicrogridScenario, after its optimization has run to completion
+
+    """
+    run = MicrogridScenario(case)
+    if checkpoint is not None:
+        run.use_checkpoint(checkpoint, resume)
+    run.set_up_poi_and_service_aggregator()
+    run.initialize_cba()
+    run.fill_and_drop_extra_data()
+    run.sizing_module()
+    run.optimize_problem_loop()
+    return run
+
+
+def checkpoint_directory(key):
+    """ The directory that the optimization windows of a case are checkpointed to
+
+    Args:
+        key (int): the key of the case
+
+    Returns: Path of the directory (inside the results directory)
+
+    """
+    return Path(MicrogridResult.dir_abs_path, 'checkpoints', f'case{key}')
+
+
+def clear_checkpoint(key):
+    """ Deletes the checkpoint of a case, once its results are saved (and the
+    checkpoints directory, once it is empty)
+
+    Args:
+        key (int): the key of the case
+
+    """
+    directory = checkpoint_directory(key)
+    shutil.rmtree(directory, ignore_errors=True)
+    try:
+        directory.parent.rmdir()
+    except OSError:
+        # the checkpoints of other cases are still there
+        pass
+
+
+def initialize_worker(results_inputs, case_definitions, checkpoint=False, resume=False):
+    """ Sets up the results in a worker process. The worker only logs to the log
+    file of the case it is running (see solve_case_on_worker), so the handlers it
+    got from the main process are taken off
+
+    Args:
+        results_inputs (dict): the Results inputs of the model parameters
+        case_definitions (DataFrame): the sensitivity values of every case
+        checkpoint (bool): save every solved optimization window
+        resume (bool): skip the optimization windows that were already checkpointed
+
+    """
+    global worker_checkpoint, worker_resume
+    worker_checkpoint = checkpoint
+    worker_resume = resume
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    MicrogridResult.initialize(results_inputs, case_definitions)
+
+
+def solve_case_on_worker(key, case):
+    """ Runs and saves one case in a worker process. Everything logged while
+    the case runs is written to a log file of its own in the results directory,
+    so the messages of cases that run at the same time are kept apart
+
+    Args:
+        key (int): the key of the case
+        case (ParamsDER): the inputs of the case
+
+    Returns: the case summary of the results (see MicrogridResult.case_summary)
+
+    """
+    log_handler = logging.FileHandler(Path(MicrogridResult.dir_abs_path, f'case{key}_log.log'))
+    log_handler.setLevel(logging.DEBUG)
+    log_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    root_logger = logging.getLogger()
+    root_logger.addHandler(log_handler)
+    try:
+        checkpoint = checkpoint_directory(key) if worker_checkpoint else None
+        MicrogridResult.add_instance(key, run_case(case, checkpoint, worker_resume))
+        if worker_checkpoint:
+            clear_checkpoint(key)
+        return MicrogridResult.instances.pop(key).case_summary()
+    finally:
+        root_logger.removeHandler(log_handler)
+        log_handler.close()
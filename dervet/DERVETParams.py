@@ -816,6 +816,7 @@ class ParamsDER(Params):
 
         if self.Reliability is not None:
             self.Reliability["dt"] = self.Scenario["dt"]
+            self.Reliability["results_dir"] = self.Results["dir_absolute_path"]
             try:
                 self.Reliability.update({'critical load': self.Scenario['time_series'].loc[:, 'Critical Load (kW)']})
             except KeyError:
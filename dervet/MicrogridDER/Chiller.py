@@ -53,6 +53,7 @@ from storagevet.Technology.DistributedEnergyResource import DER
 from dervet.MicrogridDER.DERExtension import DERExtension
 from dervet.MicrogridDER.ContinuousSizing import ContinuousSizing
 from storagevet.ErrorHandling import *
+from dervet.WindowSlice import window_length
 
 KW_PER_TON = 3.5168525  # unit conversion (1 ton in kW)
 KW_PER_MMBTU_HR = 293.071107 # unit conversion (1 MMBtu/hr in kW)  # needed for fuel_cost
@@ -153,7 +154,8 @@ class Chiller(DER, DERExtension, ContinuousSizing):
         if self.is_hot:
             return self.variables_dict['cold'] / self.cop
         else:
-            return cvx.Parameter(value=np.zeros(sum(mask)), shape=sum(mask), name=f'{self.name}-Zero')
+            length = window_length(mask)
+            return cvx.Parameter(value=np.zeros(length), shape=length, name=f'{self.name}-Zero')
 
     def constraints(self, mask, **kwargs):
         constraint_list = super().constraints(mask)
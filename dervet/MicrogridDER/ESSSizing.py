@@ -39,6 +39,7 @@ from dervet.MicrogridDER.DERExtension import DERExtension
 import cvxpy as cvx
 from storagevet.ErrorHandling import *
 import numpy as np
+from dervet.WindowSlice import as_window
 
 
 class ESSSizing(EnergyStorage, DERExtension, ContinuousSizing):
@@ -233,32 +234,33 @@ class ESSSizing(EnergyStorage, DERExtension, ContinuousSizing):
 
         constraint_list = super().constraints(mask,**kwargs)
         constraint_list += self.size_constraints
+        window = as_window(mask)
         if self.incl_energy_limits:
             # add timeseries energy limits on this instance
             ene = self.variables_dict['ene']
             if self.limit_energy_max is not None:
-                energy_max = cvx.Parameter(value=self.limit_energy_max.loc[mask].values, shape=sum(mask), name='ts_energy_max')
+                energy_max = cvx.Parameter(value=window.select(self.limit_energy_max).values, shape=window.length, name='ts_energy_max')
                 constraint_list += [cvx.NonPos(ene - energy_max)]
             if self.limit_energy_min is not None:
-                energy_min = cvx.Parameter(value=self.limit_energy_min.loc[mask].values, shape=sum(mask), name='ts_energy_min')
+                energy_min = cvx.Parameter(value=window.select(self.limit_energy_min).values, shape=window.length, name='ts_energy_min')
                 constraint_list += [cvx.NonPos(energy_min - ene)]
         if self.incl_charge_limits:
             # add timeseries energy limits on this instance
             charge = self.variables_dict['ch']
             if self.limit_charge_max is not None:
-                charge_max = cvx.Parameter(value=self.limit_charge_max.loc[mask].values, shape=sum(mask), name='ts_charge_max')
+                charge_max = cvx.Parameter(value=window.select(self.limit_charge_max).values, shape=window.length, name='ts_charge_max')
                 constraint_list += [cvx.NonPos(charge - charge_max)]
             if self.limit_charge_min is not None:
-                charge_min = cvx.Parameter(value=self.limit_charge_min.loc[mask].values, shape=sum(mask), name='ts_charge_min')
+                charge_min = cvx.Parameter(value=window.select(self.limit_charge_min).values, shape=window.length, name='ts_charge_min')
                 constraint_list += [cvx.NonPos(charge_min - charge)]
         if self.incl_discharge_limits:
             # add timeseries energy limits on this instance
             discharge = self.variables_dict['dis']
             if self.limit_discharge_max is not None:
-                discharge_max = cvx.Parameter(value=self.limit_discharge_max.loc[mask].values, shape=sum(mask), name='ts_discharge_max')
+                discharge_max = cvx.Parameter(value=window.select(self.limit_discharge_max).values, shape=window.length, name='ts_discharge_max')
                 constraint_list += [cvx.NonPos(discharge - discharge_max)]
             if self.limit_discharge_min is not None:
-                discharge_min = cvx.Parameter(value=self.limit_discharge_min.loc[mask].values, shape=sum(mask), name='ts_discharge_min')
+                discharge_min = cvx.Parameter(value=window.select(self.limit_discharge_min).values, shape=window.length, name='ts_discharge_min')
                 constraint_list += [cvx.NonPos(discharge_min - discharge)]
         return constraint_list
 
@@ -0,0 +1,145 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+ElectricVehicleCohorts.py
+
+This Python module groups ElectricVehicle1 inputs into cohorts of EVs that plug in and out at the
+same times, so each cohort can be optimized as one ElectricVehicleFleet.
+"""
+import numpy as np
+
+# inputs that are given for each EV and added up for the cohort
+SUMMED_INPUTS = ['ccost', 'fixed_om', 'rcost', 'decommissioning_cost']
+# inputs that are given for each EV and kept for each member of the cohort
+MEMBER_INPUTS = ['name', 'ID', 'ene_target', 'ch_max_rated', 'ch_min_rated']
+
+
+def cohort_key(ev_inputs):
+    """ EVs with the same key are in the same cohort: they have the same inputs (other than the ones
+    given for each EV), and need about the same number of timesteps at full power to reach their
+    energy target
+
+    Args:
+        ev_inputs (dict): the inputs of an ElectricVehicle1
+
+    Returns: a hashable key
+
+    """
+    shared = {key: value for key, value in ev_inputs.items()
+              if key not in SUMMED_INPUTS + MEMBER_INPUTS}
+    if isinstance(shared.get('salvage_value'), (int, float)):
+        # a salvage value in $ is added up (like a cost)
+        shared.pop('salvage_value')
+    if ev_inputs['ch_max_rated'] > 0:
+        shared['timesteps_to_target'] = \
+            int(np.ceil(ev_inputs['ene_target'] / (ev_inputs['ch_max_rated'] * ev_inputs['dt'])))
+    return repr(sorted(shared.items()))
+
+
+def fleet_cohorts(ev1_inputs):
+    """ Groups ElectricVehicle1 inputs into cohorts. A cohort of more than one EV is turned into the
+    inputs of one ElectricVehicleFleet, which is a virtual EV: its energy target is the sum of the
+    energy targets of the EVs, and its charge power is bounded so that sharing the charge out to
+    the EVs, in proportion to their energy target, never charges one faster than its rating.
+
+    Args:
+        ev1_inputs (dict): the inputs of each ElectricVehicle1, by ID
+
+    Returns: the inputs of each ElectricVehicleFleet (by ID), and the inputs of the EVs that are
+        left on their own (by ID)
+
+    """
+    cohorts = {}
+    for id_str, ev_inputs in ev1_inputs.items():
+        cohorts.setdefault(cohort_key(ev_inputs), []).append((id_str, ev_inputs))
+    fleets = {}
+    singles = {}
+    for members in cohorts.values():
+        if len(members) == 1:
+            id_str, ev_inputs = members[0]
+            singles[id_str] = ev_inputs
+            continue
+        fleet_id = f'cohort{len(fleets) + 1}'
+        fleets[fleet_id] = fleet_inputs(fleet_id, [ev_inputs for _, ev_inputs in members])
+    return fleets, singles
+
+
+def fleet_inputs(fleet_id, members):
+    """
+
+    Args:
+        fleet_id (str): the ID of the fleet
+        members (list): the inputs of each EV in the cohort
+
+    Returns: the inputs of the ElectricVehicleFleet of the cohort
+
+    """
+    inputs = dict(members[0])
+    targets = np.array([member['ene_target'] for member in members], dtype=float)
+    ratings = np.array([member['ch_max_rated'] for member in members], dtype=float)
+    total_target = targets.sum()
+    inputs['ene_target'] = float(total_target)
+    positive = targets > 0
+    if positive.any():
+        # the EV with the lowest rating for its share of the target limits how fast the fleet
+        # can charge
+        inputs['ch_max_rated'] = float(np.min(ratings[positive] / targets[positive]) * total_target)
+    else:
+        inputs['ch_max_rated'] = float(ratings.sum())
+    # the charge of the fleet is split by share of the target, so the fleet has to charge at
+    # least enough for every EV to reach its own minimum
+    shares = member_shares(members)
+    minimums = np.array([member['ch_min_rated'] for member in members], dtype=float)
+    inputs['ch_min_rated'] = float(np.max(minimums[shares > 0] / shares[shares > 0]))
+    for key in SUMMED_INPUTS + ['salvage_value']:
+        values = [member.get(key) for member in members]
+        if all(isinstance(value, (int, float)) for value in values):
+            inputs[key] = sum(values)
+    inputs['name'] = f'EV {fleet_id} ({len(members)} EVs)'
+    if 'ID' in inputs:
+        inputs['ID'] = fleet_id
+    inputs['members'] = [{key: member.get(key) for key in MEMBER_INPUTS} for member in members]
+    return inputs
+
+
+def member_shares(members):
+    """
+
+    Args:
+        members (list): the inputs of each EV in a cohort
+
+    Returns: the share of the fleet's charge (and energy) that goes to each EV: its share of the
+        energy target of the fleet
+
+    """
+    targets = np.array([member['ene_target'] for member in members], dtype=float)
+    if targets.sum() > 0:
+        return targets / targets.sum()
+    return np.full(len(targets), 1 / len(targets))
@@ -36,10 +36,28 @@ import logging
 import cvxpy as cvx
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from storagevet.Technology.DistributedEnergyResource import DER
 from dervet.MicrogridDER.DERExtension import DERExtension
 from dervet.MicrogridDER.ContinuousSizing import ContinuousSizing
 from storagevet.ErrorHandling import *
+from dervet.WindowSlice import as_window
+from dervet.MicrogridDER.ElectricVehicleCohorts import member_shares
+
+
+def selection_matrix(positions, size):
+    """ Sparse matrix that picks the values at POSITIONS (one per row) out of a vector. Positions
+    that are negative (before the start of the vector) pick nothing
+
+    Args:
+        positions (np.ndarray): the positions to pick
+        size (int): the length of the vector
+
+    Returns: a sparse matrix with a row for each position and SIZE columns
+
+    """
+    rows = np.flatnonzero(positions >= 0)
+    return sp.csr_matrix((np.ones(len(rows)), (rows, positions[rows])), shape=(len(positions), size))
 
 
 class ElectricVehicle1(DER, ContinuousSizing, DERExtension):
@@ -85,6 +103,7 @@ class ElectricVehicle1(DER, ContinuousSizing, DERExtension):
         self.plugin_times_index = None
         self.plugout_times_index = None
         self.unplugged_index = None
+        self.active_times_index = None
 
     # def charge_capacity(self):
     #     """
@@ -192,30 +211,27 @@ class ElectricVehicle1(DER, ContinuousSizing, DERExtension):
         """
         return self.variables_dict['uch'] * self.dt
 
-    def get_active_times(self, mask):
-        """
+    def get_active_times(self, index):
+        """ Finds the timesteps the EV is plugged in, plugged out and charging (between the two)
+        over the whole time series. They are only found again if the time series changes.
 
         Args:
-            mask:
-
-        Returns:
+            index (pd.DatetimeIndex): the index of the whole time series
 
         """
-        compute_plugin_index = pd.DataFrame(index=mask.index)
-        compute_plugin_index['plugin'] = compute_plugin_index.index.hour == self.plugin_time
-        compute_plugin_index['plugout'] = compute_plugin_index.index.hour == self.plugout_time
-        compute_plugin_index['unplugged'] = False
-
+        if self.active_times_index is index:
+            return
+        hour = index.hour.values
+        self.plugin_times_index = hour == self.plugin_time
+        self.plugout_times_index = hour == self.plugout_time
+        # NOTE: despite its name, unplugged_index is true when the EV can charge
         if self.plugin_time < self.plugout_time:  # plugin time and plugout time must be different
-            compute_plugin_index.loc[
-                (compute_plugin_index.index.hour >= self.plugin_time) * (compute_plugin_index.index.hour < self.plugout_time), 'unplugged'] = True
+            self.unplugged_index = (hour >= self.plugin_time) & (hour < self.plugout_time)
         elif self.plugin_time > self.plugout_time:
-            compute_plugin_index.loc[
-                (compute_plugin_index.index.hour >= self.plugin_time) | (compute_plugin_index.index.hour < self.plugout_time), 'unplugged'] = True
-
-        self.plugout_times_index = compute_plugin_index['plugout']
-        self.plugin_times_index = compute_plugin_index['plugin']
-        self.unplugged_index = compute_plugin_index['unplugged']
+            self.unplugged_index = (hour >= self.plugin_time) | (hour < self.plugout_time)
+        else:
+            self.unplugged_index = np.zeros(len(index), dtype=bool)
+        self.active_times_index = index
 
     def constraints(self, mask):
         """Default build constraint list method. Used by services that do not have constraints.
@@ -230,14 +246,12 @@ class ElectricVehicle1(DER, ContinuousSizing, DERExtension):
         """
 
         constraint_list = []
-        self.get_active_times(mask.loc[mask])  # constructing the array that indicates whether the ev is plugged or not
-
-        # print(self.plugin_times_index.iloc[0:24])
-        # print(self.plugout_times_index.iloc[0:24])
-        # print(self.unplugged_index.iloc[0:24])
-        # print('Ene target :' + str(self.ene_target))
-        # print('Charging max :' + str(self.ch_max_rated))
-        # print('Charging min :' + str(self.ch_min_rated))
+        window = as_window(mask)
+        self.get_active_times(window.full_index)  # constructing the array that indicates whether the ev is plugged or not
+        plugin = np.flatnonzero(self.plugin_times_index[window.positions])
+        plugout = np.flatnonzero(self.plugout_times_index[window.positions])
+        charging = self.unplugged_index[window.positions]
+        size = window.length
 
         # optimization variables
         ene = self.variables_dict['ene']
@@ -246,37 +260,25 @@ class ElectricVehicle1(DER, ContinuousSizing, DERExtension):
         uch = self.variables_dict['uch']
         on_c = self.variables_dict['on_c']
 
-        # collected energy at start time is zero for all start times
-        constraint_list += [cvx.Zero(ene[self.plugin_times_index])]
-
-        # energy evolution generally for every time step
-
-        numeric_unplugged_index = pd.Series(range(len(self.unplugged_index)), index=self.unplugged_index.index).loc[self.unplugged_index]
-        ene_ini_window = 0
-
-        if numeric_unplugged_index.iloc[0] == 0:  # energy evolution for the EV, only during plugged times
-            constraint_list += [cvx.Zero(ene[numeric_unplugged_index.iloc[0]] - ene_ini_window)]
-            constraint_list += [cvx.Zero(ene[list(numeric_unplugged_index.iloc[1:])] - ene[list(numeric_unplugged_index.iloc[1:] - 1)] - (
-                        self.dt * ch[list(numeric_unplugged_index.iloc[1:] - 1)]))]  # - uene[list(numeric_unplugged_index.iloc[1:]-1)])]
-        else:
-            constraint_list += [cvx.Zero(ene[list(numeric_unplugged_index)] - ene[list(numeric_unplugged_index - 1)] - (
-                        self.dt * ch[list(numeric_unplugged_index - 1)]))]  # - uene[list(numeric_unplugged_index-1)])]
-        # constraint_list += [cvx.Zero(ene[1:] - ene[:-1]  - ( self.dt * ch[:-1]) - uene[:-1])]
-
-        # energy at plugout times must be greater or equal to energy target
-
-        numeric_plugout_time_index = pd.Series(range(len(self.plugout_times_index)), index=self.plugout_times_index.index).loc[
-            self.plugout_times_index]
-
-        # the next few lines make sure that the state of energy at the end of the chargign period is equal to the target
-        if numeric_plugout_time_index[0] == 0:
-            constraint_list += [cvx.Zero(self.ene_target - ene[list(numeric_plugout_time_index.iloc[1:] - 1)] - (
-                        self.dt * ch[list(numeric_plugout_time_index.iloc[1:] - 1)]))]  # - uene[list(numeric_plugout_time_index.iloc[1:]-1)])]
-        else:
-            constraint_list += [cvx.Zero(self.ene_target - ene[list(numeric_plugout_time_index - 1)] - (
-                        self.dt * ch[list(numeric_plugout_time_index - 1)]))]  # - uene[list(numeric_plugout_time_index-1)])]
-
-        constraint_list += [cvx.Zero(ene[list(numeric_plugout_time_index)] - self.ene_target)]
+        # collected energy at start time is zero for all start times,
+        # and energy at plugout times must be equal to the energy target
+        pinned = np.concatenate([plugin, plugout])
+        if len(pinned):
+            target = np.concatenate([np.zeros(len(plugin)), np.repeat(self.ene_target, len(plugout))])
+            constraint_list += [cvx.Zero(selection_matrix(pinned, size) @ ene - target)]
+
+        # energy evolution for the EV, only during plugged times (the energy collected before
+        # the first timestep of the window is zero)
+        #   e_t = e_{t-1} + ch_{t-1} * dt
+        plugged = np.flatnonzero(charging)
+        if len(plugged):
+            evolution = selection_matrix(plugged, size) - selection_matrix(plugged - 1, size)
+            constraint_list += [cvx.Zero(evolution @ ene - self.dt * (selection_matrix(plugged - 1, size) @ ch))]
+
+        # the state of energy at the end of the charging period is equal to the target
+        end_of_charging = plugout[plugout > 0] - 1
+        if len(end_of_charging):
+            constraint_list += [cvx.Zero(self.ene_target - selection_matrix(end_of_charging, size) @ (ene + self.dt * ch))]
 
         # constraints on the ch/dis power
 
@@ -289,7 +291,8 @@ class ElectricVehicle1(DER, ContinuousSizing, DERExtension):
             constraint_list += [cvx.NonPos(- ch)]
 
         # constraints to make sure that the ev does nothing when it is unplugged
-        constraint_list += [cvx.NonPos(ch[~self.unplugged_index])]
+        if not charging.all():
+            constraint_list += [cvx.NonPos(ch[~charging])]
 
         # account for -/+ sub-dt energy -- this is the change in energy that the battery experiences as a result of energy option
         # constraint_list += [cvx.Zero(uene - (uch * self.dt))]
@@ -373,6 +376,56 @@ class ElectricVehicle1(DER, ContinuousSizing, DERExtension):
         return sizing_dict
 
 
+class ElectricVehicleFleet(ElectricVehicle1):
+    """ A cohort of ElectricVehicle1s that plug in and out at the same times, optimized as one
+    virtual EV (see ElectricVehicleCohorts). Its charge is shared out to the EVs in the cohort, in
+    proportion to their energy target, when the results are reported.
+
+    """
+
+    def __init__(self, params):
+        """ Initialize all technology with the following attributes.
+
+        Args:
+            params (dict): Dict of parameters (of the cohort, see fleet_cohorts)
+        """
+        super().__init__(params)
+        self.tag = 'ElectricVehicleFleet'
+        self.members = params['members']
+        self.shares = member_shares(self.members)
+        TellUser.debug(f"{self.name} stands in for {len(self.members)} ElectricVehicle1s")
+
+    def timeseries_report(self):
+        """ Summaries the optimization results for this DER, and for each EV in the cohort.
+
+        Returns: A timeseries dataframe with user-friendly column headers that
+            summarize the results pertaining to this instance
+
+        """
+        results = super().timeseries_report()
+        if self.variables_df.get('ch') is None:
+            return results
+        member_ids = [f"ELECTRICVEHICLE1: {member['name']}" for member in self.members]
+        charge = pd.DataFrame(np.outer(self.variables_df['ch'].values, self.shares),
+                              index=results.index,
+                              columns=[f'{member_id} Charge (kW)' for member_id in member_ids])
+        energy = pd.DataFrame(np.outer(self.variables_df['ene'].values, self.shares),
+                              index=results.index,
+                              columns=[f'{member_id} State of Energy (kWh)'
+                                       for member_id in member_ids])
+        return pd.concat([results, charge, energy], axis=1)
+
+    def sizing_summary(self):
+        """
+
+        Returns: A dictionary describe this DER's size and captial costs.
+
+        """
+        sizing_dict = super().sizing_summary()
+        sizing_dict['Quantity'] = len(self.members)
+        return sizing_dict
+
+
 class ElectricVehicle2(DER, ContinuousSizing, DERExtension):
     """ A general template for storage object
 
@@ -479,7 +532,7 @@ class ElectricVehicle2(DER, ContinuousSizing, DERExtension):
 
 
         """
-        return self.variables_dict['ch'] - (1 - self.max_load_ctrl) * self.EV_load_TS[mask]
+        return self.variables_dict['ch'] - (1 - self.max_load_ctrl) * as_window(mask).select(self.EV_load_TS)
 
     def get_charge_down_schedule(self, mask):
         """ the amount of charging power in the up direction (pulling power down from the grid) that
@@ -492,7 +545,7 @@ class ElectricVehicle2(DER, ContinuousSizing, DERExtension):
         Returns: CVXPY parameter/variable
 
         """
-        return -self.variables_dict['ch'] + self.EV_load_TS[mask]
+        return -self.variables_dict['ch'] + as_window(mask).select(self.EV_load_TS)
 
     def objective_function(self, mask, annuity_scalar=1):
         """ Generates the objective function related to a technology. Default includes O&M which can be 0
@@ -510,7 +563,7 @@ class ElectricVehicle2(DER, ContinuousSizing, DERExtension):
         ch = self.variables_dict['ch']
         costs = {
             self.name + ' fixed_om': self.fixed_om * annuity_scalar,
-            self.name + ' lost_load_cost': cvx.sum(self.EV_load_TS[mask].values - ch) * self.lost_load_cost  # added to account for lost load
+            self.name + ' lost_load_cost': cvx.sum(as_window(mask).select(self.EV_load_TS).values - ch) * self.lost_load_cost  # added to account for lost load
 
         }
         # add startup objective costs
@@ -536,8 +589,9 @@ class ElectricVehicle2(DER, ContinuousSizing, DERExtension):
         # uch = self.variables_dict['uch']
 
         # constraints on the ch/dis power
-        constraint_list += [cvx.NonPos(ch - self.EV_load_TS[mask].values)]
-        constraint_list += [cvx.NonPos((1 - self.max_load_ctrl) * self.EV_load_TS[mask].values - ch)]
+        ev_load = as_window(mask).select(self.EV_load_TS).values
+        constraint_list += [cvx.NonPos(ch - ev_load)]
+        constraint_list += [cvx.NonPos((1 - self.max_load_ctrl) * ev_load - ch)]
 
         # the constraint below limits energy throughput and total discharge to less than or equal to
         # (number of cycles * energy capacity) per day, for technology warranty purposes
@@ -40,6 +40,7 @@ from storagevet.Technology import PVSystem
 from storagevet.ErrorHandling import *
 import numpy as np
 import pandas as pd
+from dervet.WindowSlice import as_window
 
 
 class IntermittentResourceSizing(PVSystem.PV, DERExtension, ContinuousSizing):
@@ -91,7 +92,8 @@ class IntermittentResourceSizing(PVSystem.PV, DERExtension, ContinuousSizing):
 
         """
         if self.being_sized():
-            return cvx.Parameter(shape=sum(mask), name=f'{self.name}/rated gen', value=self.gen_per_rated.loc[mask].values) * self.rated_capacity
+            window = as_window(mask)
+            return cvx.Parameter(shape=window.length, name=f'{self.name}/rated gen', value=window.select(self.gen_per_rated).values) * self.rated_capacity
         else:
             return super().get_discharge(mask)
 
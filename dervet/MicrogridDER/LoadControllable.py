@@ -38,6 +38,7 @@ from storagevet.Technology.Load import Load
 from dervet.MicrogridDER.ContinuousSizing import ContinuousSizing
 from dervet.MicrogridDER.DERExtension import DERExtension
 from storagevet.ErrorHandling import *
+from dervet.WindowSlice import as_window, window_length
 
 
 class ControllableLoad(Load, DERExtension, ContinuousSizing):
@@ -144,7 +145,7 @@ class ControllableLoad(Load, DERExtension, ContinuousSizing):
 
         """
         if self.duration:
-            return np.repeat(self.rated_power, sum(mask)) + self.variables_dict['power']
+            return np.repeat(self.rated_power, window_length(mask)) + self.variables_dict['power']
         else:
             return super().get_charge_up_schedule(mask)
 
@@ -160,7 +161,7 @@ class ControllableLoad(Load, DERExtension, ContinuousSizing):
 
         """
         if self.duration:
-            return np.repeat(self.rated_power, sum(mask)) - self.variables_dict['power']
+            return np.repeat(self.rated_power, window_length(mask)) - self.variables_dict['power']
         else:
             return super().get_charge_up_schedule(mask)
 
@@ -238,9 +239,7 @@ class ControllableLoad(Load, DERExtension, ContinuousSizing):
             # uene accounts for change in energy due to participating in sub timestep scale markets
             constraint_list += [cvx.Zero(uene + (self.dt * udis) - (self.dt * uch))]
 
-            sub = mask.loc[mask]
-            for day in sub.index.dayofyear.unique():
-                day_mask = (day == sub.index.dayofyear)
+            for day_mask in as_window(mask).day_slices():
                 # general:  e_{t+1} = e_t + (charge_t - discharge_t) * dt = e_t + power_t * dt
                 constraint_list += [cvx.Zero(energy[day_mask][:-1] + (power[day_mask][:-1] * self.dt) - energy[day_mask][1:])]
                 # start of first timestep of the day
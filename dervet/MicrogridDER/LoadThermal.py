@@ -46,6 +46,7 @@ from storagevet.Technology.DistributedEnergyResource import DER
 import storagevet.Library as Lib
 import cvxpy as cvx
 from storagevet.ErrorHandling import *
+from dervet.WindowSlice import as_window
 
 
 class Load(DER):
@@ -97,7 +98,9 @@ class Load(DER):
         Returns: the charge as a function of time for the
 
         """
-        return cvx.Parameter(value=self.value[mask].values, shape=sum(mask), name='SiteLoad')
+        window = as_window(mask)
+        return cvx.Parameter(value=window.select(self.value).values, shape=window.length,
+                             name='SiteLoad')
 
     def effective_load(self):
         """ Returns the load that is seen by the microgrid or point of interconnection
@@ -27,4 +27,4 @@ Copyright (c) 2023, Electric Power Research Institute
  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
-__all__ = ['ESSSizing.py', 'IntermittentResourceSizing.py', 'ContinuousSizing', 'PV', 'Battery', 'ICE', 'CHP', 'DERExtension', 'ElectricVehicles', 'CAES', 'CombinedHeatPower', 'CombustionTurbine', 'DieselGenset', 'LoadControllable', 'RotatingGeneratorSizing' ]
+__all__ = ['ESSSizing.py', 'IntermittentResourceSizing.py', 'ContinuousSizing', 'PV', 'Battery', 'ICE', 'CHP', 'DERExtension', 'ElectricVehicles', 'ElectricVehicleCohorts', 'CAES', 'CombinedHeatPower', 'CombustionTurbine', 'DieselGenset', 'LoadControllable', 'RotatingGeneratorSizing' ]
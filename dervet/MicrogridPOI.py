@@ -37,6 +37,32 @@ from storagevet.POI import POI
 import cvxpy as cvx
 from storagevet.ErrorHandling import *
 import numpy as np
+from dervet.ReportBuilder import ReportBuilder
+from dervet.WindowSlice import as_window
+
+
+def aggregate(base, contributions):
+    """ Adds the contribution of each DER to an aggregate of the POI. The contributions are
+    stacked into a single block and summed down its columns, so the aggregate is one sum over
+    the stacked block, instead of a chain of additions that is one term longer for every DER.
+
+    Args:
+        base (cvx.Expression, np.ndarray): the aggregate as measured by StorageVET
+        contributions (list): the contribution of each DER, each the same length as BASE
+
+    Returns:
+        the aggregate of BASE and all of the CONTRIBUTIONS
+
+    """
+    if not len(contributions):
+        return base
+    terms = [base] + list(contributions)
+    shapes = {np.shape(term) if not hasattr(term, 'shape') else tuple(term.shape)
+              for term in terms}
+    if len(shapes) == 1 and len(shapes.pop()) == 1:
+        return cvx.sum(cvx.vstack(terms), axis=0)
+    # scalar or mismatched terms are broadcast by cvxpy's addition instead
+    return sum(terms[1:], terms[0])
 
 
 class MicrogridPOI(POI):
@@ -53,6 +79,8 @@ class MicrogridPOI(POI):
             self.error_checks_on_sizing()
 
         self.active_load_dump = params['active_load_dump']
+        # the WindowSlice of the optimization window being set up (set by the scenario)
+        self.window = None
         # add thermal site load time series
         # NOTE: these loads can come from different technologies
         #       but there is only a single one of each (they appear in the input time series)
@@ -193,36 +221,44 @@ class MicrogridPOI(POI):
             agg_thermal_cooling_power = super().get_state_of_system(mask)
 
         # dervet-specific
+        # collect each DER's contribution per aggregate first, then combine each aggregate
+        # in one step, so the size of the expression does not grow with every DER added
+        loads, dispatch_powers, steam_powers, hotwater_powers, cooling_powers = [], [], [], [], []
+        thermal_ders = []
         for der_inst in self.active_ders:
             # add to aggregate values for dervet-specific technology-types
             if der_inst.technology_type == 'Electric Vehicle':
-                load_sum += der_inst.get_charge(mask)
+                loads.append(der_inst.get_charge(mask))
                 # total_soe += der_instance.get_state_of_energy(mask)
 
             # add to der_dispatch_net_power
             if der_inst.technology_type in ['Electric Vehicle', 'Thermal'] or \
                 der_inst.tag in ['ControllableLoad']:
-                der_dispatch_net_power += der_inst.get_net_power(mask)
+                dispatch_powers.append(der_inst.get_net_power(mask))
 
             if der_inst.tag in ['Chiller', 'Boiler']:
                 # if these technologies are electric, they add to load_sum,
                 # if not, get_charge() will return zeroes
-                load_sum += der_inst.get_charge(mask)
+                loads.append(der_inst.get_charge(mask))
 
             # thermal power recovered: hot (steam/hotwater) and cold
             #if der_inst.is_hot:
             if der_inst.tag in ['CHP', 'Boiler']:
-                TellUser.debug(f'adding heat (steam) generated from this DER: ' +
-                                f'{der_inst.unique_tech_id()}')
-                agg_steam_heating_power += der_inst.get_steam_generated(mask)
-                TellUser.debug(f'adding heat (hotwater) generated from this DER: ' +
-                                f'{der_inst.unique_tech_id()}')
-                agg_hotwater_heating_power += der_inst.get_hotwater_generated(mask)
+                steam_powers.append(der_inst.get_steam_generated(mask))
+                hotwater_powers.append(der_inst.get_hotwater_generated(mask))
+                thermal_ders.append(der_inst.unique_tech_id())
             #if der_inst.is_cold:
             if der_inst.tag == 'Chiller':
-                TellUser.debug(f'adding cold generated from this DER: ' +
-                                f'{der_inst.unique_tech_id()}')
-                agg_thermal_cooling_power += der_inst.get_cold_generated(mask)
+                cooling_powers.append(der_inst.get_cold_generated(mask))
+                thermal_ders.append(der_inst.unique_tech_id())
+        if thermal_ders:
+            TellUser.debug(f'adding thermal power recovered from these DERs: {thermal_ders}')
+
+        load_sum = aggregate(load_sum, loads)
+        der_dispatch_net_power = aggregate(der_dispatch_net_power, dispatch_powers)
+        agg_steam_heating_power = aggregate(agg_steam_heating_power, steam_powers)
+        agg_hotwater_heating_power = aggregate(agg_hotwater_heating_power, hotwater_powers)
+        agg_thermal_cooling_power = aggregate(agg_thermal_cooling_power, cooling_powers)
 
         ##NOTE: these print statements disclose info for get_state_of_system Results
         #print('\nget_state_of_system Result:')
@@ -272,8 +308,10 @@ class MicrogridPOI(POI):
                                                                        steam_in, hotwater_in,
                                                                        cold_in, annuity_scalar)
 
-        agg_heat_consumed_by_chillers = cvx.Parameter(value=np.zeros(sum(mask)), shape=sum(mask), name='HeatUsedByChillersZero')
+        window = self.window if self.window is not None else as_window(mask)
+        agg_heat_consumed_by_chillers = cvx.Parameter(value=np.zeros(window.length), shape=window.length, name='HeatUsedByChillersZero')
 
+        heat_consumed = []
         # print parameters for each DER
         for der_instance in self.active_ders:
             ##NOTE: these print statements are helpful for understanding technologies
@@ -287,7 +325,8 @@ class MicrogridPOI(POI):
 
             # aggregate heat consumed by each chiller that is powered by heat
             if der_instance.tag == 'Chiller':
-                agg_heat_consumed_by_chillers += der_instance.get_heat_consumed(mask)
+                heat_consumed.append(der_instance.get_heat_consumed(window))
+        agg_heat_consumed_by_chillers = aggregate(agg_heat_consumed_by_chillers, heat_consumed)
 
         ##NOTE: these print statements disclose info for these function arguments
         #print('\nopt_size: ', sum(mask))
@@ -302,11 +341,11 @@ class MicrogridPOI(POI):
         if self.site_steam_load is not None:
             if steam_in.variables():
                 TellUser.debug('adding steam thermal power balance constraint')
-                constraint_list += [cvx.NonPos(-1 * steam_in + self.site_steam_load[mask])]
+                constraint_list += [cvx.NonPos(-1 * steam_in + window.select(self.site_steam_load))]
         if self.site_hotwater_load is not None:
             if hotwater_in.variables():
                 TellUser.debug('adding hot water thermal power balance constraint')
-                constraint_list += [cvx.NonPos(-1 * hotwater_in + agg_heat_consumed_by_chillers + self.site_hotwater_load[mask])]
+                constraint_list += [cvx.NonPos(-1 * hotwater_in + agg_heat_consumed_by_chillers + window.select(self.site_hotwater_load))]
                 # NOTE:
                 # if a chiller is powered by heat, it will consume heat in the form of hotwater.
                 # this additional hot water must be generated by a technology that can produce heat (Boiler, CHP)
@@ -316,7 +355,7 @@ class MicrogridPOI(POI):
         if self.site_cooling_load is not None:
             if cold_in.variables():
                 TellUser.debug('adding thermal cooling power balance constraint')
-                constraint_list += [cvx.NonPos(-1 * cold_in + self.site_cooling_load[mask])]
+                constraint_list += [cvx.NonPos(-1 * cold_in + window.select(self.site_cooling_load))]
 
         return obj_expression, constraint_list
 
@@ -335,110 +374,117 @@ class MicrogridPOI(POI):
             results pertaining to this instance
 
         """
-        results = pd.DataFrame(index=index)
-        monthly_data = pd.DataFrame()
+        results = ReportBuilder(index)
+        monthly_reports = []
 
         # initialize all the data columns that will ALWAYS be present in our results
-        results.loc[:, 'Total Original Load (kW)'] = 0
-        results.loc[:, 'Total Load (kW)'] = 0
-        results.loc[:, 'Total Generation (kW)'] = 0
-        results.loc[:, 'Total Storage Power (kW)'] = 0
-        results.loc[:, 'Aggregated State of Energy (kWh)'] = 0
+        # NOTE: each DER's report is put in front of the reports of the DERs before it
+        reports = [der.timeseries_report() for der in self.der_list]
+        der_columns = [None] * len(reports)
+        for i in reversed(range(len(reports))):
+            der_columns[i] = results.add_report(reports[i])
+        original_load = results.add_column('Total Original Load (kW)')
+        total_load = results.add_column('Total Load (kW)')
+        total_generation = results.add_column('Total Generation (kW)')
+        total_storage = results.add_column('Total Storage Power (kW)')
+        aggregated_soe = results.add_column('Aggregated State of Energy (kWh)')
 
         # thermal loads and initialize thermal generation totals
-        if self.site_cooling_load is not None:
-            results['THERMAL LOAD:' + ' Site Cooling Thermal Load (kW)'] = self.site_cooling_load
-            results.loc[:, 'Total Thermal Cooling Generation (kW)'] = 0
-            results.loc[:, 'Total Thermal Cooling Load (kW)'] = self.site_cooling_load
-        if self.site_hotwater_load is not None:
-            results['THERMAL LOAD:' + ' Site Hot Water Thermal Load (kW)'] = self.site_hotwater_load
-            results.loc[:, 'Total Thermal Hot Water Generation (kW)'] = 0
-            results.loc[:, 'Total Thermal Hot Water Load (kW)'] = self.site_hotwater_load
-        if self.site_steam_load is not None:
-            results['THERMAL LOAD:' + ' Site Steam Thermal Load (kW)'] = self.site_steam_load
-            results.loc[:, 'Total Thermal Steam Generation (kW)'] = 0
-            results.loc[:, 'Total Thermal Steam Load (kW)'] = self.site_steam_load
+        thermal_totals = {}
+        for thermal_load, site_load in [('Cooling', self.site_cooling_load),
+                                        ('Hot Water', self.site_hotwater_load),
+                                        ('Steam', self.site_steam_load)]:
+            if site_load is not None:
+                results.add_column(f'THERMAL LOAD: Site {thermal_load} Thermal Load (kW)',
+                                   site_load)
+                thermal_totals[thermal_load] = \
+                    results.add_column(f'Total Thermal {thermal_load} Generation (kW)'), \
+                    results.add_column(f'Total Thermal {thermal_load} Load (kW)', site_load)
+        net_load = results.add_column('Net Load (kW)')
+        if self.active_load_dump:
+            load_dump = results.add_column('Load Dump (kW)')
+        net_thermal = {thermal_load: results.add_column(f'Net Thermal {thermal_load} Load (kW)')
+                       for thermal_load in ['Hot Water', 'Steam', 'Cooling']
+                       if thermal_load in thermal_totals}
 
-        for der in self.der_list:
-            report_df = der.timeseries_report()
-            results = pd.concat([report_df, results], axis=1)
+        for der, columns in zip(self.der_list, der_columns):
             if is_dispatch_opt:
+                tech_id = der.unique_tech_id()
                 if der.technology_type in ['Generator', 'Intermittent Resource']:
-                    results.loc[:, 'Total Generation (kW)'] += \
-                        results[f'{der.unique_tech_id()} Electric Generation (kW)']
+                    results.add_to_total(total_generation,
+                                         columns[f'{tech_id} Electric Generation (kW)'])
                 if der.technology_type == 'Energy Storage System':
-                    results.loc[:, 'Total Storage Power (kW)'] += \
-                        results[f'{der.unique_tech_id()} Power (kW)']
-                    results.loc[:, 'Aggregated State of Energy (kWh)'] += \
-                        results[f'{der.unique_tech_id()} State of Energy (kWh)']
+                    results.add_to_total(total_storage, columns[f'{tech_id} Power (kW)'])
+                    results.add_to_total(aggregated_soe,
+                                         columns[f'{tech_id} State of Energy (kWh)'])
                 if der.technology_type == 'Load':
-                    results.loc[:, 'Total Original Load (kW)'] += \
-                        results[f'{der.unique_tech_id()} Original Load (kW)']
+                    results.add_to_total(original_load, columns[f'{tech_id} Original Load (kW)'])
                     if der.tag == "ControllableLoad":
-                        results.loc[:, 'Total Load (kW)'] += \
-                            results[f'{der.unique_tech_id()} Load (kW)']
+                        results.add_to_total(total_load, columns[f'{tech_id} Load (kW)'])
                     else:
-                        results.loc[:, 'Total Load (kW)'] += \
-                            results[f'{der.unique_tech_id()} Original Load (kW)']
+                        results.add_to_total(total_load, columns[f'{tech_id} Original Load (kW)'])
                 if der.technology_type == 'Electric Vehicle':
-                    results.loc[:, 'Total Load (kW)'] += \
-                        results[f'{der.unique_tech_id()} Charge (kW)']
-                    if der.tag == 'ElectricVehicle1':
-                        results.loc[:, 'Aggregated State of Energy (kWh)'] += \
-                            results[f'{der.unique_tech_id()} State of Energy (kWh)']
+                    results.add_to_total(total_load, columns[f'{tech_id} Charge (kW)'])
+                    if der.tag in ['ElectricVehicle1', 'ElectricVehicleFleet']:
+                        results.add_to_total(aggregated_soe,
+                                             columns[f'{tech_id} State of Energy (kWh)'])
                 if der.tag == 'Chiller' and der.is_hot:
                     # an absorption chiller increases the total thermal hot water load
                     # by its generation (Cooling) divided by its COP
-                    results.loc[:, 'Total Thermal Hot Water Load (kW)'] += \
-                        results[f'{der.unique_tech_id()} Cooling Generation (kW)'] / der.cop
+                    results.add_to_total(thermal_totals['Hot Water'][1],
+                                         columns[f'{tech_id} Cooling Generation (kW)'],
+                                         1 / der.cop)
                 if der.tag == 'Chiller' and der.is_electric:
                     # an electric chiller adds to total electrical load
                     # by its generation (Cooling) divided by its COP
-                    results.loc[:, 'Total Load (kW)'] += \
-                        results[f'{der.unique_tech_id()} Cooling Generation (kW)'] / der.cop
+                    results.add_to_total(total_load, columns[f'{tech_id} Cooling Generation (kW)'],
+                                         1 / der.cop)
                 if der.tag == 'Boiler' and der.is_electric:
                     # an electric boiler adds to total electrical load
                     # by its generation (Hot Water + Steam) divided by its COP
-                    results.loc[:, 'Total Load (kW)'] += \
-                        ( results[f'{der.unique_tech_id()} Hot Water Generation (kW)'] + \
-                        results[f'{der.unique_tech_id()} Steam Generation (kW)'] ) / der.cop
+                    results.add_to_total(total_load,
+                                         columns[f'{tech_id} Hot Water Generation (kW)'],
+                                         1 / der.cop)
+                    results.add_to_total(total_load, columns[f'{tech_id} Steam Generation (kW)'],
+                                         1 / der.cop)
                 #if der.is_hot:
                 if der.tag in ['CHP', 'Boiler']:
                     # thermal heating generation
-                    results.loc[:, 'Total Thermal Hot Water Generation (kW)'] += \
-                        results[f'{der.unique_tech_id()} Hot Water Generation (kW)']
-                    results.loc[:, 'Total Thermal Steam Generation (kW)'] += \
-                        results[f'{der.unique_tech_id()} Steam Generation (kW)']
+                    results.add_to_total(thermal_totals['Hot Water'][0],
+                                         columns[f'{tech_id} Hot Water Generation (kW)'])
+                    results.add_to_total(thermal_totals['Steam'][0],
+                                         columns[f'{tech_id} Steam Generation (kW)'])
                 if der.is_cold:
                     # thermal cooling generation
-                    results.loc[:, 'Total Thermal Cooling Generation (kW)'] += \
-                        results[f'{der.unique_tech_id()} Cooling Generation (kW)']
-            report = der.monthly_report()
-            monthly_data = pd.concat([monthly_data, report], axis=1, sort=False)
+                    results.add_to_total(thermal_totals['Cooling'][0],
+                                         columns[f'{tech_id} Cooling Generation (kW)'])
+            monthly_reports.append(der.monthly_report())
+        results.build()
+        monthly_data = pd.concat(monthly_reports, axis=1, sort=False) if monthly_reports \
+            else pd.DataFrame()
+
         # assumes the orginal net load only does not contain the Storage system
         # check if Total Original Load and Total Load are the same.
-        if np.all(results['Total Load (kW)'] == results['Total Original Load (kW)']):
+        drop = []
+        if np.all(results.column(total_load) == results.column(original_load)):
             # Drop Total Original Load
-            results.drop('Total Original Load (kW)', axis=1, inplace=True)
+            drop.append(original_load)
         # net load is the load seen at the POI
-        results.loc[:, 'Net Load (kW)'] = \
-            results.loc[:, 'Total Load (kW)'] - results.loc[:, 'Total Generation (kW)'] - \
-            results.loc[:, 'Total Storage Power (kW)']
+        results.column(net_load)[:] = results.column(total_load) - \
+            results.column(total_generation) - results.column(total_storage)
         # load dump is the excess generation that is wasted
         #     for cases where we are applying a POI constraint,
         #     this is where (net load + max_export) is negative, otherwise it's all zeroes
         if self.active_load_dump:
             if self.apply_poi_constraints:
-                results.loc[:, 'Load Dump (kW)'] = (results.loc[:, 'Net Load (kW)'] + self.max_export) * -1
-                results.loc[:, 'Load Dump (kW)'].where(results.loc[:, 'Load Dump (kW)'] > 0, 0, inplace=True)
+                dump = (results.column(net_load) + self.max_export) * -1
+                results.column(load_dump)[:] = np.where(dump > 0, dump, 0)
             else:
-                results.loc[:, 'Load Dump (kW)'] = results.loc[:, 'Net Load (kW)'] * 0
                 TellUser.warning('With a Load Dump activated and Scenario--apply_interconnection_constraints OFF, the Load Dump will be all zeroes.')
         # net thermal loads
-        for thermal_load in ['Hot Water', 'Steam', 'Cooling']:
-            if f'Total Thermal {thermal_load} Load (kW)' in results.columns:
-                results.loc[:, f'Net Thermal {thermal_load} Load (kW)'] = \
-                    results.loc[:, f'Total Thermal {thermal_load} Load (kW)'] - \
-                    results.loc[:, f'Total Thermal {thermal_load} Generation (kW)']
+        for thermal_load, position in net_thermal.items():
+            generation, load = thermal_totals[thermal_load]
+            results.column(position)[:] = results.column(load) - results.column(generation)
+        results = results.frame(drop)
 
         return results, monthly_data
@@ -32,6 +32,7 @@ Result.py
 
 """
 
+from types import SimpleNamespace
 import pandas as pd
 from storagevet.Result import Result
 from storagevet.ErrorHandling import *
@@ -53,6 +54,7 @@ class MicrogridResult(Result):
         self.reliability_sizing = scenario.reliability_sizing
         self.opt_engine = scenario.opt_engine
         self.sizing_df = pd.DataFrame()
+        self.solver_profile = pd.DataFrame(scenario.solver_profile)
         for der in self.poi.der_list:
             if der.tag == "Battery":
                 # if degradation module is turned on, then reset all CBA attributes to reflect yearly cycle counts
@@ -116,4 +118,89 @@ class MicrogridResult(Result):
                                                                                 self.csv_label + '.csv'))
         if self.cost_benefit_analysis.ecc_df is not None:
             self.cost_benefit_analysis.ecc_df.to_csv(path_or_buf=Path(savepath, 'ecc_breakdown' + self.csv_label + '.csv'))
+        if not self.solver_profile.empty:
+            self.solver_profile.to_csv(path_or_buf=Path(savepath, 'solver_profile' + self.csv_label + '.csv'), index=False)
         TellUser.info(f'DER results have been saved to: {savepath}')
+
+    def case_summary(self):
+        """ Packs the results that are needed after the case is saved (the NPV
+        that sensitivity_summary reports) into plain JSON text, so a case that
+        ran on a worker process can hand them back without pickling any result
+        objects
+
+        Returns: dictionary of JSON strings
+
+        """
+        return {'npv': self.cost_benefit_analysis.npv.to_json(orient='split', double_precision=15),
+                'solver_profile_summary': self.solver_profile_summary().to_json(double_precision=15)}
+
+    def solver_profile_summary(self):
+        """ Sums up the solver profile of the case: the time spent in each step of the
+        optimization windows, and the window that took the longest to solve
+
+        Returns: Series of the summary
+
+        """
+        summary = pd.Series({'Windows': len(self.solver_profile)}, dtype=object)
+        if self.solver_profile.empty:
+            return summary
+        profile = self.solver_profile
+        for column in ['Build Time (s)', 'Compile Time (s)', 'Solver Time (s)', 'Solve Time (s)',
+                       'Save Time (s)']:
+            if column in profile.columns:
+                summary[f'Total {column}'] = profile[column].sum()
+        if 'Solve Time (s)' in profile.columns and profile['Solve Time (s)'].notna().any():
+            slowest = profile['Solve Time (s)'].idxmax()
+            summary['Slowest Window'] = profile.loc[slowest, 'Window']
+            summary['Slowest Window Solve Time (s)'] = profile.loc[slowest, 'Solve Time (s)']
+        if 'Status' in profile.columns:
+            solved = profile['Status'].notna()
+            summary['Non-optimal Windows'] = int((profile.loc[solved, 'Status'] != 'optimal').sum())
+        for column in ['Variables', 'Integer Variables', 'Constraints']:
+            if column in profile.columns:
+                summary[f'Max {column}'] = profile[column].max()
+        return summary
+
+    @classmethod
+    def save_solver_profile_summary(cls):
+        """ Saves the solver profile summary of every case (one row per case) in the
+        results directory
+
+        """
+        summaries = pd.DataFrame({key: instance.solver_profile_summary()
+                                  for key, instance in cls.instances.items()}).T
+        summaries.index.name = 'Case'
+        summaries.to_csv(path_or_buf=Path(cls.dir_abs_path, 'solver_profile_summary' + cls.csv_label + '.csv'))
+
+    @classmethod
+    def add_case_summary(cls, key, summary):
+        """ Records the results of a case that ran (and was saved) on a worker
+        process. Cases should be added in order, like add_instance
+
+        Args:
+            key (int): the key that corresponds to the case
+            summary (dict): the output of case_summary for that case
+
+        """
+        cls.instances[key] = CaseSummary(pd.read_json(summary['npv'], orient='split'),
+                                         pd.read_json(summary['solver_profile_summary'], typ='series'))
+
+
+class CaseSummary:
+    """ Stands in for the MicrogridResult of a case that ran on a worker process.
+    It only keeps what sensitivity_summary needs; everything else was saved to
+    the case's results files by the worker.
+
+    """
+
+    def __init__(self, npv, solver_profile_summary):
+        """
+            Args:
+                npv (DataFrame): the net present value of the case
+                solver_profile_summary (Series): the summary of the case's solver profile
+        """
+        self.cost_benefit_analysis = SimpleNamespace(npv=npv)
+        self.profile_summary = solver_profile_summary
+
+    def solver_profile_summary(self):
+        return self.profile_summary
@@ -44,7 +44,9 @@ from dervet.MicrogridDER.Chiller import Chiller
 from dervet.MicrogridDER.Boiler import Boiler
 from dervet.MicrogridDER.CombinedHeatPower import CHP
 from dervet.MicrogridDER.LoadControllable import ControllableLoad
-from dervet.MicrogridDER.ElectricVehicles import ElectricVehicle1, ElectricVehicle2
+from dervet.MicrogridDER.ElectricVehicles import ElectricVehicle1, ElectricVehicle2, \
+    ElectricVehicleFleet
+from dervet.MicrogridDER.ElectricVehicleCohorts import fleet_cohorts
 from storagevet.ValueStreams.DAEnergyTimeShift import DAEnergyTimeShift
 from storagevet.ValueStreams.FrequencyRegulation import FrequencyRegulation
 from storagevet.ValueStreams.NonspinningReserve import NonspinningReserve
@@ -62,8 +64,32 @@ from storagevet.Scenario import Scenario
 from dervet.CBA import CostBenefitAnalysis
 from dervet.MicrogridPOI import MicrogridPOI
 from dervet.MicrogridServiceAggregator import MicrogridServiceAggregator
+from dervet.ProblemTemplate import ProblemTemplate, problem_fingerprint, problem_signature
+from dervet.Checkpoint import WindowCheckpoint, restore, snapshot
+from dervet.RepresentativePeriods import representative_periods, sizing_window, \
+    weight_operating_costs
+from dervet.Presolve import presolve, set_fixed_values
+from dervet.WindowSlice import WindowSlice
+from dervet.SolverRouting import MILP_SOLVER, integer_variable_count, route_solver
 from storagevet.ErrorHandling import *
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from cvxpy.reductions.solution import Solution
+import cvxpy as cvx
 import numpy as np
+import pandas as pd
+import pickle
+import time
+
+# the scenario that a worker process solves optimization windows of
+worker_scenario = None
+# the number of the optimization window that DERs are sized on in representative period sizing
+SIZING_WINDOW = -1
+# DERs whose optimization windows do not depend on each other (unless they degrade). An EV
+# can be plugged in over the end of a window and a controllable load shifts its energy
+# between windows, so windows with them are solved one after another
+WINDOW_INDEPENDENT_DERS = ['Battery', 'CAES', 'PV', 'ICE', 'DieselGenset', 'CT', 'CHP', 'Chiller',
+                           'Boiler', 'Load', 'ThermalLoad']
 
 
 class MicrogridScenario(Scenario):
@@ -84,6 +110,7 @@ class MicrogridScenario(Scenario):
         'ControllableLoad': ControllableLoad,
         'ElectricVehicle1': ElectricVehicle1,
         'ElectricVehicle2': ElectricVehicle2,
+        'ElectricVehicleFleet': ElectricVehicleFleet,
     }
     VS_CLASS_MAP = {  # value stream
         'Deferral': Deferral,
@@ -123,6 +150,29 @@ class MicrogridScenario(Scenario):
             'ControllableLoad': input_tree.ControllableLoad
         })
         self.value_stream_input_map.update({'Reliability': input_tree.Reliability})
+        # optimize ElectricVehicle1s that plug in and out at the same times as one fleet
+        if input_tree.Scenario.get('ev_fleet_cohorts') and input_tree.ElectricVehicle1:
+            fleets, singles = fleet_cohorts(input_tree.ElectricVehicle1)
+            self.technology_inputs_map.update({'ElectricVehicle1': singles,
+                                               'ElectricVehicleFleet': fleets})
+            TellUser.info(f"{len(input_tree.ElectricVehicle1) - len(singles)} ElectricVehicle1s "
+                          f"are optimized as {len(fleets)} fleet cohorts")
+        # number of processes to solve independent optimization windows on
+        self.window_workers = int(input_tree.Scenario.get('window_workers') or 1)
+        # templates of the optimization problem, by structure (None if they are not used)
+        self.problem_templates = {} if input_tree.Scenario.get('problem_templates') else None
+        # solutions of the windows solved lately, by problem fingerprint (None if windows are
+        # not replayed, see solve_window)
+        self.solved_windows = OrderedDict() if input_tree.Scenario.get('replay_windows') else None
+        # one row of timings and problem sizes per optimization window (see profile_window)
+        self.solver_profile = []
+        # on-disk store of the solved optimization windows (see use_checkpoint)
+        self.checkpoint = None
+        self.resume = False
+        # size DERs on this many representative days/weeks, instead of the whole year
+        self.sizing_periods = input_tree.Scenario.get('sizing_periods')
+        self.sizing_period_length = input_tree.Scenario.get('sizing_period_length') or 'day'
+        self.time_series_inputs = input_tree.Scenario['time_series']
         # flags to indicate which module dervet should go to
         self.deferral_sizing = False
         self.reliability_sizing = False
@@ -243,8 +293,8 @@ class MicrogridScenario(Scenario):
                                 'off optimal sizing or using energy prices that are non-negative.')
         except KeyError:
             pass
-        # make sure the optimization horizon is the whole year
-        if self.n != 'year':
+        # make sure the optimization horizon is the whole year (unless sizing on representative periods)
+        if self.n != 'year' and not self.sizing_periods:
             TellUser.error('Trying to size without setting the optimization window to \'year\'')
             error = True
         # any wholesale markets active?
@@ -341,8 +391,19 @@ class MicrogridScenario(Scenario):
         if not self.opt_engine:
             return
 
+        if self.sizing_periods and self.poi.is_sizing_optimization:
+            self.size_on_representative_periods(alpha)
+            alpha = 1
+
         TellUser.info("Starting optimization loop")
-        for opt_period in self.optimization_levels.predictive.unique():
+        opt_periods = self.optimization_levels.predictive.unique()
+        if self.checkpoint is not None:
+            opt_periods = self.resume_from_checkpoint(opt_periods)
+        ignore_der_costs = self.service_agg.post_facto_reliability_only()
+        if self.window_workers > 1 and len(opt_periods) > 1 and self.windows_are_independent():
+            if self.solve_windows_on_pool(opt_periods, alpha, ignore_der_costs):
+                return
+        for opt_period in opt_periods:
 
             # setup + run optimization then return optimal objective costs
             functions, constraints, sub_index = self.set_up_optimization(opt_period,
@@ -350,6 +411,7 @@ class MicrogridScenario(Scenario):
                                                                          ignore_der_costs=self.service_agg.post_facto_reliability_only())
             if not len(constraints) and not len(functions.values()):
                 TellUser.info(f"Optimization window #{opt_period} does not have any constraints or objectives to minimize -- SKIPPING...")
+                self.save_checkpoint(opt_period, sub_index)
                 continue
 
             ##NOTE: these print statements reveal the final constraints and costs for debugging
@@ -363,6 +425,379 @@ class MicrogridScenario(Scenario):
             cvx_problem, obj_expressions, cvx_error_msg = self.solve_optimization(functions, constraints, force_glpk_mi=self.poi.has_thermal_load)
             self.save_optimization_results(opt_period, sub_index, cvx_problem, obj_expressions, cvx_error_msg)
 
+    def size_on_representative_periods(self, annuity_scalar):
+        """ Sizes the DERs on SIZING_PERIODS representative days (or weeks) of the first
+        year, instead of the whole year. The representative periods are solved as one
+        problem, in order, so the state of energy of an ESS carries over from one to the
+        next. The dispatch costs are weighted so the periods stand in for the whole year
+        (and demand charges so the months with a period stand in for every month). The
+        sizes are then fixed, and every window is dispatched at full resolution
+
+        Args:
+            annuity_scalar (float): a scalar value to be multiplied by any yearly cost or benefit
+
+        """
+        chosen, _ = representative_periods(self.time_series_inputs, self.sizing_period_length,
+                                           self.sizing_periods)
+        in_chosen, weight, billing_weight = sizing_window(self.optimization_levels.index,
+                                                          self.sizing_period_length, chosen)
+        if weight is None:
+            TellUser.error('None of the representative periods are in the first year optimized')
+            raise ParameterError('See dervet.log for more information.')
+        TellUser.info(f'Sizing DERs on {len(chosen)} representative {self.sizing_period_length}s '
+                      f'({self.sizing_period_length}s of the year: {chosen}), each weighted by {weight:.2f}')
+        optimization_levels = self.optimization_levels
+        self.optimization_levels = optimization_levels.copy()
+        self.optimization_levels.loc[in_chosen, 'predictive'] = SIZING_WINDOW
+        try:
+            functions, constraints, sub_index = \
+                self.set_up_optimization(SIZING_WINDOW, annuity_scalar=annuity_scalar,
+                                         ignore_der_costs=self.service_agg.post_facto_reliability_only())
+        finally:
+            self.optimization_levels = optimization_levels
+        functions = weight_operating_costs(functions, weight, self.billing_period_terms(),
+                                           billing_weight)
+        cvx_problem, _, cvx_error_msg = self.solve_optimization(functions, constraints,
+                                                                force_glpk_mi=self.poi.has_thermal_load)
+        if cvx_problem.status != cvx.OPTIMAL:
+            TellUser.error(f'The representative period sizing problem was {cvx_problem.status}. {cvx_error_msg}')
+            raise ParameterError('See dervet.log for more information.')
+        for der in self.poi.active_ders:
+            der.set_size()
+        # the sizes are set, so every window only dispatches the DERs
+        self.poi.is_sizing_optimization = False
+
+    def billing_period_terms(self):
+        """
+
+        Returns: the keys of the objective terms that are charged once per billing period
+
+        """
+        return [getattr(value_stream, 'name', key)
+                for key, value_stream in self.service_agg.value_streams.items() if key == 'DCM']
+
+    def use_checkpoint(self, directory, resume=False):
+        """ Saves the results of every optimization window to DIRECTORY once it is solved
+
+        Args:
+            directory (str, Path): the directory to keep the checkpoint of the case in
+            resume (bool): start after the windows that were already saved there
+
+        """
+        self.checkpoint = WindowCheckpoint(directory)
+        self.resume = resume
+        if not resume:
+            self.checkpoint.clear()
+
+    def resume_from_checkpoint(self, opt_periods):
+        """ Puts the results of the windows that were already solved (and saved to the
+        checkpoint, in order) back into the DERs and value streams
+
+        Args:
+            opt_periods (list): the optimization window numbers, in order
+
+        Returns: the windows that still have to be solved
+
+        """
+        if not self.resume:
+            return opt_periods
+        if self.poi.is_sizing_optimization:
+            TellUser.warning('DERs are being sized, so every optimization window is solved again')
+            self.checkpoint.clear()
+            return opt_periods
+        solved = 0
+        for opt_period in opt_periods:
+            record = self.checkpoint.load(opt_period)
+            sub_index = self.optimization_levels.loc[self.optimization_levels.predictive == opt_period].index
+            if record is None or not record['index'].equals(sub_index) or \
+                    set(record['ders']) != {der.unique_tech_id() for der in self.poi.der_list}:
+                break
+            for der in self.poi.der_list:
+                restore(der, record['ders'][der.unique_tech_id()])
+            for name, value_stream in self.service_agg.value_streams.items():
+                restore(value_stream, record['value streams'][name])
+            if record['objective values'] is not None:
+                self.objective_values = record['objective values']
+            solved += 1
+        TellUser.info(f'Resuming after {solved} optimization windows that were already solved')
+        return opt_periods[solved:]
+
+    def save_checkpoint(self, opt_window_num, sub_index):
+        """ Saves the results of an optimization window to the checkpoint (if there is one)
+
+        Args:
+            opt_window_num (int): the optimization window number
+            sub_index (Index): the timesteps of the window
+
+        """
+        if self.checkpoint is None:
+            return
+        self.checkpoint.save(opt_window_num, sub_index, self.poi.der_list,
+                             self.service_agg.value_streams,
+                             getattr(self, 'objective_values', None))
+
+    def windows_are_independent(self):
+        """ Checks if the optimization windows can be solved in any order: the
+        solution of a window must not change how any other window is built. That
+        is only the case if every DER is one of WINDOW_INDEPENDENT_DERS, no DER is
+        being sized (its size is set by the first window), no DER degrades (its
+        capacity depends on earlier windows) and no DER has a state of charge target
+        for reliability
+
+        Returns: True if every optimization window is independent of the others
+
+        """
+        if self.poi.is_sizing_optimization:
+            TellUser.debug('Optimization windows depend on each other: DERs are being sized')
+            return False
+        for der in self.poi.der_list:
+            if der.tag not in WINDOW_INDEPENDENT_DERS:
+                TellUser.debug(f'Optimization windows depend on each other: {der.name} is a {der.tag}')
+                return False
+            if getattr(der, 'incl_cycle_degrade', False):
+                TellUser.debug(f'Optimization windows depend on each other: {der.name} degrades')
+                return False
+            if isinstance(getattr(der, 'soc_target', None), cvx.Variable):
+                TellUser.debug(f'Optimization windows depend on each other: {der.name} has a '
+                               f'state of charge target for reliability')
+                return False
+        return True
+
+    def solve_windows_on_pool(self, opt_periods, annuity_scalar, ignore_der_costs):
+        """ Solves independent optimization windows on a pool of WINDOW_WORKERS
+        processes. Each worker gets a copy of the scenario, and builds, solves and
+        saves the results of whole windows. Back in this process, the results of
+        every window (see Checkpoint.snapshot) are put into the DERs and value
+        streams in order, as if the windows were solved one after another
+
+        Args:
+            opt_periods (list): the optimization window numbers, in order
+            annuity_scalar (float): a scalar value to be multiplied by any yearly cost or benefit
+            ignore_der_costs (bool): flag to indicate if we do not want to consider to economics
+                of operating the DERs in our optimization
+
+        Returns: False if the scenario could not be copied to the workers (nothing was solved)
+
+        """
+        try:
+            pickled_scenario = pickle.dumps(self)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            TellUser.warning(f'Optimization windows will be solved one at a time: {e}')
+            return False
+        TellUser.info(f'Solving {len(opt_periods)} independent optimization windows on '
+                      f'{self.window_workers} processes')
+        with ProcessPoolExecutor(max_workers=self.window_workers,
+                                 initializer=initialize_window_worker,
+                                 initargs=(pickled_scenario, )) as pool:
+            futures = [pool.submit(solve_window_on_worker, opt_period, annuity_scalar,
+                                   ignore_der_costs)
+                       for opt_period in opt_periods]
+            for opt_period, future in zip(opt_periods, futures):
+                record, profile = future.result()
+                self.solver_profile.append(profile)
+                sub_index = self.optimization_levels.loc[self.optimization_levels.predictive == opt_period].index
+                if record is None:
+                    TellUser.info(f"Optimization window #{opt_period} does not have any constraints or objectives to minimize -- SKIPPING...")
+                else:
+                    self.load_window_results(record)
+                self.save_checkpoint(opt_period, sub_index)
+        return True
+
+    def load_window_results(self, record):
+        """ Puts the results of an optimization window that was solved on a worker
+        process into the DERs and value streams
+
+        Args:
+            record (dict): output of solve_window_on_worker
+
+        """
+        for der in self.poi.der_list:
+            restore(der, record['ders'][der.unique_tech_id()])
+        for name, value_stream in self.service_agg.value_streams.items():
+            restore(value_stream, record['value streams'][name])
+        if record['objective values'] is not None:
+            self.objective_values = pd.concat([self.objective_values, record['objective values']],
+                                              sort=True)
+        if record['solvers'] is not None:
+            self.solvers = self.solvers.union(record['solvers'])
+
+    def load_window_solution(self, functions, constraints, solution, variables):
+        """ Builds the problem of an optimization window and fills it in with a solution
+        that was found for a problem with the same structure (by its template, or for an
+        earlier window that was the same problem). The values are matched
+        to the variables of the window by the numbering of problem_signature. If the
+        solution does not have a value of the right shape for every one of them, the
+        window is solved here instead
+
+        Args:
+            functions (dict): functions or objectives of the optimization
+            constraints (list): constraints of the optimization
+            solution (tuple): the solution (see window_solution)
+            variables (list): the variables of the window, in the order problem_signature
+                numbers them (None if the window does not have a signature)
+
+        Returns: the solved cvx problem, and any error message from solving it
+
+        """
+        status, opt_val, primal_values, dual_values, cvx_error_msg = solution
+        prob = cvx.Problem(cvx.Minimize(sum(functions.values())), constraints)
+        if variables is None or primal_values is None or len(variables) != len(primal_values) or \
+                {variable.id for variable in variables} != {variable.id for variable in prob.variables()} or \
+                any(primal is not None and np.shape(primal) != variable.shape
+                    for variable, primal in zip(variables, primal_values)):
+            TellUser.warning('A solution does not match the variables of its optimization window, '
+                             'so the window is solved again')
+            start = time.time()
+            cvx_problem, _, cvx_error_msg = \
+                super(MicrogridScenario, self).solve_optimization(functions, constraints,
+                                                                  force_glpk_mi=integer_variable_count(prob) > 0)
+            self.profile_solve(cvx_problem, time.time() - start)
+            return cvx_problem, cvx_error_msg
+        primal_vars = {variable.id: value for variable, value in zip(variables, primal_values)}
+        dual_vars = {constraint.id: value for constraint, value in zip(prob.constraints, dual_values)
+                     if value is not None}
+        prob.unpack(Solution(status, opt_val, primal_vars, dual_vars, {}))
+        return prob, cvx_error_msg
+
+    def solve_optimization(self, obj_expression, obj_const, force_glpk_mi=False):
+        """ Solves the optimization problem of a window. The problem only goes to the MILP
+        solver if it has integer or boolean variables (see route_solver). If
+        PROBLEM_TEMPLATES is on, the window is solved with the template of its structure,
+        so only the first window with each structure is compiled, and the solution is
+        loaded into the window
+
+        Args:
+            obj_expression (dict): functions or objectives of the optimization
+            obj_const (list): constraints of the optimization
+            force_glpk_mi (bool): asks for GLPK_MI (it is only used if the problem is a MILP)
+
+        Returns: the solved cvx problem, the objective expressions, and any error message
+
+        """
+        functions, constraints, fixed_variables = self.presolve_window(obj_expression, obj_const)
+        cvx_problem, cvx_error_msg = self.solve_window(functions, constraints, force_glpk_mi)
+        set_fixed_values(fixed_variables)
+        return cvx_problem, obj_expression, cvx_error_msg
+
+    def solve_window(self, functions, constraints, force_glpk_mi=False):
+        """ Solves the (presolved) problem of an optimization window (see solve_optimization)
+
+        Args:
+            functions (dict): functions or objectives of the optimization
+            constraints (list): constraints of the optimization
+            force_glpk_mi (bool): asks for GLPK_MI (it is only used if the problem is a MILP)
+
+        Returns: the solved cvx problem, and any error message from solving it
+
+        """
+        solver, reason = route_solver(cvx.Problem(cvx.Minimize(sum(functions.values())),
+                                                  constraints))
+        if force_glpk_mi and solver != MILP_SOLVER:
+            TellUser.debug('GLPK_MI was asked for, but the problem does not have any integer variables')
+        TellUser.info(f'Solving the problem with {solver}: {reason}')
+        force_glpk_mi = solver == MILP_SOLVER
+        signature = data = variables = fingerprint = solution = None
+        if self.solved_windows is not None or self.problem_templates is not None:
+            signature, data, variables = problem_signature(functions, constraints)
+        if self.solved_windows is not None and signature is not None:
+            # a window that is the same problem as a window that was solved lately (like an
+            # analysis year with the same inputs as the year before it) gets its solution
+            fingerprint = problem_fingerprint(signature, data)
+            solution = self.solved_windows.get(fingerprint)
+        if solution is not None:
+            self.solved_windows.move_to_end(fingerprint)
+            TellUser.info('The problem is the same as the one of an optimization window that was '
+                          'already solved, so its solution is used')
+            if self.solver_profile:
+                self.solver_profile[-1].update({'Status': solution[0], 'Replayed': True})
+        elif self.problem_templates is not None and signature is not None:
+            solution = self.solve_with_template(functions, constraints, signature, data)
+        if solution is not None:
+            cvx_problem, cvx_error_msg = self.load_window_solution(functions, constraints,
+                                                                   solution, variables)
+        else:
+            start = time.time()
+            cvx_problem, _, cvx_error_msg = \
+                super(MicrogridScenario, self).solve_optimization(functions, constraints,
+                                                                  force_glpk_mi=force_glpk_mi)
+            self.profile_solve(cvx_problem, time.time() - start)
+        if fingerprint is not None and fingerprint not in self.solved_windows \
+                and cvx_problem.status == cvx.OPTIMAL:
+            self.solved_windows[fingerprint] = window_solution(cvx_problem, variables,
+                                                               cvx_error_msg)
+            # only the windows of the last year can be the same problem as an upcoming window
+            while len(self.solved_windows) > self.windows_per_year():
+                self.solved_windows.popitem(last=False)
+        return cvx_problem, cvx_error_msg
+
+    def windows_per_year(self):
+        """
+
+        Returns: the largest number of optimization windows in one year
+
+        """
+        levels = self.optimization_levels
+        return int(levels.predictive.groupby(levels.index.year).nunique().max())
+
+    def presolve_window(self, functions, constraints):
+        """ Eliminates the variables that are fixed to zero from the problem of a window
+        (see presolve), and reports how much smaller the problem became
+
+        Args:
+            functions (dict): functions or objectives of the optimization
+            constraints (list): constraints of the optimization
+
+        Returns: the functions and constraints of the smaller problem, and the variables
+            that were eliminated (their values have to be set once the problem is solved)
+
+        """
+        presolved_functions, presolved_constraints, fixed_variables, dropped = \
+            presolve(functions, constraints)
+        eliminated = sum(variable.size for variable in fixed_variables)
+        if fixed_variables:
+            TellUser.debug(f'Presolve eliminated {eliminated} variables fixed to zero '
+                           f'({len(fixed_variables)} cvx Variables) and dropped {dropped} constraints')
+        if self.solver_profile:
+            self.solver_profile[-1].update({'Presolve Eliminated Variables': eliminated,
+                                            'Presolve Dropped Constraints': dropped})
+        return presolved_functions, presolved_constraints, fixed_variables
+
+    def solve_with_template(self, functions, constraints, signature, data):
+        """ Solves an optimization window with the template of its structure (see
+        ProblemTemplate). The template is built from the first window with that structure
+
+        Args:
+            functions (dict): functions or objectives of the optimization
+            constraints (list): constraints of the optimization
+            signature (tuple): the structure of the problem (see problem_signature)
+            data (list): the value of each data subtree of the problem
+
+        Returns: the solution (see load_window_solution), or None if the window has to be
+            solved without a template
+
+        """
+        template = self.problem_templates.get(signature)
+        if template is None:
+            template = ProblemTemplate(functions, constraints)
+            self.problem_templates[signature] = template
+            TellUser.debug(f'Built optimization problem template #{len(self.problem_templates)}'
+                           + ('' if template.usable else ' (windows with its structure are solved without it)'))
+        if not template.usable:
+            return None
+        solver, _ = route_solver(template.problem)
+        start = time.time()
+        try:
+            status, opt_val, primal_values, dual_values = \
+                template.solve(data, solver=solver, verbose=self.verbose_opt)
+        except cvx.error.SolverError as e:
+            TellUser.debug(f'Could not solve with the problem template: {e}')
+            return None
+        self.profile_solve(template.problem, time.time() - start)
+        if status != cvx.OPTIMAL:
+            # solve the window again without a template, to report the problem as usual
+            return None
+        return status, opt_val, primal_values, dual_values, ''
+
     def set_up_optimization(self, opt_window_num, annuity_scalar=1, ignore_der_costs=False):
         """ Sets up and runs optimization on a subset of time in a year. Called within a loop.
 
@@ -379,6 +814,7 @@ class MicrogridScenario(Scenario):
             sub_index:
 
         """
+        start = time.time()
         # used to select rows from time_series relevant to this optimization window
         mask = self.optimization_levels.predictive == opt_window_num
         sub_index = self.optimization_levels.loc[mask].index
@@ -386,8 +822,60 @@ class MicrogridScenario(Scenario):
         self.poi.grab_active_ders(sub_index)
         # print(self.poi.active_ders)
         if not len(self.poi.active_ders):
+            self.profile_window(opt_window_num, time.time() - start)
             return {}, [], sub_index
-        return super(MicrogridScenario, self).set_up_optimization(opt_window_num, annuity_scalar, ignore_der_costs)
+        # describe the window once; StorageVET still hands the DERs the boolean mask
+        self.poi.window = WindowSlice.from_mask(mask)
+        try:
+            functions, constraints, sub_index = \
+                super(MicrogridScenario, self).set_up_optimization(opt_window_num, annuity_scalar, ignore_der_costs)
+        finally:
+            self.poi.window = None
+        self.profile_window(opt_window_num, time.time() - start)
+        return functions, constraints, sub_index
+
+    def profile_window(self, opt_window_num, build_time):
+        """ Starts the solver profile row of an optimization window, once it is built
+
+        Args:
+            opt_window_num (int): the optimization window number
+            build_time (float): seconds spent building the objective and constraints
+
+        """
+        self.solver_profile.append({
+            'Window': opt_window_num,
+            'Active DERs': ' | '.join(der.name for der in self.poi.active_ders),
+            'Build Time (s)': build_time,
+        })
+
+    def profile_solve(self, prob, solve_time):
+        """ Records how long the problem of the current optimization window took to
+        compile and solve, its status, and its size
+
+        Args:
+            prob (cvx.Problem): the solved problem
+            solve_time (float): seconds spent compiling and solving the problem
+
+        """
+        if not self.solver_profile:
+            # a problem solved outside of the optimization windows
+            self.profile_window(None, 0)
+        solver_stats = prob.solver_stats
+        solver_time = solver_stats.solve_time if solver_stats is not None else None
+        compile_time = getattr(prob, 'compilation_time', None)
+        if compile_time is None and solver_time is not None:
+            compile_time = max(solve_time - solver_time, 0)
+        variables = prob.variables()
+        self.solver_profile[-1].update({
+            'Compile Time (s)': compile_time,
+            'Solver Time (s)': solver_time,
+            'Solve Time (s)': solve_time,
+            'Solver': solver_stats.solver_name if solver_stats is not None else None,
+            'Status': prob.status,
+            'Variables': sum(variable.size for variable in variables),
+            'Integer Variables': integer_variable_count(prob),
+            'Constraints': sum(constraint.size for constraint in prob.constraints),
+        })
 
     def save_optimization_results(self, opt_window_num, sub_index, prob, obj_expression, cvx_error_msg):
         """ Checks if there was a solution to the optimization. If not, report the problem
@@ -401,7 +889,82 @@ class MicrogridScenario(Scenario):
             cvx_error_msg: any error message that might have occurred during problem solve
 
         """
+        start = time.time()
         super(MicrogridScenario, self).save_optimization_results(opt_window_num, sub_index, prob, obj_expression, cvx_error_msg)
         for der in self.poi.active_ders:
             # save sizes of DERs that were found in the first optimization run (the method will have no effect after the first time it is called)
             der.set_size()
+        self.save_checkpoint(opt_window_num, sub_index)
+        if self.solver_profile:
+            self.solver_profile[-1]['Save Time (s)'] = time.time() - start
+
+
+def initialize_window_worker(pickled_scenario):
+    """ Unpacks the copy of the scenario that a worker process solves windows of
+
+    Args:
+        pickled_scenario (bytes): the pickled MicrogridScenario
+
+    """
+    global worker_scenario
+    worker_scenario = pickle.loads(pickled_scenario)
+    # the windows are saved to the checkpoint by the main process, in order
+    worker_scenario.checkpoint = None
+
+
+def solve_window_on_worker(opt_period, annuity_scalar, ignore_der_costs):
+    """ Builds, solves and saves the results of one optimization window on a worker process
+
+    Args:
+        opt_period (int): the optimization window number that is being solved
+        annuity_scalar (float): a scalar value to be multiplied by any yearly cost or benefit
+        ignore_der_costs (bool): flag to indicate if we do not want to consider to economics
+            of operating the DERs in our optimization
+
+    Returns: the results of the window (None if the window has nothing to solve): the
+        snapshot of every DER and value stream in the window (see Checkpoint.snapshot),
+        the rows of the objective values it added, and the solvers used so far. And the
+        solver profile of the window
+
+    """
+    functions, constraints, sub_index = \
+        worker_scenario.set_up_optimization(opt_period, annuity_scalar=annuity_scalar,
+                                            ignore_der_costs=ignore_der_costs)
+    if not len(constraints) and not len(functions.values()):
+        return None, worker_scenario.solver_profile[-1]
+    objective_values = getattr(worker_scenario, 'objective_values', None)
+    solved_before = 0 if objective_values is None else len(objective_values)
+    prob, obj_expressions, cvx_error_msg = \
+        worker_scenario.solve_optimization(functions, constraints,
+                                           force_glpk_mi=worker_scenario.poi.has_thermal_load)
+    worker_scenario.save_optimization_results(opt_period, sub_index, prob, obj_expressions,
+                                              cvx_error_msg)
+    objective_values = getattr(worker_scenario, 'objective_values', None)
+    record = {
+        'ders': {der.unique_tech_id(): snapshot(der, sub_index)
+                 for der in worker_scenario.poi.der_list},
+        'value streams': {name: snapshot(value_stream, sub_index)
+                          for name, value_stream in worker_scenario.service_agg.value_streams.items()},
+        'objective values': None if objective_values is None else objective_values.iloc[solved_before:],
+        'solvers': getattr(worker_scenario, 'solvers', None),
+    }
+    return record, worker_scenario.solver_profile[-1]
+
+
+def window_solution(prob, variables, cvx_error_msg):
+    """ The solution of a solved optimization window, that can be loaded into another
+    problem with the same structure (see MicrogridScenario.load_window_solution)
+
+    Args:
+        prob (cvx.Problem): the solved problem
+        variables (list): the variables of the problem, in the order problem_signature
+            numbers them
+        cvx_error_msg (str): any error message from solving it
+
+    Returns: the status, the optimal value, the value of every variable (in the order of
+        VARIABLES), the dual value of every constraint (in the order of the problem), and
+        the error message
+
+    """
+    return prob.status, prob.value, [variable.value for variable in variables], \
+        [constraint.dual_value for constraint in prob.constraints], cvx_error_msg
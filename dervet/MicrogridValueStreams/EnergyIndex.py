@@ -0,0 +1,106 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+EnergyIndex.py
+
+This Python class keeps the cumulative sums of time series data, so the energy
+in the window that starts at any index and lasts any number of timesteps can be
+found without adding up the window again.
+"""
+import numpy as np
+
+
+class EnergyIndex:
+    """ Prefix sums of named time series (like the critical load, the maximum PV
+    generation, or the DG output). The sum over the forward window of any start
+    and any length is the difference of two prefix sums, so it costs O(1).
+
+    """
+
+    def __init__(self, dt, **series):
+        """ Initialize the index
+
+        Args:
+            dt (float): the timestep size of the data (hours)
+            series (np.ndarray, Series): time series to index, by name
+
+        """
+        self.dt = dt
+        self.prefix = {}
+        for name, values in series.items():
+            self.add(name, values)
+
+    def add(self, name, values):
+        """ Adds (or replaces) a time series in the index
+
+        Args:
+            name (str): name to look up the time series by
+            values (np.ndarray, Series): the value at every timestep
+
+        """
+        self.prefix[name] = np.concatenate(([0], np.cumsum(np.asarray(values, dtype=float))))
+
+    def __contains__(self, name):
+        return name in self.prefix
+
+    def forward_sum(self, name, starts=None, length=1):
+        """ Sums a time series over the windows that begin at STARTS. Windows that
+        run past the end of the data are cut short at the end
+
+        Args:
+            name (str): name of the time series
+            starts (np.ndarray, int, None): index of the first value of each
+                window. Defaults to every index of the data
+            length (np.ndarray, int): number of values in each window
+
+        Returns: sum of each window
+
+        """
+        prefix = self.prefix[name]
+        data_size = len(prefix) - 1
+        if starts is None:
+            starts = np.arange(data_size)
+        stops = np.minimum(np.asarray(starts) + length, data_size)
+        return prefix[stops] - prefix[starts]
+
+    def forward_energy(self, name, starts=None, length=1):
+        """ Energy (kWh) of a power (kW) time series over the windows that begin
+        at STARTS (see forward_sum)
+
+        Args:
+            name (str): name of the time series
+            starts (np.ndarray, int, None): index of the first timestep of each
+                window. Defaults to every index of the data
+            length (np.ndarray, int): number of timesteps in each window
+
+        Returns: energy of each window
+
+        """
+        return self.forward_sum(name, starts, length) * self.dt
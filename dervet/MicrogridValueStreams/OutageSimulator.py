@@ -0,0 +1,676 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+OutageSimulator.py
+
+This Python class contains a vectorized version of the outage simulation
+used by the Reliability value stream. Instead of recursing through one outage
+at a time, the state of energy of a whole block of outage start indices is
+advanced together, one timestep at a time.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from dervet.MicrogridValueStreams.EnergyIndex import EnergyIndex
+
+# number of outage start indices that are simulated together
+BLOCK_SIZE = 2048
+# number of chunks of outage start indices given to each worker process
+CHUNKS_PER_WORKER = 4
+# energy (kWh) kept in reserve when ruling out outages without simulating them
+SCREEN_MARGIN = 1e-3
+
+
+class OutageSimulator:
+    """ Simulates outages that start at many different indices at once. Every
+    block of outages is represented as a (starts x duration) array.
+
+    """
+
+    def __init__(self, critical_load, dt, window, load_shed_data=None, seed=None):
+        """ Initialize the simulator with the data that does not change between
+        outages.
+
+        Args:
+            critical_load (np.ndarray, Series): critical load (kW) at every timestep
+            dt (float): the timestep size of the data (hours)
+            window (int): number of values of data to look at, from the start
+                of each outage
+            load_shed_data (np.ndarray, Series, None): the percent of the critical
+                load that must be served, at each timestep into an outage. None
+                if load shedding is not considered
+            seed (int, None): seed of the random picks of the round trip efficiency
+                to charge with, when there are multiple ESSs
+
+        """
+        self.critical_load = np.asarray(critical_load, dtype=float)
+        self.dt = dt
+        self.window = int(window)
+        self.load_shed_data = None
+        if load_shed_data is not None:
+            self.load_shed_data = np.asarray(load_shed_data, dtype=float)[:self.window]
+        self.seed = 0 if seed is None else int(seed)
+
+    def blocks(self, start=0, stop=None, block_size=BLOCK_SIZE):
+        """ Splits the outage start indices into blocks that are simulated together
+
+        Args:
+            start (int): first outage start index
+            stop (int, None): outage start index to stop at (exclusive). Defaults
+                to the length of the critical load
+            block_size (int): maximum number of outage start indices in a block
+
+        Yields: array of outage start indices
+
+        """
+        if stop is None:
+            stop = len(self.critical_load)
+        for block_start in range(start, stop, block_size):
+            yield np.arange(block_start, min(block_start + block_size, stop))
+
+    def outage_windows(self, outage_starts):
+        """ Builds the matrix of timestep indices that each outage looks at
+
+        Args:
+            outage_starts (np.ndarray): outage start indices
+
+        Returns: (starts x window) array of indices into the time series data
+            (clipped to the end of the data) and the number of those indices that
+            are within the data, for each outage start
+
+        """
+        outage_starts = np.asarray(outage_starts, dtype=int)
+        data_size = len(self.critical_load)
+        index = outage_starts[:, None] + np.arange(self.window)
+        data_length = np.clip(data_size - outage_starts, 0, self.window)
+        return np.minimum(index, data_size - 1), data_length
+
+    def data_process(self, outage_starts, generation, total_pv_max, total_pv_vari,
+                     largest_gamma):
+        """ Block version of Reliability.data_process
+
+        Args:
+            outage_starts (np.ndarray): outage start indices
+            generation (np.ndarray): fuel generation at every timestep
+            total_pv_max (np.ndarray): PV generation w/o variability taken into account
+            total_pv_vari (np.ndarray): PV generation w/ variability taken into account
+            largest_gamma (float):
+
+        Returns: (starts x window) arrays of demand left, reliability check, and
+            energy requirement check, and the number of valid values in each row
+
+        """
+        index, data_length = self.outage_windows(outage_starts)
+        critical_load = self.critical_load[index]
+        if self.load_shed_data is not None:
+            critical_load = critical_load * (self.load_shed_data / 100)
+        gen_sub = np.asarray(generation, dtype=float)[index]
+        max_pv_sub = np.asarray(total_pv_max, dtype=float)[index]
+        var_pv_sub = np.asarray(total_pv_vari, dtype=float)[index]
+        demand_left = np.around(critical_load - gen_sub - max_pv_sub, decimals=5)
+        reliability_check = np.around(critical_load - gen_sub - var_pv_sub, decimals=5)
+        energy_requirement_check = reliability_check * largest_gamma
+        return demand_left, reliability_check, energy_requirement_check, data_length
+
+    def simulate(self, reliability_check, demand_left, energy_check, data_length,
+                 outage_left, init_soe, ess_properties=None, outage_starts=None):
+        """ Simulates every outage in the block. Follows the same rules as
+        Reliability.simulate_outage: an outage is covered for as long as the ESS
+        can make up for any generation shortfall, and any extra generation is
+        stored in the ESS.
+
+        Args:
+            reliability_check (np.ndarray): (starts x window) the amount of load
+                minus fuel generation and a percentage of PV generation
+            demand_left (np.ndarray): (starts x window) the amount of load minus
+                fuel generation and all of PV generation
+            energy_check (np.ndarray): (starts x window)
+            data_length (np.ndarray): the number of valid values in each row
+            outage_left (int): the length of the outages to be simulated
+            init_soe (float, np.ndarray): the SOE of the ESS at the start of each outage
+            ess_properties (dict, None): dictionary that describes the physical
+                properties of the ess in the analysis includes 'charge max',
+                'discharge max', 'operation SOE min', 'operation SOE max', 'rte list'
+            outage_starts (np.ndarray, None): the start index of each outage (picks the
+                round trip efficiencies it charges with, when there are multiple ESSs)
+
+        Returns: the number of timesteps each outage was covered for, and a
+            (starts x outage_left) array of the SOE at the end of each timestep
+            of each outage (0 once the outage is no longer covered)
+
+        """
+        if ess_properties is None:
+            ess_properties = {}
+        energy_max = ess_properties.get('operation SOE max', 0)
+        energy_min = ess_properties.get('operation SOE min')
+        charge_max = ess_properties.get('charge max', 0)
+        discharge_max = ess_properties.get('discharge max', 0)
+        rte_list = ess_properties.get('rte list', [])
+
+        n_starts, window = reliability_check.shape
+        outage_left = int(outage_left)
+        soe_profile = np.zeros((n_starts, outage_left))
+        coverage_length = np.zeros(n_starts, dtype=int)
+        soe = np.array(np.broadcast_to(np.asarray(init_soe, dtype=float), (n_starts, )))
+        covered = np.ones(n_starts, dtype=bool)
+        n_steps = min(outage_left, window)
+        rte_picks = None
+        if len(rte_list) > 1:
+            if outage_starts is None:
+                outage_starts = np.arange(n_starts)
+            rte_picks = self.rte_picks(outage_starts, n_steps, len(rte_list))
+        for step in range(n_steps):
+            covered &= step < data_length
+            if not covered.any():
+                break
+            current_reliability_check = reliability_check[:, step]
+            current_demand_left = demand_left[:, step]
+            next_soe = soe.copy()
+            # extra generation: save as much of it in the ESS as there is space for
+            surplus = current_reliability_check <= 0
+            charging = covered & surplus & (energy_max >= soe)
+            if charging.any() and len(rte_list):
+                rte = rte_list[0] if rte_picks is None else \
+                    np.asarray(rte_list)[rte_picks[charging, step]]
+                charging_soe = soe[charging]
+                charge_possible = (energy_max - charging_soe) / (rte * self.dt)
+                charge = np.minimum(np.minimum(charge_possible, -current_demand_left[charging]),
+                                    charge_max)
+                next_soe[charging] = charging_soe + (charge * rte * self.dt)
+            # generation shortfall: discharge to meet the load offset by all generation
+            shortfall = covered & ~surplus
+            if energy_min is None:
+                # there is no more that can be discharged to meet the load requirement
+                failed = shortfall
+            else:
+                enough_energy = 0 >= np.around(energy_check[:, step] * self.dt - soe,
+                                               decimals=2)
+                discharge_possible = (soe - energy_min) / self.dt
+                discharge = np.minimum(np.minimum(discharge_possible, current_demand_left),
+                                       discharge_max)
+                enough_power = ~(0 < np.around(current_demand_left - discharge, decimals=2))
+                failed = shortfall & ~(enough_energy & enough_power)
+                discharging = shortfall & ~failed
+                next_soe[discharging] = soe[discharging] - (discharge[discharging] * self.dt)
+            covered &= ~failed
+            soe[covered] = next_soe[covered]
+            soe_profile[covered, step] = soe[covered]
+            coverage_length += covered
+        return coverage_length, soe_profile
+
+    def sample_starts(self, n_samples, strata=None, seed=None):
+        """ Draws N_SAMPLES outage start indices at random (without replacement).
+        If STRATA is given, the samples are split between the strata in proportion
+        to their size (and each stratum gets at least one). The draws of every
+        stratum are spread evenly through the order they are returned in, so any
+        number of the first samples is still close to a stratified sample
+
+        Args:
+            n_samples (int): number of outage starts to draw
+            strata (np.ndarray, None): the (non-negative integer) stratum of every
+                outage start index. None if the samples are not stratified
+            seed (int, None): seed of the random number generator
+
+        Returns: the sampled outage start indices, in the order to simulate them
+
+        """
+        data_size = len(self.critical_load)
+        if strata is None:
+            strata = np.zeros(data_size, dtype=int)
+        rng = np.random.default_rng(seed)
+        n_samples = min(int(n_samples), data_size)
+        strata_size = np.bincount(strata)
+        allocation = np.maximum(np.round(n_samples * strata_size / data_size), strata_size > 0)
+        allocation = np.minimum(allocation, strata_size).astype(int)
+        outage_starts = []
+        order = []
+        for stratum in np.flatnonzero(allocation):
+            drawn = rng.choice(np.flatnonzero(strata == stratum), allocation[stratum],
+                               replace=False)
+            outage_starts.append(drawn)
+            order.append((np.arange(len(drawn)) + rng.random()) / len(drawn))
+        outage_starts = np.concatenate(outage_starts)
+        return outage_starts[np.argsort(np.concatenate(order), kind='stable')]
+
+    def sample_coverage(self, outage_starts, generation, total_pv_max, total_pv_vari,
+                        largest_gamma, outage_left, init_soe, ess_properties=None,
+                        time_budget=None):
+        """ Simulates the outages that start at OUTAGE_STARTS, a block at a time
+        and in order, until all of them are simulated or TIME_BUDGET runs out
+        (the first block is always simulated)
+
+        Args:
+            outage_starts (np.ndarray): outage start indices
+            generation (np.ndarray): fuel generation at every timestep
+            total_pv_max (np.ndarray): PV generation w/o variability taken into account
+            total_pv_vari (np.ndarray): PV generation w/ variability taken into account
+            largest_gamma (float):
+            outage_left (int): the length of the outages to be simulated
+            init_soe (float, np.ndarray): the SOE of the ESS at the start of each
+                outage (an array is indexed by outage start index)
+            ess_properties (dict, None): dictionary that describes the physical
+                properties of the ess in the analysis
+            time_budget (float, None): seconds to stop simulating new blocks after
+
+        Returns: the outage start indices that were simulated, and the number of
+            timesteps each of them was covered for
+
+        """
+        deadline = None if not time_budget else time.time() + time_budget
+        coverage_length = []
+        for block_start in range(0, len(outage_starts), BLOCK_SIZE):
+            if block_start and deadline is not None and time.time() > deadline:
+                break
+            block_starts = outage_starts[block_start:block_start + BLOCK_SIZE]
+            block_init_soe = init_soe[block_starts] if np.ndim(init_soe) else init_soe
+            demand_left, reliability_check, energy_check, data_length = \
+                self.data_process(block_starts, generation, total_pv_max,
+                                  total_pv_vari, largest_gamma)
+            block_coverage, _ = self.simulate(reliability_check, demand_left, energy_check,
+                                              data_length, outage_left, block_init_soe,
+                                              ess_properties, block_starts)
+            coverage_length.append(block_coverage)
+        coverage_length = np.concatenate(coverage_length)
+        return outage_starts[:len(coverage_length)], coverage_length
+
+    def generation_coverage(self, generation, total_pv_vari):
+        """ Finds how long an outage that starts at every index is covered by
+        generation alone (when there is no ESS). An outage is covered until the
+        first timestep where the load minus fuel generation and a percentage of
+        PV generation is positive, or until the end of its window.
+
+        Without load shedding, the load that has to be served does not depend on
+        how far into the outage a timestep is, so the next failure after every
+        index is found once and shared by every outage. With load shedding,
+        each block of outage windows is checked at once.
+
+        Args:
+            generation (np.ndarray): fuel generation at every timestep
+            total_pv_vari (np.ndarray): PV generation w/ variability taken into account
+
+        Returns: the number of timesteps each outage was covered for
+
+        """
+        data_size = len(self.critical_load)
+        generation = np.asarray(generation, dtype=float)
+        total_pv_vari = np.asarray(total_pv_vari, dtype=float)
+        outage_starts = np.arange(data_size)
+        data_length = np.clip(data_size - outage_starts, 0, self.window)
+        if self.load_shed_data is None:
+            reliability_check = np.around(self.critical_load - generation - total_pv_vari,
+                                          decimals=5)
+            failures = np.append(np.flatnonzero(reliability_check > 0), data_size)
+            next_failure = failures[np.searchsorted(failures, outage_starts)]
+            return np.minimum(next_failure - outage_starts, data_length)
+        coverage_length = np.zeros(data_size, dtype=int)
+        for block_starts in self.blocks():
+            index, block_length = self.outage_windows(block_starts)
+            critical_load = self.critical_load[index] * (self.load_shed_data / 100)
+            reliability_check = np.around(critical_load - generation[index] - total_pv_vari[index],
+                                          decimals=5)
+            failed = (reliability_check > 0) & \
+                (np.arange(self.window) < block_length[:, None])
+            coverage_length[block_starts] = np.where(failed.any(axis=1), failed.argmax(axis=1),
+                                                     block_length)
+        return coverage_length
+
+    def coverage(self, start, stop, generation, total_pv_max, total_pv_vari,
+                 largest_gamma, outage_left, init_soe, ess_properties=None, out=None):
+        """ Simulates the outages that start at every index from START to STOP,
+        one block at a time. Each call is independent of any other, so ranges of
+        outage starts can be simulated on separate processes and merged after
+
+        Args:
+            start (int): first outage start index
+            stop (int): outage start index to stop at (exclusive)
+            generation (np.ndarray): fuel generation at every timestep
+            total_pv_max (np.ndarray): PV generation w/o variability taken into account
+            total_pv_vari (np.ndarray): PV generation w/ variability taken into account
+            largest_gamma (float):
+            outage_left (int): the length of the outages to be simulated
+            init_soe (float, np.ndarray): the SOE of the ESS at the start of each
+                outage (an array is indexed by outage start index)
+            ess_properties (dict, None): dictionary that describes the physical
+                properties of the ess in the analysis
+            out (np.ndarray, None): (STOP - START x outage_left) array to save
+                the SOE profiles in. A float32 array is allocated if None
+
+        Returns: the frequency of each coverage length (0 to OUTAGE_LEFT), and a
+            (STOP - START x outage_left) array of the SOE profile of each outage
+
+        """
+        outage_left = int(outage_left)
+        frequency = np.zeros(outage_left + 1)
+        if out is None:
+            out = np.zeros((stop - start, outage_left), dtype=np.float32)
+        for outage_starts in self.blocks(start, stop):
+            block_init_soe = init_soe[outage_starts] if np.ndim(init_soe) else init_soe
+            demand_left, reliability_check, energy_check, data_length = \
+                self.data_process(outage_starts, generation, total_pv_max,
+                                  total_pv_vari, largest_gamma)
+            coverage_length, out[outage_starts - start] = \
+                self.simulate(reliability_check, demand_left, energy_check,
+                              data_length, outage_left, block_init_soe, ess_properties,
+                              outage_starts)
+            frequency += np.bincount(coverage_length, minlength=outage_left + 1)
+        return frequency, out
+
+    def soe_used(self, generation, total_pv_max, total_pv_vari, largest_gamma,
+                 outage_left, init_soe, ess_properties=None, stop=None):
+        """ Simulates an outage that starts at every index (up to STOP) and finds
+        the range of SOE the ESS goes through during each of them (this is the
+        range that the ESS has to be able to achieve for the outage to be covered)
+
+        Args:
+            generation (np.ndarray): fuel generation at every timestep
+            total_pv_max (np.ndarray): PV generation w/o variability taken into account
+            total_pv_vari (np.ndarray): PV generation w/ variability taken into account
+            largest_gamma (float):
+            outage_left (int): the length of the outages to be simulated
+            init_soe (float, np.ndarray): the SOE of the ESS at the start of each outage
+            ess_properties (dict, None): dictionary that describes the physical
+                properties of the ess in the analysis
+            stop (int, None): outage start index to stop at (exclusive). Defaults
+                to the length of the critical load
+
+        Returns: maximum SOE - minimum SOE of each outage (including the SOE at the
+            start of the outage), the coverage length of each outage, and the
+            (starts x outage_left) array of the SOE profile of each outage
+
+        """
+        if stop is None:
+            stop = len(self.critical_load)
+        outage_left = int(outage_left)
+        soe_range = np.zeros(stop)
+        coverage_length = np.zeros(stop, dtype=int)
+        soe_profile = np.zeros((stop, outage_left))
+        for outage_starts in self.blocks(0, stop):
+            block_init_soe = np.broadcast_to(init_soe[outage_starts] if np.ndim(init_soe) else init_soe,
+                                             (len(outage_starts), ))
+            demand_left, reliability_check, energy_check, data_length = \
+                self.data_process(outage_starts, generation, total_pv_max,
+                                  total_pv_vari, largest_gamma)
+            block_coverage, block_profile = \
+                self.simulate(reliability_check, demand_left, energy_check,
+                              data_length, outage_left, block_init_soe, ess_properties,
+                              outage_starts)
+            # timesteps the outage was not covered for do not count towards the range
+            covered_steps = np.arange(outage_left) < block_coverage[:, None]
+            outage_soe = np.concatenate((block_init_soe[:, None],
+                                         np.where(covered_steps, block_profile,
+                                                  block_init_soe[:, None])), axis=1)
+            soe_range[outage_starts] = outage_soe.max(axis=1) - outage_soe.min(axis=1)
+            coverage_length[outage_starts] = block_coverage
+            soe_profile[outage_starts] = block_profile
+        return soe_range, coverage_length, soe_profile
+
+    def screen_covered(self, generation, total_pv_max, total_pv_vari, largest_gamma,
+                       coverage_dt, outage_left, init_soe, ess_properties=None):
+        """ Rules out, without simulating them, the outages that are certain to be
+        covered for COVERAGE_DT timesteps (or until the end of the data). Uses
+        an EnergyIndex over the whole time series, so every outage start is
+        checked at once. An outage is certain to be covered if either
+            1) there is no generation shortfall in its first COVERAGE_DT timesteps, or
+            2) the ESS can supply the worst case energy requirement plus all the
+                demand left in that window, without running into its power rating
+
+        Args:
+            generation (np.ndarray): fuel generation at every timestep
+            total_pv_max (np.ndarray): PV generation w/o variability taken into account
+            total_pv_vari (np.ndarray): PV generation w/ variability taken into account
+            largest_gamma (float):
+            coverage_dt (int): number of timesteps an outage has to be covered for
+            outage_left (int): the length of the outages to be simulated
+            init_soe (float, np.ndarray): the SOE of the ESS at the start of each outage
+            ess_properties (dict, None): dictionary that describes the physical
+                properties of the ess in the analysis
+
+        Returns: boolean array, True for each outage start that is certainly covered
+
+        """
+        data_size = len(self.critical_load)
+        outage_starts = np.arange(data_size)
+        # an outage that reaches the end of the data only needs to be covered until then
+        length = np.minimum(coverage_dt, data_size - outage_starts)
+        # simulated outages are cut short by the window, so those cannot be ruled out
+        screenable = length <= min(self.window, int(outage_left))
+        critical_load = self.critical_load
+        if self.load_shed_data is not None:
+            # use the largest load that has to be served at any point in the window
+            load_shed = self.load_shed_data[:max(1, min(coverage_dt, self.window))] / 100
+            critical_load = np.maximum(critical_load * load_shed.max(),
+                                       critical_load * load_shed.min())
+        generation = np.asarray(generation, dtype=float)
+        demand_left = np.around(critical_load - generation - np.asarray(total_pv_max, dtype=float),
+                                decimals=5)
+        reliability_check = np.around(critical_load - generation -
+                                      np.asarray(total_pv_vari, dtype=float), decimals=5)
+        # 1) covered by generation alone
+        index = EnergyIndex(self.dt, shortfall=reliability_check > 0)
+        shortfall_count = index.forward_sum('shortfall', outage_starts, length)
+        covered = screenable & (shortfall_count == 0)
+
+        # 2) covered by the ESS
+        if ess_properties is None or ess_properties.get('operation SOE min') is None:
+            return covered
+        rte_list = np.asarray(ess_properties.get('rte list', []), dtype=float)
+        if np.any((rte_list <= 0) | (rte_list > 1)) or largest_gamma < 0:
+            return covered
+        # the SOE can drop by at most this much in each timestep
+        index.add('demand', np.clip(demand_left, 0, None))
+        index.add('requirement', np.clip(reliability_check * largest_gamma, 0, None))
+        index.add('over discharge max', demand_left > ess_properties.get('discharge max', 0))
+        demand_sum = index.forward_energy('demand', outage_starts, length)
+        requirement_sum = index.forward_energy('requirement', outage_starts, length)
+        over_discharge_max = index.forward_sum('over discharge max', outage_starts, length)
+        available_energy = init_soe - SCREEN_MARGIN
+        covered_by_ess = screenable & (over_discharge_max == 0) & \
+            (requirement_sum + demand_sum <= available_energy) & \
+            (2 * demand_sum <= available_energy - ess_properties['operation SOE min'])
+        return covered | covered_by_ess
+
+    def first_uncovered(self, generation, total_pv_max, total_pv_vari, largest_gamma,
+                        coverage_dt, outage_left, init_soe, ess_properties=None, start=0):
+        """ Finds the first outage that cannot be covered for COVERAGE_DT timesteps.
+        Outages that screen_covered cannot rule out are simulated a block at a time,
+        in order, stopping at the block with the first failure.
+
+        Args:
+            generation (np.ndarray): fuel generation at every timestep
+            total_pv_max (np.ndarray): PV generation w/o variability taken into account
+            total_pv_vari (np.ndarray): PV generation w/ variability taken into account
+            largest_gamma (float):
+            coverage_dt (int): number of timesteps an outage has to be covered for
+            outage_left (int): the length of the outages to be simulated
+            init_soe (float, np.ndarray): the SOE of the ESS at the start of each outage
+            ess_properties (dict, None): dictionary that describes the physical
+                properties of the ess in the analysis
+            start (int): first outage start index to check
+
+        Returns: index of the first outage that cannot be covered, or -1 if none is found
+
+        """
+        data_size = len(self.critical_load)
+        for outage_starts, coverage_length, _ in \
+                self.simulate_unscreened(generation, total_pv_max, total_pv_vari, largest_gamma,
+                                         coverage_dt, outage_left, init_soe, ess_properties,
+                                         start):
+            # note: outages that cannot be covered at all are skipped over
+            failed = (coverage_length > 0) & (coverage_length < coverage_dt) & \
+                (coverage_length < data_size - outage_starts)
+            if failed.any():
+                return int(outage_starts[np.argmax(failed)])
+        return -1
+
+    def uncovered(self, generation, total_pv_max, total_pv_vari, largest_gamma,
+                  coverage_dt, outage_left, init_soe, ess_properties=None):
+        """ Finds every outage that cannot be covered for COVERAGE_DT timesteps
+        (following the same rules as first_uncovered), and how much energy each
+        of them falls short by. The shortfall of an outage is the demand, left
+        after generation, from the timestep it stops being covered until the end
+        of the COVERAGE_DT timesteps.
+
+        Args:
+            generation (np.ndarray): fuel generation at every timestep
+            total_pv_max (np.ndarray): PV generation w/o variability taken into account
+            total_pv_vari (np.ndarray): PV generation w/ variability taken into account
+            largest_gamma (float):
+            coverage_dt (int): number of timesteps an outage has to be covered for
+            outage_left (int): the length of the outages to be simulated
+            init_soe (float, np.ndarray): the SOE of the ESS at the start of each outage
+            ess_properties (dict, None): dictionary that describes the physical
+                properties of the ess in the analysis
+
+        Returns: the outage start indices that cannot be covered (in order), and
+            the energy shortfall (kWh) of each of them
+
+        """
+        data_size = len(self.critical_load)
+        failed_starts = [np.zeros(0, dtype=int)]
+        shortfalls = [np.zeros(0)]
+        for outage_starts, coverage_length, demand_left in \
+                self.simulate_unscreened(generation, total_pv_max, total_pv_vari, largest_gamma,
+                                         coverage_dt, outage_left, init_soe, ess_properties):
+            failed = (coverage_length > 0) & (coverage_length < coverage_dt) & \
+                (coverage_length < data_size - outage_starts)
+            steps = np.arange(demand_left.shape[1])
+            end = np.minimum(coverage_dt, data_size - outage_starts)
+            not_served = (steps >= coverage_length[:, None]) & (steps < end[:, None])
+            shortfall = np.where(not_served, np.clip(demand_left, 0, None), 0).sum(axis=1) * self.dt
+            failed_starts.append(outage_starts[failed])
+            shortfalls.append(shortfall[failed])
+        return np.concatenate(failed_starts), np.concatenate(shortfalls)
+
+    def simulate_unscreened(self, generation, total_pv_max, total_pv_vari, largest_gamma,
+                            coverage_dt, outage_left, init_soe, ess_properties=None, start=0):
+        """ Simulates, a block at a time and in order, the outages (starting from
+        START) that screen_covered cannot rule out
+
+        Args:
+            generation (np.ndarray): fuel generation at every timestep
+            total_pv_max (np.ndarray): PV generation w/o variability taken into account
+            total_pv_vari (np.ndarray): PV generation w/ variability taken into account
+            largest_gamma (float):
+            coverage_dt (int): number of timesteps an outage has to be covered for
+            outage_left (int): the length of the outages to be simulated
+            init_soe (float, np.ndarray): the SOE of the ESS at the start of each outage
+            ess_properties (dict, None): dictionary that describes the physical
+                properties of the ess in the analysis
+            start (int): first outage start index to check
+
+        Yields: the outage start indices of the block, the number of timesteps each
+            was covered for, and the (starts x window) demand left
+
+        """
+        covered = self.screen_covered(generation, total_pv_max, total_pv_vari, largest_gamma,
+                                      coverage_dt, outage_left, init_soe, ess_properties)
+        candidates = np.flatnonzero(~covered[start:]) + start
+        for block_start in range(0, len(candidates), BLOCK_SIZE):
+            outage_starts = candidates[block_start:block_start + BLOCK_SIZE]
+            block_init_soe = init_soe[outage_starts] if np.ndim(init_soe) else init_soe
+            demand_left, reliability_check, energy_check, data_length = \
+                self.data_process(outage_starts, generation, total_pv_max,
+                                  total_pv_vari, largest_gamma)
+            coverage_length, _ = self.simulate(reliability_check, demand_left, energy_check,
+                                               data_length, outage_left, block_init_soe,
+                                               ess_properties, outage_starts)
+            yield outage_starts, coverage_length, demand_left
+
+    def parallel_coverage(self, workers, generation, total_pv_max, total_pv_vari,
+                          largest_gamma, outage_left, init_soe, ess_properties=None,
+                          out=None):
+        """ Simulates an outage that starts at every index of the data, on a pool
+        of WORKERS processes. The outage starts are split into contiguous chunks
+        and the partial results are merged back in order, so the result is the same
+        as calling coverage on the whole range
+
+        Args:
+            workers (int): number of processes to run
+            generation (np.ndarray): fuel generation at every timestep
+            total_pv_max (np.ndarray): PV generation w/o variability taken into account
+            total_pv_vari (np.ndarray): PV generation w/ variability taken into account
+            largest_gamma (float):
+            outage_left (int): the length of the outages to be simulated
+            init_soe (float, np.ndarray): the SOE of the ESS at the start of each outage
+            ess_properties (dict, None): dictionary that describes the physical
+                properties of the ess in the analysis
+            out (np.ndarray, None): (data size x outage_left) array to save the
+                SOE profiles in. A float32 array is allocated if None
+
+        Returns: the frequency of each coverage length (0 to OUTAGE_LEFT), and a
+            (data size x outage_left) array of the SOE profile of each outage
+
+        """
+        data_size = len(self.critical_load)
+        if out is None:
+            out = np.zeros((data_size, int(outage_left)), dtype=np.float32)
+        n_chunks = min(data_size, workers * CHUNKS_PER_WORKER)
+        if workers <= 1 or n_chunks <= 1:
+            return self.coverage(0, data_size, generation, total_pv_max, total_pv_vari,
+                                 largest_gamma, outage_left, init_soe, ess_properties, out)
+        bounds = np.linspace(0, data_size, n_chunks + 1).astype(int)
+        frequency = np.zeros(int(outage_left) + 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self.coverage, start, stop, generation, total_pv_max,
+                                   total_pv_vari, largest_gamma, outage_left, init_soe,
+                                   ess_properties)
+                       for start, stop in zip(bounds[:-1], bounds[1:])]
+            # merge the chunks in order, as they finish
+            for start, stop, future in zip(bounds[:-1], bounds[1:], futures):
+                chunk_frequency, out[start:stop] = future.result()
+                frequency += chunk_frequency
+        return frequency, out
+
+    def rte_picks(self, outage_starts, n_steps, n_ess):
+        """ Picks which ESS's round trip efficiency each outage charges with at each
+        timestep, at random. The outage starts are split into blocks of BLOCK_SIZE
+        (counted from the start of the data), and the generator of each block is
+        seeded with the seed and the block's number, so an outage charges the same
+        way whichever chunk or block it is simulated in
+
+        Args:
+            outage_starts (np.ndarray): outage start indices
+            n_steps (int): number of timesteps into the outages
+            n_ess (int): number of round trip efficiencies to pick from
+
+        Returns: (starts x n_steps) array of the index of the round trip efficiency
+            to charge with
+
+        """
+        outage_starts = np.asarray(outage_starts, dtype=int)
+        picks = np.zeros((len(outage_starts), n_steps), dtype=int)
+        block_numbers = outage_starts // BLOCK_SIZE
+        for block_number in np.unique(block_numbers):
+            rng = np.random.default_rng([self.seed, int(block_number)])
+            # drawn a timestep at a time, so the first picks do not depend on N_STEPS
+            block_picks = rng.integers(n_ess, size=(n_steps, BLOCK_SIZE))
+            in_block = block_numbers == block_number
+            picks[in_block] = block_picks[:, outage_starts[in_block] % BLOCK_SIZE].T
+        return picks
@@ -78,11 +78,17 @@ This Python class contains methods and attributes specific for service analysis
 from storagevet.SystemRequirement import Requirement
 import storagevet.Library as Lib
 from storagevet.ValueStreams.ValueStream import ValueStream
+from dervet.MicrogridValueStreams.OutageSimulator import OutageSimulator
+from dervet.MicrogridValueStreams.EnergyIndex import EnergyIndex
+from dervet.SolverRouting import route_solver
+from dervet.WindowSlice import as_window
 import numpy as np
 import cvxpy as cvx
 import pandas as pd
 import time
 import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from storagevet.ErrorHandling import *
 import copy
 
@@ -111,6 +117,24 @@ class Reliability(ValueStream):
         self.n_2 = params['n-2']
         self.critical_load = params['critical load']
         self.load_shed = params['load_shed_percentage']
+        # number of processes to simulate outages on for the load coverage probability
+        self.lcp_workers = int(params.get('lcp_workers') or 1)
+        # number of uncovered outages to add to the sizing problem after each solve
+        #   (0 adds only the first uncovered outage)
+        self.sizing_cuts = int(params.get('sizing_cuts') or 0)
+        # how to find the min SOE profile after sizing: 'iterative' simulates outages,
+        #   'optimal' solves for it one month at a time on MIN_SOE_WORKERS processes
+        self.min_soe_method = params.get('min_soe_method') or 'iterative'
+        self.min_soe_workers = int(params.get('min_soe_workers') or 1)
+        # memory-map the load coverage probability SOE profiles to a file in this directory
+        self.lcp_memmap = bool(params.get('lcp_memmap'))
+        self.results_dir = params.get('results_dir')
+        # estimate the load coverage probability from this many randomly sampled outages
+        #   (0 simulates an outage that starts at every timestep)
+        self.lcp_samples = int(params.get('lcp_samples') or 0)
+        self.lcp_stratify = params.get('lcp_stratify') or 'none'
+        self.lcp_time_budget = params.get('lcp_time_budget')
+        self.lcp_seed = params.get('lcp_seed')
 
         # PRE-CALCULATED VALUES
         if self.load_shed:
@@ -118,8 +142,7 @@ class Reliability(ValueStream):
         # determines how many time_series timestamps relates to the reliability
         # target hours to cover NOTE: integral type for indexing
         self.coverage_dt = int(np.round(self.outage_duration / self.dt))
-        self.requirement = self.rolling_sum(self.critical_load.loc[:],
-                                            self.coverage_dt) * self.dt
+        self.index_critical_load()
 
         # INITIAL ATTRIBUTES TO BE SET LATER
         self.outage_contribution_df = None
@@ -127,6 +150,8 @@ class Reliability(ValueStream):
         self.outage_soe_profile = None
         self.soe_profile_all_0 = {}
         self.soe_profile_all_1 = {}
+        # outage start index -> constraints of that outage in the sizing problem
+        self.sizing_constraints = {}
         # this is the rating of all DERs (expect for the intermittent ER)
         self.dg_rating = 0
 
@@ -149,6 +174,19 @@ class Reliability(ValueStream):
         """
         self.critical_load = Lib.fill_extra_data(self.critical_load, years, load_growth, frequency)
         self.critical_load = Lib.drop_extra_data(self.critical_load, years)
+        self.index_critical_load()
+
+    def index_critical_load(self):
+        """ (Re)builds the prefix sums of the critical load and the energy it takes to cover
+        an outage that starts at each timestep. Any time series added to the old index
+        described the old critical load's timesteps, so they are dropped with it.
+
+        """
+        # prefix sums of the critical load (and of any DER output added to it later)
+        self.energy_index = EnergyIndex(self.dt, **{'critical load': self.critical_load})
+        self.requirement = pd.Series(self.energy_index.forward_energy('critical load',
+                                                                      length=self.coverage_dt),
+                                     index=self.critical_load.index)
 
     def sizing_module(self, der_lst, opt_index):
         """ sizing module
@@ -161,6 +199,8 @@ class Reliability(ValueStream):
 
         """
         der_list = copy.deepcopy(der_lst)
+        # outage constraint blocks reference the variables of the DERs in der_list
+        self.sizing_constraints = {}
 
         top_n_outages = 10
         diurnal_period_hours = 72
@@ -202,11 +242,16 @@ class Reliability(ValueStream):
         #              f'{critical_load_requirements}')
         TellUser.info(f'Reliability Sizing: maximum critical load ({int(self.outage_duration)}-hour rolling sum): {max(list(map(float, critical_load_requirements)))} across {len(analysis_indices)} indexes')
 
+        sizing_round = 0
         # stop looping when find first uncovered == -1 (got through entire opt
         while first_fail_ind >= 0:
             if first_fail_ind != 0:
                 TellUser.debug(f"Sizing for Outages (again) - with an additional first failure index: {first_fail_ind}")
+            sizing_round += 1
+            start = time.time()
             der_list = self.size_for_outages(opt_index, analysis_indices, der_list)
+            TellUser.info(f'Reliability Sizing: round {sizing_round} sized for {len(analysis_indices)} '
+                          f'outages in {time.time() - start:.2f} seconds')
 
             # Fix the size of Intermittent and Generator DERs after first optimization run.
             #   ES size will be iterated to meet the outage requirement
@@ -225,32 +270,44 @@ class Reliability(ValueStream):
                 der_props = None
             else:
                 soe = np.repeat(self.soc_init, data_size) * der_props['energy rating']
-            start = 0
-            first_fail_ind = 0
-            # note: if this is too large, then you will get a RecursionError
-            check_at_a_time = 500
-            while start == first_fail_ind:
-                first_fail_ind = self.find_first_uncovered(dg_gen,
-                                                           total_pv_max,
-                                                           total_pv_vari,
-                                                           largest_gamma,
-                                                           der_props, soe,
-                                                           start,
-                                                           check_at_a_time)
-                start += check_at_a_time
-                #print(start, first_fail_ind, '---\n')
-
-            # if this is a non-unique index, break out of the method with an error
-            #   (this avoids an infinite repeating loop)
-            # also break if the number of indices becomes too large
-            #   (this will take too long to optimize)
-            # However, these avoid getting at the root cause of the underlying issue
-            # NOTE: returning None creates a code error
-            if first_fail_ind in analysis_indices or analysis_indices.size > max_period_coverage:
-                return None
+            if self.sizing_cuts:
+                fail_inds = self.find_uncovered(dg_gen, total_pv_max, total_pv_vari,
+                                                largest_gamma, der_props, soe)
+                first_fail_ind = fail_inds.min() if fail_inds.size else -1
+                # the outages that are already being sized for cannot change the sizes, so
+                # only the others are added (the ones with the largest energy shortfall)
+                new_fail_inds = fail_inds[~np.isin(fail_inds, analysis_indices)][:self.sizing_cuts]
+                # stop (as if every outage was covered) once no outage can be added
+                if first_fail_ind >= 0 and not new_fail_inds.size:
+                    TellUser.warning(f'Reliability Sizing: {fail_inds.size} outages are still not '
+                                     f'covered, but they are all sized for already, so sizing stops')
+                    first_fail_ind = -1
+                elif analysis_indices.size + new_fail_inds.size > max_period_coverage:
+                    TellUser.warning(f'Reliability Sizing: sizing for more than {max_period_coverage} '
+                                     f'outages would take too long, so sizing stops with '
+                                     f'{fail_inds.size} outages not covered')
+                    first_fail_ind = -1
+                    new_fail_inds = new_fail_inds[:0]
+                fail_inds = new_fail_inds
+                TellUser.info(f'Reliability Sizing: round {sizing_round} adds {fail_inds.size} '
+                              f'uncovered outages')
+            else:
+                first_fail_ind = self.find_first_uncovered(dg_gen, total_pv_max,
+                                                           total_pv_vari, largest_gamma,
+                                                           der_props, soe)
+                fail_inds = np.array([first_fail_ind])
+
+                # if this is a non-unique index, break out of the method with an error
+                #   (this avoids an infinite repeating loop)
+                # also break if the number of indices becomes too large
+                #   (this will take too long to optimize)
+                # However, these avoid getting at the root cause of the underlying issue
+                # NOTE: returning None creates a code error
+                if np.isin(fail_inds, analysis_indices).any() or analysis_indices.size > max_period_coverage:
+                    return None
             # add the failure index to the list of analysis indexes
             #print(len(analysis_indices))
-            analysis_indices = np.append(analysis_indices, first_fail_ind)
+            analysis_indices = np.append(analysis_indices, fail_inds)
 
             # Find indices that might have power constraint. This also takes into account
             #   the new intermittent and generator source outputs
@@ -281,18 +338,22 @@ class Reliability(ValueStream):
                 TellUser.debug(f'ES ene_max_rated = {der_inst.ene_max_rated} so we cannot determine a min SOE profile')
             if der_inst.technology_type == 'Energy Storage System' and der_inst.ene_max_rated > 0:
                 TellUser.debug('determining the min SOE profile')
-                ## This is a faster method to find approximate min SOE
-                der_list = self.min_soe_iterative(opt_index, der_list)
-
-                ## This is a slower method to find optimal min SOE (it's not fully developed)
-                #der_list = self.min_soe_opt(opt_index, der_list)
-                ####der_list = reliability_mod.min_soe_opt(opt_index, der_list)
+                if self.min_soe_method == 'optimal':
+                    ## This is a slower method to find optimal min SOE
+                    der_list = self.min_soe_opt(opt_index, der_list)
+                else:
+                    ## This is a faster method to find approximate min SOE
+                    der_list = self.min_soe_iterative(opt_index, der_list)
 
         return der_list
 
     def size_for_outages(self, opt_index, outage_start_indices, der_list):
         """ Sets up sizing optimization.
 
+        The constraint block of each outage start index is built once and
+        kept in sizing_constraints, so every iteration of the sizing loop only
+        builds the blocks of the indices that were added since the last solve.
+
         Args:
             opt_index (Index): index should match the index of the timeseries
                 data being passed around
@@ -302,65 +363,27 @@ class Reliability(ValueStream):
         Returns: modified DER list
 
         """
+        new_indices = [outage_ind for outage_ind in outage_start_indices
+                       if outage_ind not in self.sizing_constraints]
+        for outage_ind in new_indices:
+            self.sizing_constraints[outage_ind] = \
+                self.outage_constraint_block(opt_index, outage_ind, der_list)
+        TellUser.debug(f'Reliability Sizing: built {len(new_indices)} new outage constraint blocks, '
+                       f'reused {len(outage_start_indices) - len(new_indices)}')
 
         consts = []
-        cost_funcs = sum([der_instance.get_capex() for der_instance in der_list])
-        outage_length = int(self.coverage_dt)
-
-        mask = pd.Series(index=opt_index)
         for outage_ind in outage_start_indices:
-            mask.iloc[:] = False
-            mask.iloc[outage_ind: (outage_ind + outage_length)] = True
-            # set up variables
-            gen_sum = cvx.Parameter(value=np.zeros(outage_length),
-                                    shape=outage_length, name='POI-Zero')
-            tot_net_ess = cvx.Parameter(value=np.zeros(outage_length),
-                                        shape=outage_length, name='POI-Zero')
-
-            consts_added = []
-            for der_instance in der_list:
-                # initialize variables
-                der_instance.initialize_variables(outage_length)
-                consts_added += der_instance.constraints(mask, sizing_for_rel=True,
-                                                   find_min_soe=False)
-                if der_instance.technology_type == 'Energy Storage System':
-                    tot_net_ess += der_instance.get_net_power(mask)
-                if der_instance.technology_type == 'Generator':
-                    gen_sum += der_instance.get_discharge(mask)
-                if der_instance.technology_type == 'Intermittent Resource':
-                    gen_sum += der_instance.get_discharge(mask) * \
-                               der_instance.nu
-            critical_load = self.critical_load.loc[mask].values
-            if self.load_shed:
-                critical_load = critical_load * (self.load_shed_data[0:outage_length].values / 100)
-
-            critical_load_arr = cvx.Parameter(value=critical_load,
-                                              shape=outage_length,
-                                              name='critical-load')
-            consts_added += [
-                cvx.NonPos(tot_net_ess + (-1) * gen_sum + critical_load_arr)
-            ]
-            consts += consts_added
-
-        ## print constraints
-        #print()
-        #print(f'  constraints added ({len(consts_added)}) (just from the last outage index):')
-        #for i, c in enumerate(consts_added):
-        #    print(f'    {i}: {c}')
-        #    if c.size != 1:
-        #        print(f"       variables--------------- {', '.join([j.name() for j in c.variables()])}")
-        ##      print('\n'.join([f'    {i}: {c}' for i, c in enumerate(consts_added)]))
+            consts += self.sizing_constraints[outage_ind]
+        cost_funcs = sum([der_instance.get_capex() for der_instance in der_list])
 
         obj = cvx.Minimize(cost_funcs)
         prob = cvx.Problem(obj, consts)
         TellUser.info(f'Optimizing...  total constraints: {len(consts)}')
-        #try:
-        #    print(f'  cost_func: {cost_funcs.name()}')
-        #except AttributeError:
-        #    print(f'  cost_func: {cost_funcs}')
 
+        solver, reason = route_solver(prob)
+        TellUser.debug(f'Solving the reliability sizing problem with {solver}: {reason}')
         try:
-            prob.solve(solver=cvx.GLPK_MI)
+            prob.solve(solver=solver)
         except Exception as e:
             # record any error in the log file
             TellUser.error(f'An error occurred in cvxpy while trying to solve an optimization problem:\n  {e}')
@@ -376,6 +399,54 @@ class Reliability(ValueStream):
 
         return der_list
 
+    def outage_constraint_block(self, opt_index, outage_ind, der_list):
+        """ Builds the constraints that make the DER mix cover an outage that
+        starts at OUTAGE_IND. Each DER gets its own dispatch variables for the
+        outage, while the size variables are shared by every block, so a block
+        stays valid as long as the DERs in DER_LIST are being sized.
+
+        Args:
+            opt_index (Index): index of the timeseries data being passed around
+            outage_ind (int): index of the first time step of the outage
+            der_list (list): list of DERs that are being sized
+
+        Returns: list of constraints of the outage
+
+        """
+        outage_length = int(self.coverage_dt)
+        mask = pd.Series(False, index=opt_index)
+        mask.iloc[outage_ind: (outage_ind + outage_length)] = True
+        # set up variables
+        gen_sum = cvx.Parameter(value=np.zeros(outage_length),
+                                shape=outage_length, name='POI-Zero')
+        tot_net_ess = cvx.Parameter(value=np.zeros(outage_length),
+                                    shape=outage_length, name='POI-Zero')
+
+        consts = []
+        for der_instance in der_list:
+            # initialize variables
+            der_instance.initialize_variables(outage_length)
+            consts += der_instance.constraints(mask, sizing_for_rel=True,
+                                               find_min_soe=False)
+            if der_instance.technology_type == 'Energy Storage System':
+                tot_net_ess += der_instance.get_net_power(mask)
+            if der_instance.technology_type == 'Generator':
+                gen_sum += der_instance.get_discharge(mask)
+            if der_instance.technology_type == 'Intermittent Resource':
+                gen_sum += der_instance.get_discharge(mask) * \
+                           der_instance.nu
+        critical_load = as_window(mask).select(self.critical_load).values
+        if self.load_shed:
+            critical_load = critical_load * (self.load_shed_data[0:outage_length].values / 100)
+
+        critical_load_arr = cvx.Parameter(value=critical_load,
+                                          shape=outage_length,
+                                          name='critical-load')
+        consts += [
+            cvx.NonPos(tot_net_ess + (-1) * gen_sum + critical_load_arr)
+        ]
+        return consts
+
     def get_der_mix_properties(self, der_list, need_solution=False):
         """ collect information required to call simulate_outage
 
@@ -492,7 +563,7 @@ class Reliability(ValueStream):
 
     def find_first_uncovered(self, generation, total_pv_max, total_pv_vari,
                              largest_gamma, ess_properties=None, soe=None,
-                             start_indx=0, stop_at=600):
+                             start_indx=0):
         """ THis function will return the first outage that is not covered with
          the given DERs
 
@@ -507,52 +578,48 @@ class Reliability(ValueStream):
             soe (list, None): if ESSs are active, then this is an array
                 indicating the soe at the start of the outage
             start_indx (int): start index, idetifies the index of the start of
-                the outage we are going to simulate
-            stop_at (int): when the start_index is divisible by this number,
-                stop recursion
+                the first outage we are going to simulate
 
         Returns: index of the first outage that cannot be covered by the DER
             sizes, or -1 if none is found
 
         """
-        # base case 1: outage_init is beyond range of critical load
-        if start_indx >= (len(self.critical_load)):
-            #print(f'  (bc 1) {start_indx} returning: -1')
-            return -1
-        # find longest possible outage
-
-        demand_left, reliability_check, energy_requirement_check = \
-            self.data_process(start_indx, generation, total_pv_max,
-                              ess_properties, total_pv_vari,
-                              largest_gamma)
-        ess_properties['init_soe'] = soe[start_indx]
-        soe_profile = self.simulate_outage(reliability_check, demand_left,
-                                           energy_requirement_check,
-                                           self.max_outage_duration / self.dt,
-                                           **ess_properties)
-
-        # longest_outage is the largest outage that can be covered
-        longest_outage = len(soe_profile)
-        # base case 2: longest outage is less than the outage duration target
-        if longest_outage < self.coverage_dt:
-            if longest_outage == 0:
-                # note: skip over when soe_profile is empty
-                #print(f'  (skip--bc 2) {start_indx} soe_profile is empty')
-                pass
-            elif longest_outage < (len(self.critical_load) - start_indx):
-                #print(f'  (bc 2) longest possible outage ({longest_outage}) does not provide the necessary coverage ({self.coverage_dt})... returning: {start_indx}')
-                return start_indx
-        # base case 3: break recursion when you get to this (like a limit to
-        # the resursion)
-        if (start_indx + 1) % stop_at == 0:
-            #print(f'  (bc 3) {start_indx} recursion-break, returning: {start_indx + 1}')
-            return start_indx + 1
-        # else, go on to test the next outage_init (increase index returned
-        return self.find_first_uncovered(generation, total_pv_max,
-                                         total_pv_vari, largest_gamma,
-                                         ess_properties=ess_properties,
-                                         soe=soe, start_indx=start_indx + 1,
-                                         stop_at=stop_at)
+        if soe is None:
+            soe = np.zeros(len(self.critical_load))
+        return self.outage_simulator().first_uncovered(generation, total_pv_max,
+                                                       total_pv_vari, largest_gamma,
+                                                       self.coverage_dt,
+                                                       self.max_outage_duration / self.dt,
+                                                       np.asarray(soe), ess_properties,
+                                                       start_indx)
+
+    def find_uncovered(self, generation, total_pv_max, total_pv_vari,
+                       largest_gamma, ess_properties=None, soe=None):
+        """ Finds every outage that is not covered with the given DERs
+
+        Args:
+            generation:
+            total_pv_max:
+            total_pv_vari:
+            largest_gamma:
+            ess_properties (dict): dictionary that describes the physical
+                properties of the ess in the analysis includes 'charge max',
+                'discharge max, 'operation SOE min', 'operation SOE max', 'rte'
+            soe (list, None): if ESSs are active, then this is an array
+                indicating the soe at the start of the outage
+
+        Returns: indices of the outages that cannot be covered by the DER sizes,
+            from the largest energy shortfall to the smallest
+
+        """
+        if soe is None:
+            soe = np.zeros(len(self.critical_load))
+        fail_inds, shortfall = \
+            self.outage_simulator().uncovered(generation, total_pv_max, total_pv_vari,
+                                              largest_gamma, self.coverage_dt,
+                                              self.max_outage_duration / self.dt,
+                                              np.asarray(soe), ess_properties)
+        return fail_inds[np.argsort(-1 * shortfall, kind='stable')]
 
     def data_process(self, ts_index, generation, total_pv_max,
                      ess_properties, total_pv_vari, largest_gamma):
@@ -679,8 +746,55 @@ class Reliability(ValueStream):
         return [next_soe] + self.simulate_outage(reliability_check[1:], demand_left[1:],
                                                  energy_check[1:], outage_left - 1, **kwargs)
 
+    def outage_simulator(self):
+        """ Builds the vectorized outage simulator for the current critical load
+
+        Returns: OutageSimulator
+
+        """
+        load_shed_data = self.load_shed_data if self.load_shed else None
+        return OutageSimulator(self.critical_load.values, self.dt,
+                               self.max_outage_duration, load_shed_data, self.lcp_seed)
+
+    def simulate_outages(self, simulator, outage_starts, generation, total_pv_max,
+                         total_pv_vari, largest_gamma, outage_left,
+                         ess_properties=None, init_soe=None):
+        """ Simulates a block of outages at once. This gives the same results
+        as calling data_process and simulate_outage for each outage start
+
+        Args:
+            simulator (OutageSimulator): simulator built by outage_simulator()
+            outage_starts (np.ndarray): outage start indices to simulate
+            generation:
+            total_pv_max:
+            total_pv_vari:
+            largest_gamma:
+            outage_left (int): the length of outage to be simulated
+            ess_properties (dict, None): dictionary that describes the physical
+                properties of the ess in the analysis
+            init_soe (np.ndarray, None): the soe of the ESS at the beginning of
+                each outage. None to use the user defined soc
+
+        Returns: the coverage length of each outage and a (starts x outage_left)
+            array of the SOE profile of each outage
+
+        """
+        if ess_properties is None:
+            ess_properties = {}
+        if init_soe is None:
+            init_soe = ess_properties.get('init_soe', self.soc_init * ess_properties.get('energy rating', 0))
+        demand_left, reliability_check, energy_requirement_check, data_length = \
+            simulator.data_process(outage_starts, generation, total_pv_max,
+                                   total_pv_vari, largest_gamma)
+        return simulator.simulate(reliability_check, demand_left,
+                                  energy_requirement_check, data_length,
+                                  outage_left, init_soe, ess_properties, outage_starts)
+
     def min_soe_opt(self, opt_index, der_list):
-        """ Calculates min SOE at every time step for the given DER size
+        """ Calculates min SOE at every time step for the given DER size, by
+        solving for the lowest SOC each outage can start at and still be
+        covered. Each month is an independent subproblem; they are solved on a
+        pool of MIN_SOE_WORKERS processes and stitched back together in order
 
            Args:
                opt_index
@@ -689,97 +803,20 @@ class Reliability(ValueStream):
         Returns: der_list -- ESSs will have an SOE min if they were sized for
             reliability
         """
-
-        month_min_soc = {}
-        data_length = len(opt_index)
-        for month in opt_index.month.unique():
-
-            print(month)
-            outage_mask = month == opt_index.month
-            consts = []
-
-            min_soc = {}
-            #ana_ind = [a for a in range(data_length) if outage_mask[a] is True]
-            ana_ind = [i for i, k in enumerate(outage_mask) if k]
-            outage_mask = pd.Series(index=opt_index)
-            print(ana_ind)
-            for outage_ind in ana_ind:
-                outage_end_ind = outage_ind + self.outage_duration
-                if outage_end_ind > data_length:
-                    continue
-                outage_mask.iloc[:] = False
-                outage_mask.iloc[outage_ind:outage_end_ind] = True
-                # set up variables
-                var_gen_sum = cvx.Parameter(
-                    value=np.zeros(self.outage_duration),
-                    shape=self.outage_duration,
-                    name='POI-Zero')  # at POI
-                dg_sum = cvx.Parameter(value=np.zeros(self.outage_duration),
-                                       shape=self.outage_duration,
-                                       name='POI-Zero')
-                net_ess = cvx.Parameter(
-                    value=np.zeros(self.outage_duration),
-                    shape=self.outage_duration,
-                    name='POI-Zero')
-
-                for der in der_list:
-                    # initialize variables
-                    der.initialize_variables(self.outage_duration)
-
-                    if der.technology_type == 'Energy Storage System':
-                        net_ess += der.get_net_power(outage_mask)
-                        # set the soc_target to a CVXPY variable
-                        var_name = f"{der.name}{outage_ind}-min_soc"
-                        der.soc_target = cvx.Variable(shape=1,
-                                                               name=var_name)
-                        min_soc[outage_ind] = der.soc_target
-
-                        # Assuming Soc_init is the soc reservation required for
-                        # other services
-                        consts += [
-                            cvx.NonPos(der.soc_target - 1)
-                        ]  # check to include ulsoc
-                        consts += [
-                            cvx.NonPos(-der.soc_target + (1 - self.soc_init))
-                        ]
-
-                    if der.technology_type == 'Generator':
-                        dg_sum += der.get_discharge(outage_mask)
-                    if der.technology_type == 'Intermittent Resource':
-                        var_gen_sum += der.get_discharge(outage_mask)
-
-                    consts += der.constraints(outage_mask,
-                                              sizing_for_rel=True,
-                                              find_min_soe=True)
-
-                if outage_ind + self.outage_duration > data_length:
-                    remaining_out_duration = data_length - outage_ind
-                    crit_load_values = np.zeros(self.outage_duration)
-                    crit_load_values[0:remaining_out_duration] = \
-                        self.critical_load.loc[outage_mask].values
-                    load = cvx.Parameter(value=crit_load_values,
-                                         name='critical-load',
-                                         shape=self.outage_duration)
-
-                else:
-                    load = cvx.Parameter(
-                        value=self.critical_load.loc[outage_mask].values,
-                        name='critical-load',
-                        shape=self.outage_duration)
-                consts += [
-                    cvx.Zero(net_ess + (-1)*dg_sum + (-1)*var_gen_sum + load)
-                ]
-
-            cost_funcs = sum(min_soc.values())
-            obj = cvx.Minimize(cost_funcs)
-            prob = cvx.Problem(obj, consts)
-            print(f'\noptimizing (in min_soe_opt())...')
-            print('\n'.join([f'    {i}: {c}' for i, c in enumerate(consts)]))
-            print(f'  total constraints: {len(consts)}')
-            print(f'  cost_func: {cost_funcs.name()}')
-            prob.solve(solver=cvx.GLPK_MI)
-
-            month_min_soc[month] = min_soc
+        months = opt_index.month.unique()
+        month_min_soc = np.zeros(len(opt_index))
+        if self.min_soe_workers > 1 and len(months) > 1:
+            TellUser.info(f'Solving for the min SOE of each month on {self.min_soe_workers} processes')
+            with ProcessPoolExecutor(max_workers=self.min_soe_workers) as pool:
+                futures = [pool.submit(self.min_soc_month, opt_index, der_list, month)
+                           for month in months]
+                for future in futures:
+                    outage_starts, min_soc = future.result()
+                    month_min_soc[outage_starts] = min_soc
+        else:
+            for month in months:
+                outage_starts, min_soc = self.min_soc_month(opt_index, der_list, month)
+                month_min_soc[outage_starts] = min_soc
 
         month_min_soe_array = None
         for der in der_list:
@@ -787,24 +824,117 @@ class Reliability(ValueStream):
                 # TODO multi ESS
                 # Get energy rating
                 energy_rating = der.energy_capacity(True)
+                month_min_soe_array = month_min_soc * energy_rating
 
-                # Collecting soe array for all ES
-                month_min_soc_array = []
-                outage_ind = 0
-                # TODO make sure this is in order
-                for month in month_min_soc.keys():
-                    for hours in range(len(month_min_soc[month])):
-                        month_min_soc_array.append(
-                            month_min_soc[month][outage_ind].value[0])
-                        outage_ind += 1
-                month_min_soe_array = (
-                            np.array(month_min_soc_array) * energy_rating)
-
-        print(month_min_soe_array)
+        TellUser.debug(f'min SOE (optimized): {month_min_soe_array}')
         self.min_soe_df = pd.DataFrame({'soe': month_min_soe_array},
                                        index=opt_index)
         return der_list
 
+    def min_soc_month(self, opt_index, der_list, month):
+        """ Builds and solves the min SOC subproblem of the outages that start
+        in MONTH. Works on its own copy of the DERs, so months can be solved at
+        the same time. Outages that would run past the end of the data are not
+        optimized; they are given the largest min SOC of the month
+
+           Args:
+               opt_index
+               der_list
+               month (int): the month the outages start in
+
+        Returns: the indices of the outages that start in MONTH, and the min
+            SOC of each of them
+
+        """
+        der_list = copy.deepcopy(der_list)
+        data_length = len(opt_index)
+        outage_length = int(self.coverage_dt)
+        outage_starts = np.flatnonzero(opt_index.month == month)
+        TellUser.debug(f'min SOE optimization: month {month} ({len(outage_starts)} outages)')
+        consts = []
+        min_soc = {}
+        outage_mask = pd.Series(False, index=opt_index)
+        for outage_ind in outage_starts:
+            outage_end_ind = outage_ind + outage_length
+            if outage_end_ind > data_length:
+                continue
+            outage_mask.iloc[:] = False
+            outage_mask.iloc[outage_ind:outage_end_ind] = True
+            # set up variables
+            var_gen_sum = cvx.Parameter(
+                value=np.zeros(outage_length),
+                shape=outage_length,
+                name='POI-Zero')  # at POI
+            dg_sum = cvx.Parameter(value=np.zeros(outage_length),
+                                   shape=outage_length,
+                                   name='POI-Zero')
+            net_ess = cvx.Parameter(
+                value=np.zeros(outage_length),
+                shape=outage_length,
+                name='POI-Zero')
+
+            for der in der_list:
+                # initialize variables
+                der.initialize_variables(outage_length)
+
+                if der.technology_type == 'Energy Storage System':
+                    net_ess += der.get_net_power(outage_mask)
+                    # set the soc_target to a CVXPY variable
+                    var_name = f"{der.name}{outage_ind}-min_soc"
+                    der.soc_target = cvx.Variable(shape=1, name=var_name)
+                    min_soc[outage_ind] = der.soc_target
+
+                    # Assuming Soc_init is the soc reservation required for
+                    # other services
+                    consts += [
+                        cvx.NonPos(der.soc_target - 1)
+                    ]  # check to include ulsoc
+                    consts += [
+                        cvx.NonPos(-der.soc_target + (1 - self.soc_init))
+                    ]
+
+                if der.technology_type == 'Generator':
+                    dg_sum += der.get_discharge(outage_mask)
+                if der.technology_type == 'Intermittent Resource':
+                    var_gen_sum += der.get_discharge(outage_mask)
+
+                consts += der.constraints(outage_mask,
+                                          sizing_for_rel=True,
+                                          find_min_soe=True)
+
+            critical_load = as_window(outage_mask).select(self.critical_load).values
+            if self.load_shed:
+                critical_load = critical_load * (self.load_shed_data[0:outage_length].values / 100)
+            load = cvx.Parameter(
+                value=critical_load,
+                name='critical-load',
+                shape=outage_length)
+            consts += [
+                cvx.Zero(net_ess + (-1)*dg_sum + (-1)*var_gen_sum + load)
+            ]
+
+        month_min_soc = np.zeros(len(outage_starts))
+        if not min_soc:
+            return outage_starts, month_min_soc
+        cost_funcs = sum(min_soc.values())
+        prob = cvx.Problem(cvx.Minimize(cost_funcs), consts)
+        solver, reason = route_solver(prob)
+        TellUser.debug(f'min SOE optimization: month {month} total constraints: {len(consts)}, '
+                       f'solving with {solver}: {reason}')
+        try:
+            prob.solve(solver=solver)
+        except Exception as e:
+            # record any error in the log file
+            TellUser.error(f'An error occurred in cvxpy while trying to solve an optimization problem:\n  {e}')
+        if prob.status != 'optimal':
+            TellUser.error(f'The solution was {prob.status} in the min SOE optimization of month {month}.')
+            raise ParameterError('Please check the error log for more information.')
+
+        solved = np.isin(outage_starts, list(min_soc.keys()))
+        month_min_soc[solved] = [min_soc[outage_ind].value[0] for outage_ind in outage_starts[solved]]
+        month_min_soc[~solved] = month_min_soc[solved].max()
+        return outage_starts, month_min_soc
+
     def min_soe_iterative(self, opt_index, der_list):
         """ Calculates min SOE at every time step for the given DER size
 
@@ -823,30 +953,21 @@ class Reliability(ValueStream):
                 # TODO multi ESS
                 # Get energy rating
                 energy_rating = der_instance.energy_capacity(True)
-                min_soe_array = []
                 # Check if ES is sized for Reliability:
                 if energy_rating > 0:
                     dg_gen, pv_max, der_props, pv_vari, largest_gamma = \
                         self.get_der_mix_properties(der_list)
 
+                    data_size = len(opt_index)
                     soe = np.repeat(self.soc_init*der_props['energy rating'],
                                     len(self.critical_load))
-                    for outage_init in range(len(opt_index)):
-                        demand, power_req, energy_req = \
-                            self.data_process(outage_init, dg_gen,
-                                              pv_max,
-                                              der_props,
-                                              pv_vari,
-                                              largest_gamma)
-                        der_props['init_soe'] = soe[outage_init]
-                        outage_len = self.coverage_dt
-                        # FIXME: this may need changing
-                        soe_outage_profile = \
-                            self.simulate_outage(power_req, demand, energy_req,
-                                                 outage_len, **der_props)
-
-                        soe_outage_profile.insert(0, soe[outage_init])
-                        min_soe_array.append(self.soe_used(soe_outage_profile))
+                    # simulate an outage starting at every timestep, all at once
+                    min_soe_array, coverage_length, soe_outage_profile = \
+                        self.outage_simulator().soe_used(dg_gen, pv_max, pv_vari,
+                                                         largest_gamma,
+                                                         self.coverage_dt, soe,
+                                                         der_props, data_size)
+                    self.record_soe_profiles(coverage_length, soe_outage_profile)
                     # TODO eventually going to give this to ESS to apply on
                     #  itself
                     self.min_soe_df = pd.DataFrame(min_soe_array,
@@ -854,6 +975,28 @@ class Reliability(ValueStream):
                                                    columns=['soe'])
         return der_list
 
+    def record_soe_profiles(self, coverage_length, soe_outage_profile):
+        """ Records the SOE at the end of the first 2 timesteps of each outage
+        (only for outages that are covered for exactly 2 timesteps; otherwise 0)
+        Block version of what soe_used records
+
+        Args:
+            coverage_length (np.ndarray): the coverage length of each outage
+            soe_outage_profile (np.ndarray): (starts x outage length) array of
+                the SOE profile of each outage
+
+        """
+        profile_0 = np.zeros(len(coverage_length))
+        profile_1 = np.zeros(len(coverage_length))
+        if soe_outage_profile.shape[1] >= 2:
+            two_timesteps = coverage_length == 2
+            profile_0[two_timesteps] = soe_outage_profile[two_timesteps, 0]
+            profile_1[two_timesteps] = soe_outage_profile[two_timesteps, 1]
+        dict_size = len(self.soe_profile_all_0)
+        keys = range(dict_size, dict_size + len(coverage_length))
+        self.soe_profile_all_0.update(zip(keys, profile_0))
+        self.soe_profile_all_1.update(zip(keys, profile_1))
+
     def soe_used(self, soe_profile):
         """ this is the range that the battery system as to be able to achieve
         during the corresponding outage in order for the outage to be
@@ -893,11 +1036,12 @@ class Reliability(ValueStream):
         if self.min_soe_df is not None:
             report.loc[:, 'Reliability Min State of Energy (kWh)'] = \
                 self.min_soe_df['soe']
-            # These two following lines have to commented out if using the optimized soe routine
-            report.loc[:, 'Reliability Min SOE profile 0'] = \
-                self.soe_profile_all_0.values()
-            report.loc[:, 'Reliability Min SOE profile 1'] = \
-                self.soe_profile_all_1.values()
+            # the optimized soe routine does not find the SOE profile of each outage
+            if len(self.soe_profile_all_0):
+                report.loc[:, 'Reliability Min SOE profile 0'] = \
+                    self.soe_profile_all_0.values()
+                report.loc[:, 'Reliability Min SOE profile 1'] = \
+                    self.soe_profile_all_1.values()
 
         return report
 
@@ -917,7 +1061,8 @@ class Reliability(ValueStream):
         df_dict['load_coverage_prob'] = self.load_coverage_probability(
             der_list, time_series_data, technology_summary)
         TellUser.info('Finished load coverage calculation.')
-        if 'Energy Storage System' in technology_summary['Type'].values:
+        if 'Energy Storage System' in technology_summary['Type'].values and \
+                self.outage_soe_profile is not None:
             df_dict['lcp_outage_soe_profiles'] = self.outage_soe_profile
         # calculate potential energy contribution from each DER in every outage
         if not self.post_facto_only:
@@ -948,10 +1093,11 @@ class Reliability(ValueStream):
             agg_pv_max = np.zeros(len(results))
             for name in pv_names['Name']:
                 agg_pv_max += results.loc[:, f'PV: {name} Maximum (kW)'].values
-            agg_pv_max = pd.Series(agg_pv_max, index=results.index)
-            # rolling sum of energy within a coverage_timestep window
-            pv_outage_e = self.rolling_sum(agg_pv_max,
-                                           self.coverage_dt) * self.dt
+            self.energy_index.add('PV max', agg_pv_max)
+            # energy within a coverage_timestep window
+            pv_outage_e = pd.Series(self.energy_index.forward_energy('PV max',
+                                                                     length=self.coverage_dt),
+                                    index=results.index)
             # try to cover as much of the outage that can be with PV energy
             net_outage_energy = outage_energy - pv_outage_e
             # pv generation might have more energy than in the outage, so dont
@@ -997,6 +1143,112 @@ class Reliability(ValueStream):
         self.outage_contribution_df = pd.DataFrame(contribution_arrays,
                                                    index=self.critical_load.index)
 
+    def sampled_load_coverage_probability(self, generation, total_pv_max, total_pv_vari,
+                                          largest_gamma, init_soe, ess_properties=None):
+        """ Estimates the load coverage probability from LCP_SAMPLES outages that
+        start at random timesteps (stratified by LCP_STRATIFY), instead of
+        simulating an outage that starts at every timestep. Sampling stops early
+        if LCP_TIME_BUDGET seconds run out. The estimate of each outage length
+        comes with the bounds of its 95% confidence interval.
+
+        Args:
+            generation:
+            total_pv_max:
+            total_pv_vari:
+            largest_gamma:
+            init_soe (float, np.ndarray): the SOE of the ESS at the start of each outage
+            ess_properties (dict, None): dictionary that describes the physical
+                properties of the ess in the analysis (None if there is no ESS)
+
+        Returns: DataFrame with 3 columns - 'Load Coverage Probability (%)' and its
+            lower and upper bounds, indexed by 'Outage Length (hrs)'
+
+        """
+        start = time.time()
+        data_size = len(self.critical_load)
+        outage_len = int(self.max_outage_duration / self.dt)
+        strata = self.lcp_strata()
+        simulator = self.outage_simulator()
+        outage_starts = simulator.sample_starts(self.lcp_samples, strata, self.lcp_seed)
+        n_samples = len(outage_starts)
+        outage_starts, coverage_length = \
+            simulator.sample_coverage(outage_starts, generation, total_pv_max, total_pv_vari,
+                                      largest_gamma, outage_len, init_soe, ess_properties,
+                                      self.lcp_time_budget)
+        if len(outage_starts) < n_samples:
+            TellUser.warning(f'The load coverage probability time budget ran out after simulating '
+                             f'{len(outage_starts)} of {n_samples} sampled outages')
+
+        # count the sampled outages in each stratum that were covered for at least k timesteps
+        sample_strata = strata[outage_starts]
+        strata_size = np.bincount(strata)
+        sample_size = np.bincount(sample_strata, minlength=len(strata_size))
+        frequency = np.zeros((len(strata_size), outage_len + 1))
+        np.add.at(frequency, (sample_strata, np.minimum(coverage_length, outage_len)), 1)
+        covered = np.cumsum(frequency[:, ::-1], axis=1)[:, -2::-1]
+        sampled = sample_size > 0
+        if (strata_size[~sampled] > 0).any():
+            TellUser.warning('Some load coverage probability strata were not sampled, '
+                             'so they are left out of the estimate')
+
+        # stratified estimate of the fraction of all outage starts that are covered,
+        #   with its variance (sampled without replacement)
+        weight = strata_size[sampled] / strata_size[sampled].sum()
+        stratum_size = strata_size[sampled][:, None]
+        stratum_samples = sample_size[sampled][:, None]
+        covered_fraction = covered[sampled] / stratum_samples
+        estimate = weight @ covered_fraction
+        variance = (weight ** 2) @ ((1 - stratum_samples / stratum_size) *
+                                    covered_fraction * (1 - covered_fraction) /
+                                    np.maximum(stratum_samples - 1, 1))
+        half_width = 1.96 * np.sqrt(variance)
+
+        # same as the full calculation: out of the outages of each length that fit in the data
+        length = np.arange(1, outage_len + 1)
+        scale = data_size / (data_size - length + 1) * 1e2
+        outage_coverage = {
+            'Outage Length (hrs)': length * self.dt,
+            'Load Coverage Probability (%)': np.clip(estimate * scale, 0, 1e2),
+            'Load Coverage Probability Lower Bound (%)': np.clip((estimate - half_width) * scale, 0, 1e2),
+            'Load Coverage Probability Upper Bound (%)': np.clip((estimate + half_width) * scale, 0, 1e2)
+        }
+        end = time.time()
+        TellUser.info(f'Critical Load Coverage Curve estimated from {len(outage_starts)} sampled '
+                      f'outages in: {end - start}')
+        lcpc_df = pd.DataFrame(outage_coverage)
+        lcpc_df.set_index('Outage Length (hrs)', inplace=True)
+        return lcpc_df
+
+    def lcp_strata(self):
+        """ Returns: the stratum of every outage start index to sample the load
+            coverage probability by: the month or the hour of the day the outage
+            starts in (all in one stratum if LCP_STRATIFY is 'none')
+
+        """
+        if self.lcp_stratify == 'month':
+            return np.asarray(self.critical_load.index.month)
+        if self.lcp_stratify == 'hour':
+            return np.asarray(self.critical_load.index.hour)
+        return np.zeros(len(self.critical_load), dtype=int)
+
+    def soe_profile_array(self, n_starts, outage_len):
+        """ Allocates the array that the SOE profile of every outage is saved in.
+        If LCP_MEMMAP, the array is memory-mapped to an unnamed temporary file in
+        the results directory (removed once the array is no longer used)
+
+        Args:
+            n_starts (int): number of outage start indices
+            outage_len (int): number of timesteps in each outage
+
+        Returns: (n_starts x outage_len) float32 array of zeros
+
+        """
+        if not self.lcp_memmap:
+            return np.zeros((n_starts, outage_len), dtype=np.float32)
+        TellUser.info(f'Memory-mapping the outage SOE profiles to a file in {self.results_dir}')
+        return np.memmap(tempfile.TemporaryFile(dir=self.results_dir), dtype=np.float32,
+                         mode='w+', shape=(n_starts, outage_len))
+
     def load_coverage_probability(self, der_list, results_df,
                                   technology_summary_df):
         """ Creates and returns a data frame with that reports the load
@@ -1039,53 +1291,46 @@ class Reliability(ValueStream):
         end = time.time()
         TellUser.info(f'Critical Load Coverage Curve overhead time: {end - start}')
 
+        if self.lcp_samples:
+            if no_storage_case:
+                der_props, init_soe = None, 0
+            elif aggregate_soe is not None:
+                init_soe = aggregate_soe.values
+            else:
+                init_soe = self.soc_init * der_props['energy rating']
+            return self.sampled_load_coverage_probability(dg_gen, total_pv_max, total_pv_vari,
+                                                          largest_gamma, init_soe, der_props)
+
         # 2) simulate outage starting on every timestep
         start = time.time()
         outage_len = int(self.max_outage_duration / self.dt)
         # initialize a list to track the frequency of the results of the
         # simulate_outage method
         frequency_simulate_outage = np.zeros(outage_len + 1)
-        outage_init = 0
-        self.outage_soe_profile = {hour+1: [] for hour in range(outage_len)}
-        while outage_init < (len(self.critical_load)):
-            if no_storage_case==False:
-                if aggregate_soe is not None:
-                    der_props['init_soe'] = aggregate_soe[outage_init]
-            demand_left, reliability_check, energy_requirement_check = \
-                self.data_process(outage_init, dg_gen,
-                                  total_pv_max, der_props,
-                                  total_pv_vari, largest_gamma)
-            if no_storage_case==True:
-                # In case energy storage is not present, no outage simulation is required
-                #Is there a failure
-                if any(reliability_check>0)==True:
-                    failure_ind=np.where((reliability_check>0)==True)[0]
-                    coverage_length=failure_ind[0]
-                else:
-                    coverage_length=len(reliability_check)
-                # record value of foo in frequency count
-                frequency_simulate_outage[int(coverage_length)] += 1
-
+        if no_storage_case==True:
+            # In case energy storage is not present, no outage simulation is required:
+            #   each outage is covered until its first failure
+            coverage_length = self.outage_simulator().generation_coverage(dg_gen, total_pv_vari)
+            frequency_simulate_outage += np.bincount(coverage_length, minlength=outage_len + 1)
+        else:
+            # Outage simulation in the presence of energy storage, for a block
+            # of outage starts at a time
+            if aggregate_soe is not None:
+                init_soe = aggregate_soe.values
             else:
-                #Outage simulation in the presence of energy storage
-                outage_soc_profile = self.simulate_outage(reliability_check,
-                                                          demand_left,
-                                                          energy_requirement_check,
-                                                          outage_len,
-                                                          **der_props)
-
-                # record value of foo in frequency count
-                coverage_length = len(outage_soc_profile)
-                for key, value in self.outage_soe_profile.items():
-                    value.append(outage_soc_profile[key-1] if key-1 < coverage_length else 0)
-
-                frequency_simulate_outage[int(coverage_length)] += 1
-            # start outage on next timestep
-            outage_init += 1
-        if no_storage_case==False:
-            self.outage_soe_profile = pd.DataFrame(self.outage_soe_profile,
-                                                   index=self.critical_load.index)
-            self.outage_soe_profile.fillna(0, inplace=True)
+                init_soe = self.soc_init * der_props['energy rating']
+            simulator = self.outage_simulator()
+            if self.lcp_workers > 1:
+                TellUser.info(f'Simulating outages on {self.lcp_workers} processes')
+            soe_profile = self.soe_profile_array(len(self.critical_load), outage_len)
+            frequency_simulate_outage, _ = \
+                simulator.parallel_coverage(self.lcp_workers, dg_gen, total_pv_max,
+                                            total_pv_vari, largest_gamma, outage_len,
+                                            init_soe, der_props, soe_profile)
+            # the DataFrame wraps the (float32, possibly memory-mapped) array without copying it
+            self.outage_soe_profile = pd.DataFrame(soe_profile, index=self.critical_load.index,
+                                                   columns=np.arange(1, outage_len + 1),
+                                                   copy=False)
         # 3) calculate probabilities
         load_coverage_prob = []
         length = self.dt
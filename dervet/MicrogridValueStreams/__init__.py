@@ -27,4 +27,4 @@ Copyright (c) 2023, Electric Power Research Institute
  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
-__all__ = ['Reliability']
+__all__ = ['Reliability', 'OutageSimulator', 'EnergyIndex']
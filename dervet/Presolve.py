@@ -0,0 +1,140 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+Presolve.py
+
+This Python file makes an optimization problem smaller before it is solved: every
+variable that a constraint fixes to zero is replaced by zeros, and the constraints
+that are then always met are dropped.
+"""
+import cvxpy as cvx
+import numpy as np
+from cvxpy.constraints.constraint import Constraint
+from cvxpy.constraints.zero import Zero
+from cvxpy.expressions.variable import Variable
+
+
+def presolve(functions, constraints):
+    """ Eliminates the variables that are fixed to zero (like the sub-timestep energy
+    variables of an EV, constrained by cvx.Zero(uene)) from the problem
+
+    Args:
+        functions (dict): functions or objectives of the optimization
+        constraints (list): constraints of the optimization
+
+    Returns: the functions and constraints without the fixed variables, the fixed
+        variables, and the number of constraints that were dropped
+
+    """
+    fixed = {}
+    fixing_constraints = set()
+    for constraint in constraints:
+        variable = fixed_to_zero(constraint)
+        if variable is not None:
+            fixed[variable.id] = variable
+            fixing_constraints.add(constraint.id)
+    if not fixed:
+        return functions, constraints, [], 0
+    memo = {}
+    presolved_functions = {key: substitute(function, fixed, memo)
+                           for key, function in functions.items()}
+    presolved_constraints = []
+    for constraint in constraints:
+        if constraint.id in fixing_constraints:
+            continue
+        constraint = substitute(constraint, fixed, memo)
+        if not constraint.variables() and constraint.value():
+            # always met
+            continue
+        presolved_constraints.append(constraint)
+    dropped = len(constraints) - len(presolved_constraints)
+    return presolved_functions, presolved_constraints, list(fixed.values()), dropped
+
+
+def fixed_to_zero(constraint):
+    """ Finds the variable that a constraint fixes to zero, if the constraint is
+    cvx.Zero(variable) or variable == 0 (on the whole variable, not some of its values)
+
+    Args:
+        constraint (Constraint): a constraint of the problem
+
+    Returns: the variable, or None
+
+    """
+    if isinstance(constraint, Zero) and isinstance(constraint.args[0], Variable):
+        return constraint.args[0]
+    if type(constraint).__name__ == 'Equality':
+        for variable, other in [constraint.args, constraint.args[::-1]]:
+            if isinstance(variable, Variable) and not other.variables() \
+                    and not np.any(other.value):
+                return variable
+    return None
+
+
+def substitute(expr, fixed, memo):
+    """ Copies EXPR with zeros in place of the fixed variables
+
+    Args:
+        expr (Expression, Constraint): part of the problem
+        fixed (dict): variables fixed to zero, by id
+        memo (dict): copies of the subtrees that were already visited, by id
+
+    Returns: the copy (EXPR itself if it does not depend on a fixed variable)
+
+    """
+    if id(expr) in memo:
+        return memo[id(expr)][1]
+    if isinstance(expr, Variable):
+        new = cvx.Constant(np.zeros(expr.shape)) if expr.id in fixed else expr
+    elif not hasattr(expr, 'args'):
+        new = expr
+    else:
+        args = [substitute(arg, fixed, memo) for arg in expr.args]
+        if all(new_arg is arg for new_arg, arg in zip(args, expr.args)):
+            new = expr
+        elif isinstance(expr, Constraint):
+            new = type(expr)(*args, *expr.get_data())
+        else:
+            new = expr.copy(args)
+    # keep EXPR alive, so that its id is not reused by another expression
+    memo[id(expr)] = expr, new
+    return new
+
+
+def set_fixed_values(variables):
+    """ Gives the variables that were eliminated by presolve their value (zero), so
+    their results can be saved like the results of any other variable
+
+    Args:
+        variables (list): the fixed variables
+
+    """
+    for variable in variables:
+        variable.value = np.zeros(variable.shape)
@@ -0,0 +1,331 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+ProblemTemplate.py
+
+This Python class keeps an optimization problem whose data are cvx Parameters, so
+the next optimization window with the same structure can be solved by swapping in
+its data instead of building and compiling the problem again.
+"""
+import hashlib
+import cvxpy as cvx
+import numpy as np
+import scipy.sparse as sp
+from cvxpy.atoms.affine.add_expr import AddExpression
+from cvxpy.atoms.affine.binary_operators import DivExpression, MulExpression, multiply
+from cvxpy.atoms.affine.sum import Sum
+from cvxpy.atoms.affine.promote import Promote
+from cvxpy.atoms.affine.unary_operators import NegExpression
+from cvxpy.constraints.constraint import Constraint
+from cvxpy.expressions.variable import Variable
+
+
+def problem_signature(functions, constraints):
+    """ Breaks the objective and constraints of an optimization window into their
+    structure and their data. Every subtree that does not depend on a variable is
+    data. Two windows with the same structure only differ in their data
+
+    Args:
+        functions (dict): functions or objectives of the optimization
+        constraints (list): constraints of the optimization
+
+    Returns: the structure (hashable), the value of each data subtree (in order) and the
+        variables of the problem (in the order they are numbered in the structure), or
+        None, None, None if some data cannot be a Parameter
+
+    """
+    data = []
+    variable_ids = {}
+    has_variables = {}
+    try:
+        structure = tuple(_signature(expr, data, variable_ids, has_variables)
+                          for expr in expand_problem(functions, constraints, has_variables))
+    except TypeError:
+        return None, None, None
+    return structure, data, [variable for _, variable in variable_ids.values()]
+
+
+def problem_fingerprint(signature, data):
+    """ Hashes the structure and the data of a problem (see problem_signature). Two
+    windows with the same fingerprint are the same problem, so they have the same
+    solution
+
+    Args:
+        signature (tuple): the structure of the problem
+        data (list): the value of each data subtree of the problem
+
+    Returns: the fingerprint (hex string)
+
+    """
+    fingerprint = hashlib.sha256(repr(signature).encode())
+    for value in data:
+        fingerprint.update(np.ascontiguousarray(value).tobytes())
+    return fingerprint.hexdigest()
+
+
+def expand_problem(functions, constraints, has_variables):
+    """ The objective and the constraints of the problem, with the products of data
+    and variables expanded (see expand)
+
+    Args:
+        functions (dict): functions or objectives of the optimization
+        constraints (list): constraints of the optimization
+        has_variables (dict): memo of depends_on_variables
+
+    Returns: the objective, followed by each constraint
+
+    """
+    objective = sum(functions.values())
+    if not hasattr(objective, 'args'):
+        # an objective without any variable
+        objective = cvx.Constant(objective)
+    return [expand(expr, has_variables) for expr in [objective] + constraints]
+
+
+def expand(expr, has_variables):
+    """ Rewrites every product of data and an expression of variables, so that the
+    data is only multiplied by variables or by functions of variables (and not by
+    more data). Data times data are then one data subtree, and the problem stays
+    DPP once the data are Parameters. For example, price * (load + charge) becomes
+    (price * load) + (price * charge)
+
+    Args:
+        expr (Expression, Constraint): part of the problem
+        has_variables (dict): memo of depends_on_variables
+
+    Returns: an equivalent expression (EXPR itself if nothing was rewritten)
+
+    """
+    if isinstance(expr, Variable) or not depends_on_variables(expr, has_variables):
+        return expr
+    args = [expand(arg, has_variables) for arg in expr.args]
+    if any(new is not old for new, old in zip(args, expr.args)):
+        if isinstance(expr, Constraint):
+            expr = type(expr)(*args, *expr.get_data())
+        else:
+            expr = expr.copy(args)
+    return distribute(expr, has_variables)
+
+
+def distribute(expr, has_variables):
+    """ Moves the data of a product (whose arguments were already expanded) down
+    to the variables (see expand)
+
+    Args:
+        expr (Expression, Constraint): part of the problem
+        has_variables (dict): memo of depends_on_variables
+
+    Returns: an equivalent expression (EXPR itself if nothing was rewritten)
+
+    """
+    if isinstance(expr, DivExpression) and \
+            not depends_on_variables(expr.args[1], has_variables):
+        # dividing by data is multiplying by its inverse
+        return distribute(multiply(expr.args[0], 1 / expr.args[1]), has_variables)
+    if not isinstance(expr, (multiply, MulExpression)):
+        return expr
+    data_first = not depends_on_variables(expr.args[0], has_variables)
+    if not data_first and depends_on_variables(expr.args[1], has_variables):
+        return expr
+    data, other = expr.args if data_first else expr.args[::-1]
+
+    def product(first, second):
+        """ FIRST (data) times SECOND, in the order of the original product """
+        return type(expr)(first, second) if data_first else type(expr)(second, first)
+
+    if isinstance(other, AddExpression) and all(arg.shape == other.shape for arg in other.args):
+        return AddExpression([distribute(product(data, arg), has_variables)
+                              for arg in other.args])
+    if isinstance(other, NegExpression):
+        return distribute(product(-data, other.args[0]), has_variables)
+    # a scalar (multiply promotes scalars to the shape of the other argument)
+    scalar = data.args[0] if isinstance(data, Promote) else data
+    if not scalar.is_scalar():
+        return expr
+    if isinstance(other, Sum):
+        return type(other)(distribute(multiply(scalar, other.args[0]), has_variables),
+                           *other.get_data())
+    if isinstance(other, (multiply, MulExpression)):
+        if not depends_on_variables(other.args[0], has_variables):
+            return distribute(type(other)(multiply(scalar, other.args[0]), other.args[1]),
+                              has_variables)
+        if not depends_on_variables(other.args[1], has_variables):
+            return distribute(type(other)(other.args[0], multiply(scalar, other.args[1])),
+                              has_variables)
+    return expr
+
+
+def depends_on_variables(expr, memo):
+    """ Checks if any variable is found in the tree of EXPR
+
+    Args:
+        expr (Expression, Constraint): part of the problem
+        memo (dict): results of the subtrees that were already checked, by id
+
+    Returns: True if EXPR depends on a variable
+
+    """
+    if id(expr) not in memo:
+        if isinstance(expr, Variable):
+            found = True
+        else:
+            found = any(depends_on_variables(arg, memo) for arg in expr.args)
+        # keep EXPR alive, so that its id is not reused by another expression
+        memo[id(expr)] = expr, found
+    return memo[id(expr)][1]
+
+
+def _signature(expr, data, variable_ids, has_variables):
+    """ Structure of EXPR (see problem_signature). Appends the value of every data
+    subtree to DATA, and numbers the variables in the order they are first found (in
+    VARIABLE_IDS, the number and the variable of each variable id)
+
+    Returns: the structure of EXPR
+
+    """
+    if isinstance(expr, Variable):
+        number, _ = variable_ids.setdefault(expr.id, (len(variable_ids), expr))
+        attributes = tuple(sorted(key for key, value in expr.attributes.items()
+                                  if value is True))
+        return 'variable', number, expr.shape, attributes
+    if not depends_on_variables(expr, has_variables):
+        value = expr.value
+        if sp.issparse(value):
+            # a Parameter cannot hold a sparse matrix (such as a selection of timesteps),
+            # so it stays part of the structure
+            matrix = value.tocsr()
+            digest = hashlib.sha256()
+            for array in [matrix.indptr, matrix.indices, matrix.data]:
+                digest.update(np.ascontiguousarray(array).tobytes())
+            return 'sparse', matrix.shape, digest.hexdigest()
+        value = np.asarray(value, dtype=float)
+        data.append(value)
+        return 'data', value.shape, _sign(value)
+    children = tuple(_signature(arg, data, variable_ids, has_variables) for arg in expr.args)
+    if isinstance(expr, Constraint):
+        # the data of a constraint is only its id
+        return type(expr).__name__, children
+    return type(expr).__name__, expr.shape, repr(expr.get_data()), children
+
+
+def _sign(value):
+    """ Sign of some data, which the convexity of the problem can depend on
+
+    Returns: 'nonneg', 'nonpos' or 'any'
+
+    """
+    if np.all(value >= 0):
+        return 'nonneg'
+    if np.all(value <= 0):
+        return 'nonpos'
+    return 'any'
+
+
+class ProblemTemplate:
+    """ A copy of an optimization problem with fresh variables, where every data
+    subtree was replaced by a cvx Parameter. The template is built from the first
+    window with a given structure (see problem_signature), and then solved for
+    every window with that structure after setting the value of its Parameters
+
+    """
+
+    def __init__(self, functions, constraints):
+        """ Initialize the template
+
+        Args:
+            functions (dict): functions or objectives of the optimization
+            constraints (list): constraints of the optimization
+
+        """
+        self.parameters = []
+        self.variables = {}
+        self.has_variables = {}
+        objective, *lifted_constraints = [self.lift(expr) for expr in
+                                          expand_problem(functions, constraints,
+                                                         self.has_variables)]
+        self.problem = cvx.Problem(cvx.Minimize(objective), lifted_constraints)
+        # the template has to keep the convexity of the original problem
+        try:
+            self.usable = self.problem.is_dcp(dpp=True)
+        except TypeError:
+            # cvxpy before 1.1 compiles the problem again for every solve anyways
+            self.usable = self.problem.is_dcp()
+
+    def lift(self, expr):
+        """ Copies EXPR, with a Parameter in place of every data subtree and a new
+        variable in place of every variable
+
+        Args:
+            expr (Expression, Constraint): part of the problem to copy
+
+        Returns: the copy
+
+        """
+        if isinstance(expr, Variable):
+            if expr.id not in self.variables:
+                attributes = {key: value for key, value in expr.attributes.items()
+                              if value is True}
+                self.variables[expr.id] = Variable(expr.shape, **attributes)
+            return self.variables[expr.id]
+        if not depends_on_variables(expr, self.has_variables):
+            value = expr.value
+            if sp.issparse(value):
+                return cvx.Constant(value)
+            value = np.asarray(value, dtype=float)
+            sign = _sign(value)
+            parameter = cvx.Parameter(value.shape, nonneg=sign == 'nonneg',
+                                      nonpos=sign == 'nonpos', value=value)
+            self.parameters.append(parameter)
+            return parameter
+        args = [self.lift(arg) for arg in expr.args]
+        if isinstance(expr, Constraint):
+            # a new constraint (with its own id)
+            return type(expr)(*args)
+        return expr.copy(args)
+
+    def solve(self, data, **kwargs):
+        """ Solves the template with the data of an optimization window
+
+        Args:
+            data (list): value of each data subtree of the window (see problem_signature)
+            kwargs: passed on to cvx Problem.solve
+
+        Returns: the status, the optimal value, the value of every variable (in the order
+            they are numbered by problem_signature) and the dual value of every constraint
+            (in the order of the problem)
+
+        """
+        for parameter, value in zip(self.parameters, data):
+            parameter.value = value
+        self.problem.solve(**kwargs)
+        # the variables were copied in the order problem_signature numbers them
+        return self.problem.status, self.problem.value, \
+            [variable.value for variable in self.variables.values()], \
+            [constraint.dual_value for constraint in self.problem.constraints]
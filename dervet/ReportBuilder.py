@@ -0,0 +1,159 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+ReportBuilder.py
+
+This Python class assembles the time series results of the POI. The columns of every DER's
+report are laid out first, then a single float64 block is allocated and filled, and the totals
+are summed over groups of columns of that block. The DataFrame is only built once, at the end.
+"""
+import numpy as np
+import pandas as pd
+
+
+class ReportBuilder:
+    """ Collects columns (and the totals built from them) for one time series report.
+
+    """
+
+    def __init__(self, index):
+        """
+
+        Args:
+            index (pd.Index): the index of the report
+
+        """
+        self.index = index
+        self.columns = []
+        self.values = []
+        self.other_columns = {}
+        self.totals = {}
+        self.block = None
+
+    def add_column(self, name, values=0):
+        """ Adds a column that is built into the report. Columns are kept in the order they are
+        added in.
+
+        Args:
+            name (str): the column name
+            values (float, pd.Series, np.ndarray): initial value of the column
+
+        Returns: the position of the column
+
+        """
+        self.columns.append(name)
+        self.values.append(values)
+        return len(self.columns) - 1
+
+    def add_report(self, report):
+        """ Lays out the columns of a DER's report. Columns that are not numeric are kept as they
+        are and put back in their place when the report is built.
+
+        Args:
+            report (pd.DataFrame): a time series report
+
+        Returns: a dictionary of the position of each of the REPORT's columns
+
+        """
+        if not report.index.equals(self.index):
+            report = report.reindex(self.index)
+        positions = {}
+        for name in report.columns:
+            column = report[name]
+            if column.dtype.kind in 'iuf':
+                positions[name] = self.add_column(name, column.values)
+            else:
+                positions[name] = self.add_column(name)
+                self.other_columns[positions[name]] = column.values
+        return positions
+
+    def add_to_total(self, total, position, scale=1):
+        """ Adds a column of the report to a total (once the block is built).
+
+        Args:
+            total (int): the position of the total column
+            position (int): the position of the column that is added to it
+            scale (float): the column is multiplied by this before it is added
+
+        """
+        self.totals.setdefault(total, []).append((position, scale))
+
+    def build(self):
+        """ Allocates the block, fills every column into it, then adds up the totals. Each total is
+        one product of the columns that add to it with their scales.
+
+        Returns: the block of values (rows are the index, columns are in the order added)
+
+        """
+        self.block = np.zeros((len(self.index), len(self.columns)), dtype=np.float64)
+        for position, values in enumerate(self.values):
+            if isinstance(values, pd.Series):
+                values = values.reindex(self.index).values
+            self.block[:, position] = values
+        self.values = None
+        for total, terms in self.totals.items():
+            positions = [position for position, _ in terms]
+            scales = np.array([scale for _, scale in terms], dtype=np.float64)
+            self.block[:, total] += self.block[:, positions] @ scales
+        return self.block
+
+    def column(self, position):
+        """
+
+        Args:
+            position (int): the position of a column
+
+        Returns: a view of the column in the block (only after the block was built)
+
+        """
+        return self.block[:, position]
+
+    def frame(self, drop=()):
+        """ Builds the report's DataFrame from the block.
+
+        Args:
+            drop (list): the positions of the columns to leave out
+
+        Returns: the report as a DataFrame
+
+        """
+        keep = [position for position in range(len(self.columns)) if position not in set(drop)]
+        numeric = [position for position in keep if position not in self.other_columns]
+        if len(numeric) == len(self.columns):
+            values = self.block
+        else:
+            values = self.block[:, numeric]
+        frame = pd.DataFrame(values, index=self.index,
+                             columns=[self.columns[position] for position in numeric])
+        for loc, position in enumerate(keep):
+            if position in self.other_columns:
+                frame.insert(loc, self.columns[position], self.other_columns[position],
+                             allow_duplicates=True)
+        return frame
@@ -0,0 +1,188 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+RepresentativePeriods.py
+
+This Python file picks a few representative days (or weeks) of a year of time series
+data, so DERs can be sized on them instead of on the whole year.
+"""
+import numpy as np
+import pandas as pd
+from scipy.cluster.vq import kmeans2
+
+DAYS_PER_PERIOD = {'day': 1, 'week': 7}
+
+
+def period_labels(index, period):
+    """ Numbers the days (or weeks) of the year that each timestep falls in
+
+    Args:
+        index (DatetimeIndex): the timesteps
+        period (str): 'day' or 'week'
+
+    Returns: Index of the period of each timestep
+
+    """
+    return pd.Index((index.dayofyear - 1) // DAYS_PER_PERIOD[period])
+
+
+def period_profiles(time_series, period):
+    """ Turns every numeric time series into one row per period of the year. Each
+    series is scaled by its largest absolute value first, so they all count the
+    same. Years of data are averaged
+
+    Args:
+        time_series (DataFrame): the time series inputs
+        period (str): 'day' or 'week'
+
+    Returns: DataFrame with one row per period, and one column per series and
+        timestep of the period
+
+    """
+    numeric = time_series.select_dtypes(include=[np.number])
+    scale = numeric.abs().max().replace(0, 1)
+    numeric = (numeric / scale).fillna(0)
+    labels = period_labels(numeric.index, period)
+    step = numeric.groupby(labels).cumcount()
+    profiles = numeric.groupby([labels, step]).mean().unstack(fill_value=0)
+    return profiles.fillna(0)
+
+
+def representative_periods(time_series, period, count, seed=0):
+    """ Picks COUNT representative periods. The periods are grouped (k-means) into
+    about COUNT / 2 clusters of similar profiles, and the COUNT picks are shared out
+    between the clusters by their size (at least one per cluster). Within a cluster,
+    the periods closest to its center are picked. Every pick stands in for the same
+    number of periods, so the weight of all of them is the same
+
+    Args:
+        time_series (DataFrame): the time series inputs
+        period (str): 'day' or 'week'
+        count (int): the number of periods to pick
+        seed (int): seed of the cluster initialization
+
+    Returns: the picked periods (sorted), and the number of periods each stands in for
+
+    """
+    profiles = period_profiles(time_series, period)
+    count = min(count, len(profiles))
+    features = profiles.values
+    # k-means++ cannot start more clusters than there are distinct profiles
+    clusters = max(1, min(count // 2, len(np.unique(features, axis=0))))
+    centers, assignment = kmeans2(features, clusters, iter=100, minit='++', seed=seed)
+    sizes = np.bincount(assignment, minlength=clusters)
+    picks = apportion(sizes, count)
+    chosen = []
+    for cluster in np.flatnonzero(picks):
+        members = np.flatnonzero(assignment == cluster)
+        distance = np.linalg.norm(features[members] - centers[cluster], axis=1)
+        chosen += list(profiles.index[members[np.argsort(distance)[:picks[cluster]]]])
+    return sorted(chosen), len(profiles) / len(chosen)
+
+
+def apportion(sizes, count):
+    """ Shares COUNT picks between clusters in proportion to their SIZES (largest
+    remainder), giving every non-empty cluster at least one
+
+    Args:
+        sizes (np.ndarray): number of periods in each cluster
+        count (int): the number of picks
+
+    Returns: number of picks of each cluster
+
+    """
+    picks = np.minimum(sizes, 1)
+    remaining = count - picks.sum()
+    if remaining > 0:
+        share = sizes / sizes.sum() * count - picks
+        extra = np.floor(np.clip(share, 0, None)).astype(int)
+        extra = np.minimum(extra, sizes - picks)
+        while extra.sum() > remaining:
+            extra[np.argmax(extra)] -= 1
+        picks += extra
+        remainder = share - extra
+        for cluster in np.argsort(-remainder):
+            if picks.sum() == count:
+                break
+            if picks[cluster] < sizes[cluster]:
+                picks[cluster] += 1
+    return picks
+
+
+def sizing_window(index, period, chosen):
+    """ Selects the timesteps of the picked periods in the first year of INDEX (so every
+    pick is used, however the year is split into optimization windows)
+
+    Args:
+        index (DatetimeIndex): the timesteps that are optimized
+        period (str): 'day' or 'week'
+        chosen (list): the picked periods
+
+    Returns: a boolean array of the timesteps of the picks in the first year, the number of
+        periods of the year each pick stands in for, and the number of billing periods
+        (months) of the year each month with a pick stands in for
+
+    """
+    first_year = index.year == index[0].year
+    labels = period_labels(index, period)
+    in_chosen = first_year & labels.isin(chosen)
+    picks = labels[in_chosen].nunique()
+    if not picks:
+        return in_chosen, None, None
+    weight = labels[first_year].nunique() / picks
+    billing_weight = index[first_year].month.nunique() / index[in_chosen].month.nunique()
+    return in_chosen, weight, billing_weight
+
+
+def weight_operating_costs(functions, weight, billing_terms=(), billing_weight=1):
+    """ Scales the objective terms that depend on the dispatch (any variable with
+    more than one value) by WEIGHT, so the representative periods stand in for the
+    whole year. Terms that only depend on the size of the DERs (capital and fixed
+    costs) are left alone. Terms that are charged once per billing period (such as
+    the peak of a demand charge) are scaled by BILLING_WEIGHT instead, since every
+    billing period with a pick already counts its peak once
+
+    Args:
+        functions (dict): functions or objectives of the optimization
+        weight (float): the number of periods that each representative period stands in for
+        billing_terms (list): the keys of the terms that are charged once per billing period
+        billing_weight (float): the number of billing periods that each billing period with a
+            representative period stands in for
+
+    Returns: the weighted functions
+
+    """
+    weighted = {}
+    for key, function in functions.items():
+        if hasattr(function, 'variables') and any(variable.size > 1
+                                                  for variable in function.variables()):
+            function = function * (billing_weight if key in billing_terms else weight)
+        weighted[key] = function
+    return weighted
@@ -0,0 +1,70 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+SolverRouting.py
+
+This Python file picks the solver of an optimization problem from its variables:
+only problems with integer or boolean variables need a MILP solver.
+"""
+import cvxpy as cvx
+
+# interior point LP solver (installed with cvxpy)
+LP_SOLVER = cvx.ECOS
+# branch and bound MILP solver (installed with cvxopt)
+MILP_SOLVER = cvx.GLPK_MI
+
+
+def integer_variable_count(prob):
+    """ Counts the integer and boolean variables of a problem
+
+    Args:
+        prob (cvx.Problem): the optimization problem
+
+    Returns: the number of integer and boolean variables (elements, not cvx Variables)
+
+    """
+    return sum(variable.size for variable in prob.variables()
+               if variable.attributes['boolean'] or variable.attributes['integer'])
+
+
+def route_solver(prob):
+    """ Picks the solver of a problem: a MILP solver if it has any integer or boolean
+    variable, and an LP solver otherwise
+
+    Args:
+        prob (cvx.Problem): the optimization problem
+
+    Returns: the solver, and the reason it was picked
+
+    """
+    integers = integer_variable_count(prob)
+    if integers:
+        return MILP_SOLVER, f'{integers} integer or boolean variables'
+    return LP_SOLVER, 'no integer or boolean variables'
@@ -0,0 +1,192 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+WindowSlice.py
+
+This Python class describes the timesteps of an optimization window by their start and stop
+positions in the time series, so the DERs can slice their data instead of applying a full length
+boolean mask for every window.
+"""
+import numpy as np
+import pandas as pd
+
+
+class WindowSlice:
+    """ The contiguous timesteps [start, stop) of a time series that are optimized together.
+
+    """
+
+    def __init__(self, full_index, start, stop):
+        """
+
+        Args:
+            full_index (pd.Index): the index of the whole time series
+            start (int): the position of the first timestep in the window
+            stop (int): the position after the last timestep in the window
+
+        """
+        self.full_index = full_index
+        self.start = start
+        self.stop = stop
+        self.length = stop - start
+        self.index = full_index[start:stop]
+        self._calendar = None
+        self._mask = None
+        self._aligned = {}
+
+    @classmethod
+    def from_mask(cls, mask):
+        """ Describes the timesteps a boolean mask selects.
+
+        Args:
+            mask (pd.Series): a boolean Series that is true for the timesteps in the window
+
+        Returns: a WindowSlice if the timesteps selected are contiguous, otherwise a WindowSlice of
+            the positions selected
+
+        """
+        positions = np.flatnonzero(np.asarray(mask, dtype=bool))
+        if not len(positions):
+            return cls(mask.index, 0, 0)
+        start, stop = positions[0], positions[-1] + 1
+        if stop - start == len(positions):
+            return cls(mask.index, int(start), int(stop))
+        return PositionSlice(mask.index, positions)
+
+    @property
+    def positions(self):
+        """ the positions of the timesteps in the window (can be used to slice arrays) """
+        return slice(self.start, self.stop)
+
+    @property
+    def calendar(self):
+        """ the month, day of the year and hour of every timestep in the window """
+        if self._calendar is None:
+            self._calendar = pd.DataFrame({'month': self.index.month,
+                                           'dayofyear': self.index.dayofyear,
+                                           'hour': self.index.hour}, index=self.index)
+        return self._calendar
+
+    @property
+    def mask(self):
+        """ the boolean mask of the window, for methods that still take one """
+        if self._mask is None:
+            values = np.zeros(len(self.full_index), dtype=bool)
+            values[self.positions] = True
+            self._mask = pd.Series(values, index=self.full_index)
+        return self._mask
+
+    def day_slices(self):
+        """
+
+        Returns: a list of slices, relative to the window, of the timesteps of each day
+
+        """
+        day = self.calendar['dayofyear'].values
+        bounds = np.concatenate([[0], np.flatnonzero(day[1:] != day[:-1]) + 1, [self.length]])
+        return [slice(int(first), int(last)) for first, last in zip(bounds[:-1], bounds[1:])]
+
+    def select(self, values):
+        """ Selects the timesteps in the window.
+
+        Args:
+            values (pd.Series, pd.DataFrame, np.ndarray): data over the whole time series
+
+        Returns: the data of the timesteps in the window
+
+        """
+        if isinstance(values, (pd.Series, pd.DataFrame)):
+            if self.is_aligned(values.index):
+                return values.iloc[self.positions]
+            return values.loc[self.index]
+        return np.asarray(values)[self.positions]
+
+    def is_aligned(self, index):
+        """
+
+        Args:
+            index (pd.Index): the index of some data
+
+        Returns: True if INDEX is the index of the whole time series (so data can be sliced by
+            position)
+
+        """
+        if index is self.full_index:
+            return True
+        key = id(index)
+        if key not in self._aligned:
+            # keep the index, so its id cannot be reused while this window is
+            self._aligned[key] = index, index.equals(self.full_index)
+        return self._aligned[key][1]
+
+
+class PositionSlice(WindowSlice):
+    """ The timesteps of a time series that are optimized together, when they are not contiguous.
+
+    """
+
+    def __init__(self, full_index, positions):
+        super().__init__(full_index, 0, 0)
+        self._positions = positions
+        self.start, self.stop = int(positions[0]), int(positions[-1]) + 1
+        self.length = len(positions)
+        self.index = full_index[positions]
+
+    @property
+    def positions(self):
+        return self._positions
+
+
+def as_window(mask):
+    """ Describes the timesteps of an optimization window. Boolean masks are still accepted, and
+    are described again every time (the same O(N) work as checking the mask), so pass the
+    WindowSlice of the window where it is at hand.
+
+    Args:
+        mask (WindowSlice, pd.Series): the window, or a boolean mask of it
+
+    Returns: a WindowSlice of the timesteps in the window
+
+    """
+    if isinstance(mask, WindowSlice):
+        return mask
+    return WindowSlice.from_mask(mask)
+
+
+def window_length(mask):
+    """
+
+    Args:
+        mask (WindowSlice, pd.Series): the window, or a boolean mask of it
+
+    Returns: the number of timesteps in the window
+
+    """
+    return as_window(mask).length
@@ -51,7 +51,16 @@ if __name__ == '__main__':
                         help='specify this flag for verbose output during execution')
     parser.add_argument('--gitlab-ci', action='store_true',
                         help='specify this flag for gitlab-ci testing to skip user input')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='specify the number of processes to run sensitivity cases on')
+    parser.add_argument('--checkpoint', action='store_true',
+                        help='specify this flag to save every solved optimization window, so a '
+                             'stopped run can be resumed')
+    parser.add_argument('--resume', action='store_true',
+                        help='specify this flag to skip the optimization windows that an earlier, '
+                             'stopped run already solved')
     arguments = parser.parse_args()
 
-    case = DERVET(arguments.parameters_filename, verbose=arguments.verbose, ignore_cba_valuation=True)
+    case = DERVET(arguments.parameters_filename, verbose=arguments.verbose, workers=arguments.workers,
+                  checkpoint=arguments.checkpoint, resume=arguments.resume, ignore_cba_valuation=True)
     case.solve()
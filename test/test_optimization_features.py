@@ -0,0 +1,548 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+This file tests the optimization features of the scenario (sizing on representative
+periods, problem templates, replayed and checkpointed windows, presolve and solver
+routing) on small problems that are built directly, so they run without any model
+parameter files.
+
+"""
+import pytest
+import numpy as np
+import numpy.testing as npt
+import cvxpy as cvx
+import pandas as pd
+import scipy.sparse as sp
+from collections import OrderedDict
+from types import SimpleNamespace
+from storagevet.Scenario import Scenario
+from dervet.MicrogridScenario import MicrogridScenario, SIZING_WINDOW
+from dervet.MicrogridResult import MicrogridResult
+from dervet.DERVET import checkpoint_directory, clear_checkpoint
+from dervet.ProblemTemplate import ProblemTemplate, problem_fingerprint, problem_signature
+from dervet.Checkpoint import WindowCheckpoint, restore
+from dervet.RepresentativePeriods import representative_periods, sizing_window, \
+    weight_operating_costs
+from dervet.Presolve import presolve, set_fixed_values
+from dervet.SolverRouting import LP_SOLVER, MILP_SOLVER, route_solver
+from dervet.ReportBuilder import ReportBuilder
+from dervet.WindowSlice import WindowSlice, as_window
+from dervet.MicrogridDER.ElectricVehicleCohorts import fleet_cohorts, member_shares
+from dervet.MicrogridPOI import aggregate
+
+
+def sizing_case(n):
+    """ A year of hourly data where every day has the same site load (10 kW for 12 hours,
+    30 kW for the other 12), and a price that changes with the season, so the
+    representative days are spread over the year. The toy DER is sized against its
+    capital cost, an energy charge and a monthly demand charge. For the full year, the
+    best size is 10 kW
+
+    Args:
+        n (str, int): the optimization window ('year', 'month' or a number of hours)
+
+    Returns: a MicrogridScenario (not initialized) that sizes the toy DER
+
+    """
+    index = pd.date_range('2017-01-01', periods=8760, freq='h')
+    load = np.tile(np.repeat([10.0, 30.0], 12), 365)
+    price = 1 + np.sin(2 * np.pi * index.dayofyear / 365)
+    levels = pd.DataFrame({'predictive': index.month if n == 'month' else 0}, index=index)
+    if isinstance(n, int):
+        levels['predictive'] = np.arange(len(index)) // n
+    size = cvx.Variable(name='size')
+    der = SimpleNamespace(size=size, sized=None)
+    der.set_size = lambda: setattr(der, 'sized', float(size.value))
+
+    def set_up_optimization(opt_period, annuity_scalar=1, ignore_der_costs=False):
+        mask = (scenario.optimization_levels.predictive == opt_period).values
+        sub_index = index[mask]
+        dispatch = cvx.Variable(mask.sum(), name='dispatch')
+        net = load[mask] - dispatch
+        months = [sub_index.month == month for month in sub_index.month.unique()]
+        functions = {'capex': 600 * size,
+                     'energy': 0.1 * cvx.sum(net),
+                     'DCM': sum(5 * cvx.max(net[np.flatnonzero(month)]) for month in months)}
+        constraints = [dispatch >= 0, dispatch <= size, dispatch <= load[mask]]
+        return functions, constraints, sub_index
+
+    def solve_optimization(functions, constraints, force_glpk_mi=False):
+        problem = cvx.Problem(cvx.Minimize(sum(functions.values())), constraints)
+        problem.solve()
+        return problem, functions, ''
+
+    scenario = MicrogridScenario.__new__(MicrogridScenario)
+    scenario.optimization_levels = levels
+    scenario.time_series_inputs = pd.DataFrame({'Site Load (kW)': load, 'Price ($/kWh)': price},
+                                               index=index)
+    scenario.sizing_periods = 12
+    scenario.sizing_period_length = 'day'
+    scenario.service_agg = SimpleNamespace(value_streams={'DCM': SimpleNamespace(name='DCM')},
+                                           post_facto_reliability_only=lambda: False)
+    scenario.poi = SimpleNamespace(active_ders=[der], is_sizing_optimization=True,
+                                   has_thermal_load=False)
+    scenario.set_up_optimization = set_up_optimization
+    scenario.solve_optimization = solve_optimization
+    return scenario, der
+
+
+@pytest.mark.parametrize('n', ['year', 'month', 168])
+def test_representative_sizing_matches_full_year(n):
+    scenario, der = sizing_case(n)
+    scenario.size_on_representative_periods(1)
+    npt.assert_approx_equal(der.sized, 10, significant=4)
+    assert not scenario.poi.is_sizing_optimization
+    # the windows of the scenario are left as they were
+    assert not (scenario.optimization_levels.predictive == SIZING_WINDOW).any()
+
+
+def test_sizing_window_uses_picks_of_every_window():
+    index = pd.date_range('2017-01-01', periods=2 * 8760, freq='h')
+    chosen = [0, 40, 100, 200, 300, 310]
+    in_chosen, weight, billing_weight = sizing_window(index, 'day', chosen)
+    assert in_chosen.sum() == 24 * len(chosen)
+    assert (index[in_chosen].year == 2017).all()
+    assert weight == 365 / len(chosen)
+    # picks fall in January, February, April, July, October and November
+    assert billing_weight == 12 / 6
+    assert sizing_window(index, 'day', [400])[1] is None
+
+
+def battery_window(load, price):
+    """ Energy time shift of a battery over one optimization window """
+    charge = cvx.Variable(len(load), nonneg=True)
+    discharge = cvx.Variable(len(load), nonneg=True)
+    ene = cvx.Variable(len(load) + 1)
+    functions = {'energy': cvx.sum(cvx.multiply(price, load + charge - discharge)) * .25,
+                 'degradation': .01 * cvx.sum(charge + discharge)}
+    constraints = [ene[1:] == ene[:-1] + .25 * (.9 * charge - discharge),
+                   ene >= 0, ene <= 100, charge <= 50, discharge <= 50,
+                   ene[0] == 50, ene[-1] == 50, load + charge - discharge >= 0]
+    return functions, constraints
+
+
+def test_problem_template_solves_windows_with_same_structure():
+    rng = np.random.default_rng(10)
+    scenario = MicrogridScenario.__new__(MicrogridScenario)
+    template = None
+    for _ in range(3):
+        functions, constraints = battery_window(rng.uniform(10, 60, 96), rng.uniform(.05, .3, 96))
+        signature, data, variables = problem_signature(functions, constraints)
+        if template is None:
+            first_signature = signature
+            template = ProblemTemplate(functions, constraints)
+        assert signature == first_signature
+        assert template.usable
+        status, opt_val, primal_values, dual_values = template.solve(data)
+        prob = cvx.Problem(cvx.Minimize(sum(functions.values())), constraints)
+        prob.solve()
+        assert status == cvx.OPTIMAL
+        npt.assert_allclose(opt_val, prob.value, rtol=1e-6)
+        # the solution goes into the variables of the window itself
+        loaded, _ = scenario.load_window_solution(functions, constraints,
+                                                  (status, opt_val, primal_values, dual_values, ''),
+                                                  variables)
+        npt.assert_allclose(loaded.value, opt_val)
+        npt.assert_allclose(sum(functions.values()).value, prob.value, rtol=1e-6)
+        assert max(np.max(constraint.violation()) for constraint in constraints) < 1e-6
+        for variable, template_variable in zip(variables, template.variables.values()):
+            npt.assert_array_equal(variable.value, template_variable.value)
+
+
+def test_problem_template_keeps_sparse_selections_in_the_structure():
+    charge = cvx.Variable(24)
+    every_other_hour = sp.eye(24, format='csr')[::2]
+    signature, data, _ = problem_signature({'cost': cvx.sum(charge)},
+                                        [cvx.Zero(every_other_hour @ charge - 1), charge >= 0])
+    other_signature, _, _ = problem_signature({'cost': cvx.sum(charge)},
+                                           [cvx.Zero(sp.eye(24, format='csr')[1::2] @ charge - 1),
+                                            charge >= 0])
+    assert signature is not None and signature != other_signature
+    template = ProblemTemplate({'cost': cvx.sum(charge)},
+                               [cvx.Zero(every_other_hour @ charge - 1), charge >= 0])
+    status, opt_val, _, _ = template.solve(data)
+    assert status == cvx.OPTIMAL
+    npt.assert_approx_equal(opt_val, 12)
+
+
+def test_problem_fingerprint_only_matches_the_same_problem():
+    load, price = np.linspace(10, 60, 24), np.full(24, .1)
+    fingerprints = [problem_fingerprint(*problem_signature(*battery_window(load, prices))[:2])
+                    for prices in [price, price.copy(), price * 2]]
+    assert fingerprints[0] == fingerprints[1]
+    assert fingerprints[0] != fingerprints[2]
+
+
+def solve_with_cvx(scenario, functions, constraints, force_glpk_mi=False):
+    """ Stands in for the solve of StorageVET's Scenario """
+    prob = cvx.Problem(cvx.Minimize(sum(functions.values())), constraints)
+    prob.solve()
+    return prob, functions, ''
+
+
+class ToyBattery:
+    """ A battery that only saves its charge, discharge and state of energy """
+    tag = 'Battery'
+    name = 'es'
+    soc_target = 0.5
+
+    def __init__(self):
+        self.variables_df = pd.DataFrame()
+        self.window_variables = None
+
+    def unique_tech_id(self):
+        return 'BATTERY: es'
+
+    def save_variable_results(self, sub_index):
+        charge, discharge, ene = self.window_variables
+        results = pd.DataFrame({'ch': charge.value, 'dis': discharge.value, 'ene': ene.value[1:]},
+                               index=sub_index)
+        self.variables_df = pd.concat([self.variables_df, results])
+
+
+class ToyServices:
+    """ No value streams """
+
+    def __init__(self):
+        self.value_streams = {}
+
+    def identify_system_requirements(self, der_list, opt_years, frequency):
+        return {}
+
+    def post_facto_reliability_only(self):
+        return False
+
+    def post_facto_reliability_only_and_user_defined_constraints(self):
+        return False
+
+
+class ToyScenario(MicrogridScenario):
+    """ Dispatches one battery against a price that changes every day, with one day per
+    optimization window (the windows are independent of each other)
+
+    """
+
+    def __init__(self, window_workers):
+        index = pd.date_range('2017-01-01', periods=24 * 6, freq='h')
+        hours = np.arange(len(index))
+        self.optimization_levels = pd.DataFrame({'predictive': index.dayofyear}, index=index)
+        self.load = 20 + 10 * np.sin(hours / 24 * 2 * np.pi)
+        self.price = .1 + .01 * index.dayofyear.values * (1 + np.cos(hours / 24 * 2 * np.pi))
+        battery = ToyBattery()
+        self.poi = SimpleNamespace(der_list=[battery], active_ders=[battery],
+                                   is_sizing_optimization=False, has_thermal_load=False)
+        self.service_agg = ToyServices()
+        self.opt_engine = True
+        self.opt_years = [2017]
+        self.frequency = 'h'
+        self.window_workers = window_workers
+        self.sizing_periods = None
+        self.checkpoint = None
+        self.problem_templates = None
+        self.solved_windows = None
+        self.solver_profile = []
+        self.objective_values = pd.DataFrame()
+        self.solvers = set()
+
+    def set_up_optimization(self, opt_window_num, annuity_scalar=1, ignore_der_costs=False):
+        mask = (self.optimization_levels.predictive == opt_window_num).values
+        functions, constraints = battery_window(self.load[mask], self.price[mask])
+        problem = cvx.Problem(cvx.Minimize(sum(functions.values())), constraints)
+        self.poi.der_list[0].window_variables = sorted(problem.variables(),
+                                                       key=lambda variable: variable.id)
+        self.profile_window(opt_window_num, 0)
+        return functions, constraints, self.optimization_levels.index[mask]
+
+    def save_optimization_results(self, opt_window_num, sub_index, prob, obj_expression, cvx_error_msg):
+        for der in self.poi.der_list:
+            der.save_variable_results(sub_index)
+        self.objective_values = pd.concat([self.objective_values,
+                                           pd.DataFrame({'Total Objective': [prob.value]},
+                                                        index=[opt_window_num])])
+        self.solvers = self.solvers.union([prob.solver_stats.solver_name])
+        self.save_checkpoint(opt_window_num, sub_index)
+
+
+def test_windows_solved_on_a_pool_match_the_serial_run(monkeypatch):
+    monkeypatch.setattr(Scenario, 'solve_optimization', solve_with_cvx, raising=False)
+    serial = ToyScenario(1)
+    serial.optimize_problem_loop()
+    pooled = ToyScenario(2)
+    pooled.optimize_problem_loop()
+    battery = pooled.poi.der_list[0]
+    # the windows were only built on the workers
+    assert battery.window_variables is None
+    assert len(battery.variables_df) == 24 * 6
+    serial_results = serial.poi.der_list[0].variables_df
+    assert battery.variables_df.index.equals(serial_results.index)
+    npt.assert_allclose(battery.variables_df[serial_results.columns], serial_results)
+    pd.testing.assert_frame_equal(pooled.objective_values, serial.objective_values)
+    assert pooled.solvers == serial.solvers
+    assert [row['Window'] for row in pooled.solver_profile] == list(range(1, 7))
+
+
+def test_resume_from_checkpoint_skips_the_windows_already_solved(monkeypatch, tmp_path):
+    monkeypatch.setattr(Scenario, 'solve_optimization', solve_with_cvx, raising=False)
+    full = ToyScenario(1)
+    full.optimize_problem_loop()
+    stopped = ToyScenario(1)
+    stopped.use_checkpoint(tmp_path / 'case0')
+    stopped.optimize_problem_loop()
+    # the run stopped after solving the first 4 windows
+    for opt_period in [5, 6]:
+        stopped.checkpoint.path(opt_period).unlink()
+    resumed = ToyScenario(1)
+    resumed.use_checkpoint(tmp_path / 'case0', resume=True)
+    assert list(resumed.resume_from_checkpoint(np.arange(1, 7))) == [5, 6]
+    resumed.optimize_problem_loop()
+    assert [row['Window'] for row in resumed.solver_profile] == [5, 6]
+    battery = resumed.poi.der_list[0]
+    full_results = full.poi.der_list[0].variables_df
+    assert battery.variables_df.index.equals(full_results.index)
+    npt.assert_allclose(battery.variables_df[full_results.columns], full_results)
+    assert list(resumed.objective_values.index) == list(range(1, 7))
+    # a checkpoint of other windows is not resumed from
+    resumed.optimization_levels['predictive'] += 1
+    assert len(resumed.resume_from_checkpoint(np.arange(2, 8))) == 6
+
+
+def test_clear_checkpoint_removes_the_checkpoints_directory(monkeypatch, tmp_path):
+    monkeypatch.setattr(MicrogridResult, 'dir_abs_path', tmp_path, raising=False)
+    for key in [0, 1]:
+        checkpoint_directory(key).mkdir(parents=True)
+    clear_checkpoint(0)
+    assert (tmp_path / 'checkpoints').is_dir()
+    clear_checkpoint(1)
+    assert not (tmp_path / 'checkpoints').exists()
+
+
+def test_windows_with_evs_or_controllable_loads_depend_on_each_other():
+    scenario = ToyScenario(2)
+    assert scenario.windows_are_independent()
+    for tag in ['ElectricVehicle1', 'ElectricVehicle2', 'ElectricVehicleFleet', 'ControllableLoad']:
+        scenario.poi.der_list = [SimpleNamespace(tag=tag, name='der')]
+        assert not scenario.windows_are_independent()
+    scenario.poi.der_list = [SimpleNamespace(tag='Battery', name='es', soc_target=cvx.Variable(1))]
+    assert not scenario.windows_are_independent()
+
+
+def replay_scenario(monkeypatch, years):
+    """ A MicrogridScenario (not initialized) that replays windows, with one window per
+    month over YEARS years, whose windows are solved directly with cvx (and counted)
+
+    """
+    index = pd.date_range('2017-01-01', periods=years * 8760, freq='h')
+    scenario = MicrogridScenario.__new__(MicrogridScenario)
+    scenario.optimization_levels = pd.DataFrame({'predictive': (index.year - 2017) * 12 + index.month},
+                                                index=index)
+    scenario.solved_windows = OrderedDict()
+    scenario.problem_templates = None
+    scenario.solver_profile = []
+    scenario.poi = SimpleNamespace(active_ders=[])
+    solves = []
+
+    def solve_optimization(self, functions, constraints, force_glpk_mi=False):
+        solves.append(functions)
+        return solve_with_cvx(self, functions, constraints, force_glpk_mi)
+
+    monkeypatch.setattr(Scenario, 'solve_optimization', solve_optimization, raising=False)
+    return scenario, solves
+
+
+def test_replayed_window_saves_the_same_der_results(monkeypatch):
+    scenario, solves = replay_scenario(monkeypatch, 2)
+    load, price = np.linspace(10, 60, 24), np.linspace(.05, .3, 24)
+    results = []
+    for prices in [price, price, price * 2]:
+        functions, constraints = battery_window(load, prices)
+        scenario.solver_profile.append({})
+        prob, _, _ = scenario.solve_optimization(functions, constraints)
+        # the values that the battery saves as the results of the window
+        charge, discharge, ene = prob.variables()
+        results.append(pd.DataFrame({'ch': charge.value, 'dis': discharge.value,
+                                     'ene': ene.value[1:]}))
+        assert prob.status == cvx.OPTIMAL
+    assert len(solves) == 2
+    assert scenario.solver_profile[1].get('Replayed') and 'Replayed' not in scenario.solver_profile[2]
+    pd.testing.assert_frame_equal(results[1], results[0])
+    assert not results[2].equals(results[0])
+
+
+def test_replay_only_keeps_the_windows_of_a_year(monkeypatch):
+    scenario, solves = replay_scenario(monkeypatch, 2)
+    for month in range(14):
+        scenario.solve_optimization(*battery_window(np.full(4, 20.), np.full(4, .1 + month)))
+    assert len(scenario.solved_windows) == scenario.windows_per_year() == 12
+    scenario.solve_optimization(*battery_window(np.full(4, 20.), np.full(4, .1)))
+    assert len(solves) == 15
+    # without replay_windows, no signature is needed
+    scenario.solved_windows = None
+    scenario.solve_optimization(*battery_window(np.full(4, 20.), np.full(4, .1 + 13)))
+    assert len(solves) == 16
+
+
+def test_route_solver_sends_only_milps_to_the_milp_solver():
+    functions, constraints = battery_window(np.full(4, 20.), np.full(4, .1))
+    solver, _ = route_solver(cvx.Problem(cvx.Minimize(sum(functions.values())), constraints))
+    assert solver == LP_SOLVER
+    on = cvx.Variable(4, boolean=True)
+    solver, reason = route_solver(cvx.Problem(cvx.Minimize(sum(functions.values())),
+                                              constraints + [on <= 1]))
+    assert solver == MILP_SOLVER
+    assert reason.startswith('4 ')
+
+
+def test_presolve_eliminates_variables_fixed_to_zero():
+    functions, constraints = battery_window(np.full(8, 20.), np.linspace(.05, .3, 8))
+    prob = cvx.Problem(cvx.Minimize(sum(functions.values())), constraints)
+    prob.solve()
+    uene = cvx.Variable(8)
+    uch = cvx.Variable(8)
+    functions['sub-timestep'] = cvx.sum(uene) * .5
+    constraints += [cvx.Zero(uene), cvx.Zero(uch), cvx.NonPos(uch - uene)]
+    presolved_functions, presolved_constraints, fixed, dropped = presolve(functions, constraints)
+    assert {variable.id for variable in fixed} == {uene.id, uch.id}
+    assert dropped == 3
+    presolved = cvx.Problem(cvx.Minimize(sum(presolved_functions.values())), presolved_constraints)
+    presolved.solve()
+    set_fixed_values(fixed)
+    npt.assert_allclose(presolved.value, prob.value, rtol=1e-6)
+    npt.assert_array_equal(uene.value, np.zeros(8))
+
+
+def test_checkpoint_restores_window_results_and_degradation(tmp_path):
+    index = pd.date_range('2017-01-01', periods=8, freq='h')
+    battery = SimpleNamespace(unique_tech_id=lambda: 'BATTERY: es', degrade_perc=.01,
+                              variables_df=pd.DataFrame({'ch': np.arange(8.)}, index=index))
+    checkpoint = WindowCheckpoint(tmp_path / 'case0')
+    checkpoint.save(1, index[:4], [battery], {}, None)
+    battery.degrade_perc = .02
+    checkpoint.save(2, index[4:], [battery], {}, None)
+    stopped = SimpleNamespace(degrade_perc=0, variables_df=pd.DataFrame())
+    for opt_period in [1, 2]:
+        restore(stopped, checkpoint.load(opt_period)['ders']['BATTERY: es'])
+    assert stopped.variables_df.index.equals(index)
+    npt.assert_array_equal(stopped.variables_df['ch'], np.arange(8.))
+    assert stopped.degrade_perc == .02
+    assert checkpoint.load(3) is None
+    checkpoint.clear()
+    assert checkpoint.load(1) is None
+
+
+def test_representative_days_stand_in_for_the_year():
+    index = pd.date_range('2017-01-01', periods=8760, freq='h')
+    hours = np.arange(8760)
+    time_series = pd.DataFrame({'Site Load (kW)': 100 + 50 * np.sin(hours / 8760 * 2 * np.pi)
+                                + 20 * np.sin(hours / 24 * 2 * np.pi)}, index=index)
+    days, weight = representative_periods(time_series, 'day', 12)
+    assert len(days) == len(set(days)) == 12
+    assert days == sorted(days)
+    npt.assert_approx_equal(weight * len(days), 365)
+    size = cvx.Variable(name='size')
+    dispatch = cvx.Variable(24)
+    weighted = weight_operating_costs({'capex': 10 * size, 'energy': cvx.sum(dispatch)}, weight)
+    size.value, dispatch.value = 1, np.ones(24)
+    npt.assert_approx_equal(weighted['capex'].value, 10)
+    npt.assert_approx_equal(weighted['energy'].value, 24 * weight)
+
+
+def test_report_builder_adds_totals_over_columns():
+    index = pd.date_range('2017-01-01', periods=6, freq='h')
+    pv = pd.DataFrame({'PV: pv Electric Generation (kW)': np.arange(6.)}, index=index)
+    ice = pd.DataFrame({'ICE: ice Electric Generation (kW)': np.ones(6),
+                        'ICE: ice On (y/n)': np.arange(6) > 2}, index=index)
+    results = ReportBuilder(index)
+    ice_columns = results.add_report(ice)
+    pv_columns = results.add_report(pv)
+    total = results.add_column('Total Generation (kW)', pd.Series(10., index=index))
+    results.add_to_total(total, pv_columns['PV: pv Electric Generation (kW)'])
+    results.add_to_total(total, ice_columns['ICE: ice Electric Generation (kW)'], .5)
+    results.build()
+    npt.assert_array_equal(results.column(total), 10.5 + np.arange(6.))
+    frame = results.frame(drop=[pv_columns['PV: pv Electric Generation (kW)']])
+    assert list(frame.columns) == ['ICE: ice Electric Generation (kW)', 'ICE: ice On (y/n)',
+                                   'Total Generation (kW)']
+    assert frame['ICE: ice On (y/n)'].dtype == bool
+
+
+def test_window_slice_selects_what_the_mask_does():
+    index = pd.date_range('2017-01-01', periods=24 * 5, freq='h')
+    load = pd.Series(np.arange(len(index), dtype=float), index=index)
+    mask = pd.Series(False, index=index)
+    mask.iloc[30:100] = True
+    window = as_window(mask)
+    assert (window.start, window.stop, window.length) == (30, 100, 70)
+    assert as_window(window) is window
+    npt.assert_array_equal(window.select(load), load.loc[mask])
+    assert [day.stop - day.start for day in window.day_slices()] == [18, 24, 24, 4]
+    # a mask changed in place is described again, even inside the window
+    mask.iloc[60] = False
+    npt.assert_array_equal(as_window(mask).select(load), load.loc[mask])
+    assert as_window(mask).length == 69
+    mask.iloc[:] = False
+    mask.iloc[50:60] = True
+    assert as_window(mask).start == 50
+    assert as_window(WindowSlice(index, 5, 10).mask).index.equals(index[5:10])
+
+
+def test_fleet_cohorts_group_evs_with_the_same_schedule():
+    def ev(name, plugin_time, ene_target, ch_max_rated, ch_min_rated=0):
+        return {'name': name, 'ID': name, 'plugin_time': plugin_time, 'plugout_time': 7,
+                'ene_target': ene_target, 'ch_max_rated': ch_max_rated,
+                'ch_min_rated': ch_min_rated, 'ccost': 100, 'fixed_om': 10, 'dt': 1}
+    ev1_inputs = {'1': ev('1', 18, 40, 10, 2), '2': ev('2', 18, 60, 16, 1),
+                  '3': ev('3', 18, 60, 15, 3), '4': ev('4', 20, 40, 10)}
+    fleets, singles = fleet_cohorts(ev1_inputs)
+    assert list(singles) == ['4']
+    fleet, = fleets.values()
+    assert [member['name'] for member in fleet['members']] == ['1', '2', '3']
+    assert fleet['ene_target'] == 160 and fleet['ccost'] == 300 and fleet['fixed_om'] == 30
+    # no EV charges faster than its rating when the fleet charges at its rating
+    shares = member_shares(fleet['members'])
+    assert np.all(shares * fleet['ch_max_rated'] <= np.array([10, 16, 15]) + 1e-9)
+    npt.assert_approx_equal(fleet['ch_max_rated'], 40)
+    # no EV charges slower than its minimum when the fleet charges at its minimum
+    assert np.all(shares * fleet['ch_min_rated'] >= np.array([2, 1, 3]) - 1e-9)
+    npt.assert_approx_equal(fleet['ch_min_rated'], 8)
+
+
+def test_aggregate_matches_a_chain_of_additions():
+    n = 6
+    base = np.arange(n, dtype=float)
+    ders = [cvx.Variable(n, name=f'der{i}') for i in range(4)] + [np.linspace(1, 2, n)]
+    for der, value in zip(ders[:4], [1, -2, 3.5, 0.25]):
+        der.value = np.full(n, value)
+    chain = base
+    for der in ders:
+        chain = chain + der
+    npt.assert_allclose(aggregate(base, ders).value, chain.value)
+    # scalar contributions are broadcast like the chain of additions
+    npt.assert_allclose(aggregate(base, [ders[0], 2]).value, (base + ders[0] + 2).value)
+    assert aggregate(base, []) is base
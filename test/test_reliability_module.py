@@ -35,9 +35,14 @@ features that were not showcased through the validation report
 
 """
 import pytest
+import cvxpy as cvx
+import numpy.testing as npt
 from pathlib import Path
 from test.TestingLib import *
 from storagevet.ErrorHandling import *
+from dervet.MicrogridValueStreams.Reliability import Reliability
+import dervet.MicrogridValueStreams.Reliability as Reliability_module
+from dervet.MicrogridValueStreams.EnergyIndex import EnergyIndex
 
 RESULTS = Path("./test/test_load_shedding/results")
 SIZING_RESULTS = Path("./test/test_load_shedding/results/Sizing")
@@ -166,3 +171,322 @@ def test_battery_sizing4reliability_soc_init_small():
 
 def test_post_facto_dg_only():
     assert_ran(MP / f"Reliability_DG{CSV}")
+
+
+"""
+Outage simulation TESTS
+"""
+
+
+def outage_test_data(dt=1, data_size=300, max_outage_duration=24, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2017-01-01', periods=data_size, freq=pd.Timedelta(hours=dt))
+    reliability = Reliability.__new__(Reliability)
+    reliability.dt = dt
+    reliability.max_outage_duration = max_outage_duration
+    reliability.critical_load = pd.Series(rng.uniform(50, 150, data_size), index=index)
+    reliability.soc_init = 1
+    reliability.load_shed = False
+    reliability.lcp_seed = None
+    pv_max = np.clip(rng.normal(40, 60, data_size), 0, None)
+    ess_properties = {'charge max': 80, 'discharge max': 90, 'rte list': [0.85],
+                      'operation SOE min': 20, 'operation SOE max': 380,
+                      'energy rating': 400}
+    return reliability, np.repeat(60., data_size), pv_max, pv_max * 0.8, ess_properties, \
+        rng.uniform(100, 400, data_size)
+
+
+@pytest.mark.parametrize('dt, max_outage_duration', [(1, 24), (0.25, 12)])
+def test_batch_outage_simulation_matches_recursive(dt, max_outage_duration):
+    reliability, gen, pv_max, pv_vari, ess_props, soe = \
+        outage_test_data(dt, max_outage_duration=max_outage_duration)
+    outage_len = int(max_outage_duration / dt)
+    simulator = reliability.outage_simulator()
+    for starts in simulator.blocks(block_size=64):
+        coverage, soe_profiles = reliability.simulate_outages(simulator, starts, gen, pv_max,
+                                                              pv_vari, 1.3, outage_len,
+                                                              ess_props, soe[starts])
+        for row, start in enumerate(starts):
+            demand_left, reliability_check, energy_check = \
+                reliability.data_process(start, gen, pv_max, ess_props, pv_vari, 1.3)
+            expected = reliability.simulate_outage(reliability_check, demand_left, energy_check,
+                                                   outage_len, init_soe=soe[start], **ess_props)
+            assert coverage[row] == len(expected)
+            assert np.array_equal(soe_profiles[row, :len(expected)], expected)
+            assert not soe_profiles[row, len(expected):].any()
+
+
+@pytest.mark.parametrize('rte_list', [[0.85], [0.75, 0.85, 0.95]])
+def test_parallel_load_coverage_matches_serial(rte_list):
+    reliability, gen, pv_max, pv_vari, ess_props, soe = outage_test_data(data_size=5000)
+    ess_props['rte list'] = rte_list
+    reliability.lcp_seed = 3
+    simulator = reliability.outage_simulator()
+    serial_frequency, serial_soe_profile = \
+        simulator.coverage(0, 5000, gen, pv_max, pv_vari, 1.3, 24, soe, ess_props)
+    parallel_frequency, parallel_soe_profile = \
+        simulator.parallel_coverage(3, gen, pv_max, pv_vari, 1.3, 24, soe, ess_props)
+    assert np.array_equal(serial_frequency, parallel_frequency)
+    assert np.array_equal(serial_soe_profile, parallel_soe_profile)
+    # the outages of a block are simulated the same way on their own
+    _, block_soe_profiles = reliability.simulate_outages(simulator, np.arange(2000, 2100), gen,
+                                                         pv_max, pv_vari, 1.3, 24, ess_props,
+                                                         soe[2000:2100])
+    assert np.allclose(block_soe_profiles, serial_soe_profile[2000:2100])
+
+
+@pytest.mark.parametrize('load_shed', [False, True])
+def test_generation_coverage_matches_first_failure(load_shed):
+    reliability, gen, pv_max, pv_vari, ess_props, _ = outage_test_data()
+    reliability.load_shed = load_shed
+    reliability.load_shed_data = pd.Series(np.linspace(100, 50, 24), index=np.arange(1, 25))
+    coverage = reliability.outage_simulator().generation_coverage(gen, pv_vari)
+    for start in range(len(coverage)):
+        _, reliability_check, _ = \
+            reliability.data_process(start, gen, pv_max, None, pv_vari, 1.3)
+        failures = np.flatnonzero(reliability_check > 0)
+        expected = failures[0] if failures.size else len(reliability_check)
+        assert coverage[start] == expected
+
+
+@pytest.mark.parametrize('stratify', ['none', 'month', 'hour'])
+def test_sampled_load_coverage_probability(stratify):
+    reliability, gen, pv_max, pv_vari, ess_props, soe = outage_test_data(data_size=2000)
+    reliability.lcp_stratify = stratify
+    reliability.lcp_time_budget = None
+    reliability.lcp_seed = 1
+    frequency, _ = reliability.outage_simulator().coverage(0, 2000, gen, pv_max, pv_vari, 1.3,
+                                                           24, soe, ess_props)
+    expected = [frequency[length:].sum() / (2000 - length + 1) * 1e2 for length in range(1, 25)]
+    # sampling every outage start gives the exact answer
+    reliability.lcp_samples = 2000
+    lcp = reliability.sampled_load_coverage_probability(gen, pv_max, pv_vari, 1.3, soe, ess_props)
+    assert np.allclose(lcp['Load Coverage Probability (%)'], expected)
+    assert np.allclose(lcp['Load Coverage Probability Lower Bound (%)'], expected)
+    assert np.allclose(lcp['Load Coverage Probability Upper Bound (%)'], expected)
+    reliability.lcp_samples = 500
+    lcp = reliability.sampled_load_coverage_probability(gen, pv_max, pv_vari, 1.3, soe, ess_props)
+    assert (lcp['Load Coverage Probability Lower Bound (%)'] <=
+            lcp['Load Coverage Probability (%)']).all()
+    assert (lcp['Load Coverage Probability (%)'] <=
+            lcp['Load Coverage Probability Upper Bound (%)']).all()
+    assert (np.abs(lcp['Load Coverage Probability (%)'] - expected) < 10).all()
+    assert lcp['Load Coverage Probability (%)'].between(0, 100).all()
+
+
+def test_grow_drop_data_rebuilds_the_energy_index(monkeypatch):
+    reliability, _, pv_max, _, _, _ = outage_test_data(data_size=48)
+    reliability.coverage_dt = 4
+    reliability.index_critical_load()
+    reliability.energy_index.add('PV max', pv_max)
+    grown = pd.concat([reliability.critical_load, reliability.critical_load * 1.1])
+    grown.index = pd.date_range('2017-01-01', periods=96, freq='h')
+    monkeypatch.setattr(Reliability_module.Lib, 'fill_extra_data', lambda *args: grown)
+    monkeypatch.setattr(Reliability_module.Lib, 'drop_extra_data', lambda data, years: data)
+    reliability.grow_drop_data([2017, 2018], 'h', 0.1)
+    expected = Reliability.rolling_sum(pd.Series(grown.values), 4)
+    assert np.allclose(reliability.energy_index.forward_energy('critical load', length=4),
+                       expected)
+    assert reliability.requirement.index.equals(grown.index)
+    assert np.allclose(reliability.requirement.values, expected)
+    # time series of the old critical load's timesteps are dropped
+    assert 'PV max' not in reliability.energy_index
+
+
+def test_energy_index_matches_rolling_sum():
+    reliability, _, pv_max, _, _, _ = outage_test_data(dt=0.25)
+    index = EnergyIndex(0.25, **{'critical load': reliability.critical_load, 'PV max': pv_max})
+    for name, values in [('critical load', reliability.critical_load), ('PV max', pv_max)]:
+        for length in [1, 7, 96]:
+            expected = Reliability.rolling_sum(pd.Series(values), length) * 0.25
+            assert np.allclose(index.forward_energy(name, length=length), expected)
+    assert np.isclose(index.forward_energy('PV max', 290, 96), pv_max[290:].sum() * 0.25)
+
+
+def test_outage_soe_profiles_are_a_dataframe_of_the_float32_array(tmp_path):
+    reliability, gen, pv_max, pv_vari, ess_props, _ = outage_test_data(data_size=500)
+    reliability.lcp_memmap = True
+    reliability.results_dir = tmp_path
+    reliability.lcp_samples = None
+    reliability.lcp_workers = 1
+    reliability.use_user_const = False
+    reliability.use_soc_init = True
+    reliability.get_der_mix_properties = lambda der_list: (gen, pv_max, ess_props, pv_vari, 1.3)
+    technology_summary = pd.DataFrame({'Type': ['Energy Storage System']})
+    reliability.load_coverage_probability([], None, technology_summary)
+    soe_profiles = reliability.outage_soe_profile
+    assert isinstance(soe_profiles, pd.DataFrame)
+    assert soe_profiles.index.equals(reliability.critical_load.index)
+    assert list(soe_profiles.columns) == list(range(1, 25))
+    assert (soe_profiles.dtypes == np.float32).all()
+    _, expected = reliability.outage_simulator().coverage(0, 500, gen, pv_max, pv_vari, 1.3, 24,
+                                                          400, ess_props)
+    assert np.allclose(soe_profiles.values, expected, rtol=1e-6)
+
+
+@pytest.mark.parametrize('energy_rating', [150, 400, 2000])
+def test_first_uncovered_matches_simulating_every_outage(energy_rating):
+    reliability, gen, pv_max, pv_vari, ess_props, _ = outage_test_data(data_size=1000)
+    ess_props.update({'operation SOE min': 0.1 * energy_rating,
+                      'operation SOE max': 0.95 * energy_rating,
+                      'energy rating': energy_rating})
+    soe = np.repeat(energy_rating, 1000)
+    simulator = reliability.outage_simulator()
+    demand_left, reliability_check, energy_check, data_length = \
+        simulator.data_process(np.arange(1000), gen, pv_max, pv_vari, 1.3)
+    coverage, _ = simulator.simulate(reliability_check, demand_left, energy_check, data_length,
+                                     24, soe, ess_props)
+    failed = (coverage > 0) & (coverage < 4) & (coverage < 1000 - np.arange(1000))
+    expected = np.argmax(failed) if failed.any() else -1
+    # outages that are ruled out without simulating them must be covered
+    screened = simulator.screen_covered(gen, pv_max, pv_vari, 1.3, 4, 24, soe, ess_props)
+    assert not (screened & failed).any()
+    assert simulator.first_uncovered(gen, pv_max, pv_vari, 1.3, 4, 24, soe, ess_props) == expected
+    uncovered, shortfall = simulator.uncovered(gen, pv_max, pv_vari, 1.3, 4, 24, soe, ess_props)
+    assert np.array_equal(uncovered, np.flatnonzero(failed))
+    assert (shortfall >= 0).all()
+
+
+def test_soe_used_matches_recursive():
+    reliability, gen, pv_max, pv_vari, ess_props, soe = outage_test_data()
+    soe_range, coverage, _ = reliability.outage_simulator().soe_used(gen, pv_max, pv_vari, 1.3,
+                                                                     4, soe, ess_props)
+    for start in range(len(soe)):
+        demand_left, reliability_check, energy_check = \
+            reliability.data_process(start, gen, pv_max, ess_props, pv_vari, 1.3)
+        expected = [soe[start]] + reliability.simulate_outage(reliability_check, demand_left,
+                                                              energy_check, 4,
+                                                              init_soe=soe[start], **ess_props)
+        assert coverage[start] == len(expected) - 1
+        assert soe_range[start] == max(expected) - min(expected)
+
+
+class SizedGenerator:
+    """ A generator that the reliability sizing loop sizes (without any optimization) """
+    technology_type = 'Generator'
+    name = 'dg'
+
+    def __init__(self):
+        self.sized = False
+
+    def being_sized(self):
+        return not self.sized
+
+    def set_size(self):
+        self.sized = True
+
+    def unset_size(self):
+        self.sized = False
+
+    def sizing_summary(self):
+        return {}
+
+
+def batch_sizing_data(uncovered_rounds):
+    """ A reliability value stream whose sizing loop finds the outages of UNCOVERED_ROUNDS
+    uncovered, one round after another (each round returns the outages sized for so far,
+    and the outages found uncovered) """
+    reliability, gen, pv_max, pv_vari, _, _ = outage_test_data()
+    requirement = reliability.critical_load.rolling(24).sum().shift(-23).fillna(0)
+    reliability.requirement = pd.Series(requirement.values)
+    reliability.coverage_dt = 24
+    reliability.outage_duration = 24
+    reliability.sizing_cuts = 2
+    reliability.min_soe_method = 'iterative'
+    sized_for = []
+
+    def size_for_outages(opt_index, outage_start_indices, der_list):
+        sized_for.append(set(outage_start_indices))
+        return der_list
+
+    def find_uncovered(*args):
+        return uncovered_rounds[len(sized_for) - 1](sized_for[-1])
+
+    reliability.size_for_outages = size_for_outages
+    reliability.find_uncovered = find_uncovered
+    reliability.get_der_mix_properties = lambda der_list, need_solution: \
+        (gen, pv_max, {'rte list': []}, pv_vari, 1.3)
+    return reliability, sized_for
+
+
+def test_batch_sizing_adds_the_largest_uncovered_outages_until_they_are_covered():
+    reliability, sized_for = batch_sizing_data([lambda sized: np.array([250, 5, 120]),
+                                                lambda sized: np.array([], dtype=int)])
+    der_list = reliability.sizing_module([SizedGenerator()], reliability.critical_load.index)
+    assert len(sized_for) == 2
+    assert {250, 5} <= sized_for[1] and 120 not in sized_for[1] - sized_for[0]
+    assert der_list[0].sized
+
+
+def test_batch_sizing_stops_when_only_outages_already_sized_for_fail():
+    reliability, sized_for = batch_sizing_data([lambda sized: np.array([250]),
+                                                lambda sized: np.array(sorted(sized))[:3]])
+    der_list = reliability.sizing_module([SizedGenerator()], reliability.critical_load.index)
+    assert der_list is not None and der_list[0].sized
+    assert len(sized_for) == 2
+
+
+class OutageBattery:
+    """ An ESS that can only discharge during an outage, starting at its SOC target """
+    technology_type = 'Energy Storage System'
+    name = 'es'
+    rte = 1
+
+    def __init__(self, energy, power, dt):
+        self.energy = energy
+        self.power = power
+        self.dt = dt
+        self.soc_target = None
+
+    def initialize_variables(self, size):
+        self.dis = cvx.Variable(size, nonneg=True)
+        self.ene = cvx.Variable(size + 1)
+
+    def get_net_power(self, mask):
+        return -self.dis
+
+    def constraints(self, mask, sizing_for_rel=False, find_min_soe=False):
+        return [self.ene[0] == self.soc_target * self.energy,
+                self.ene[1:] == self.ene[:-1] - self.dt * self.dis,
+                self.ene >= 0, self.dis <= self.power]
+
+    def energy_capacity(self, solution=False):
+        return self.energy
+
+    def operational_min_energy(self, solution=False):
+        return 0
+
+    def operational_max_energy(self, solution=False):
+        return self.energy
+
+    def discharge_capacity(self, solution=False):
+        return self.power
+
+    def charge_capacity(self, solution=False):
+        return 0
+
+
+@pytest.mark.parametrize('load_shed', [False, True])
+def test_optimal_min_soe_matches_iterative(load_shed):
+    reliability, _, _, _, _, _ = outage_test_data(dt=0.5, data_size=96, max_outage_duration=8)
+    reliability.outage_duration = 4
+    reliability.coverage_dt = 8
+    reliability.n_2 = False
+    reliability.min_soe_workers = 1
+    reliability.soe_profile_all_0 = {}
+    reliability.soe_profile_all_1 = {}
+    reliability.load_shed = load_shed
+    reliability.load_shed_data = pd.Series([100, 100, 100, 100, 80, 80, 50, 50])
+    opt_index = reliability.critical_load.index
+    der_list = [OutageBattery(2000, 500, reliability.dt)]
+    reliability.post_facto_only = True
+    reliability.min_soe_opt(opt_index, der_list)
+    optimal = reliability.min_soe_df['soe'].values
+    # no SOE profiles are reported for the outages the optimization does not simulate
+    assert 'Reliability Min SOE profile 0' not in reliability.timeseries_report()
+    reliability.min_soe_iterative(opt_index, der_list)
+    iterative = reliability.min_soe_df['soe'].values
+    assert 'Reliability Min SOE profile 0' in reliability.timeseries_report()
+    # outages that run past the end of the data are not optimized
+    covered = len(opt_index) - reliability.coverage_dt + 1
+    npt.assert_allclose(optimal[:covered], iterative[:covered], rtol=1e-5)
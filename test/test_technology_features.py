@@ -42,6 +42,7 @@ from pathlib import Path
 import numpy as np
 import numpy.testing as npt
 from test.TestingLib import *
+import pandas as pd
 
 
 DIR = Path("./test/model_params")
@@ -60,6 +61,14 @@ def test_battery_timeseries_constraints():
     assert np.all(timeseries['BATTERY: battery Charge (kW)'] <= charge_constraint)
 
 
+def test_sensitivity_cases_on_a_pool_match_the_serial_run():
+    test_file = DIR / f'003-battery_month_sensitivity{CSV}'
+    serial = DERVET(test_file).solve().sensitivity_df.copy()
+    assert len(serial) == 2
+    pooled = DERVET(test_file, workers=2).solve().sensitivity_df
+    pd.testing.assert_frame_equal(pooled, serial)
+
+
 class TestEVGuiUseCase:
     """ Tests to ensure the EV Use Case (Fleet EV) in the GUI funtions properly in DER-VET"""
 